@@ -0,0 +1,346 @@
+# -*- encoding: utf-8 -*-
+"""
+插件共用的指标注册表，不是插件，放在lib目录中不会被插件加载器加载，由各插件按文件路径导入
+同一进程中的插件加载的是同一个模块(sys.modules["plugin_metrics"])，指标统一汇总在REGISTRY中
+读取方式: REGISTRY.snapshot()返回dict；start_exporter(port)在本地端口导出Prometheus文本格式
+热路径只有一次加锁的计数，读取时才汇总，可以常开
+"""
+import bisect
+import json
+import logging
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Callable, Dict, List, Tuple
+
+logger = logging.getLogger('Metrics')
+
+# 延迟直方图默认分桶(秒)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# 速率按最近RATE_WINDOW秒计算，不含当前秒
+RATE_WINDOW = 10
+# 导出端口只监听本地
+EXPORT_HOST = "127.0.0.1"
+
+
+class _Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def values(self) -> Dict[tuple, object]:
+        with self._lock:
+            return dict(self._values)
+
+    def remove(self, *labels):
+        with self._lock:
+            self._values.pop(labels, None)
+
+
+class Counter(_Metric):
+    """
+    累计计数，标签按labelnames的顺序传值: counter.inc("200")
+    rate=True时额外按秒分桶统计所有标签合计的速率
+    """
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = (), rate: bool = False):
+        super().__init__(name, help, labelnames)
+        size = RATE_WINDOW + 1
+        self._ring = [0] * size if rate else None
+        self._ring_seconds = [0] * size if rate else None
+
+    def inc(self, *labels, amount: int = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+            if self._ring is not None:
+                second = int(time.monotonic())
+                i = second % len(self._ring)
+                if self._ring_seconds[i] != second:
+                    self._ring_seconds[i] = second
+                    self._ring[i] = 0
+                self._ring[i] += amount
+
+    def rate(self) -> float|None:
+        """最近RATE_WINDOW秒的每秒平均值"""
+        if self._ring is None:
+            return None
+        now = int(time.monotonic())
+        with self._lock:
+            total = sum(count for count, second in zip(self._ring, self._ring_seconds) if now - RATE_WINDOW <= second < now)
+        return total / RATE_WINDOW
+
+
+class Gauge(_Metric):
+    """当前值"""
+    type = "gauge"
+
+    def set(self, value: float, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+
+class GaugeFunc(_Metric):
+    """读取时调用fn取值，fn返回{标签元组: 值}，热路径没有开销"""
+    type = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...], fn: Callable[[], Dict[tuple, float]]):
+        super().__init__(name, help, labelnames)
+        self.fn = fn
+
+    def values(self) -> Dict[tuple, object]:
+        try:
+            return dict(self.fn())
+        except Exception as e:
+            logger.warning(f"[-]Read gauge failed: {self.name} - {e}")
+            return {}
+
+
+class Histogram(_Metric):
+    """分桶直方图，值为[各桶计数(最后一个为+Inf), 总和, 总数]"""
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            data = self._values.get(labels)
+            if data is None:
+                data = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            data[0][i] += 1
+            data[1] += value
+            data[2] += 1
+
+    def values(self) -> Dict[tuple, object]:
+        with self._lock:
+            return {labels: [list(counts), total, count] for labels, (counts, total, count) in self._values.items()}
+
+    def quantile(self, counts: List[int], q: float) -> float|None:
+        """按桶线性插值估算分位数，落在+Inf桶时返回最大的桶边界"""
+        count = sum(counts)
+        if count == 0:
+            return None
+        rank = q * count
+        seen = 0
+        for i, n in enumerate(counts):
+            if seen + n >= rank and n > 0:
+                if i >= len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - seen) / n
+            seen += n
+        return self.buckets[-1]
+
+
+def _format_labels(names: Tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class MetricsRegistry:
+    """指标注册表，同名指标重复注册时返回已有的指标，插件重新初始化不会重复创建"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None and type(existing) is type(metric):
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, help: str, labelnames: Tuple[str, ...] = (), rate: bool = False) -> Counter:
+        return self._register(Counter(name, help, labelnames, rate))
+
+    def gauge(self, name: str, help: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+        return self._register(Gauge(name, help, labelnames))
+
+    def gauge_func(self, name: str, help: str, labelnames: Tuple[str, ...], fn: Callable[[], Dict[tuple, float]]) -> GaugeFunc:
+        metric = self._register(GaugeFunc(name, help, labelnames, fn))
+        # 重新注册时使用新的取值函数
+        metric.fn = fn
+        return metric
+
+    def histogram(self, name: str, help: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def unregister(self, name: str):
+        with self._lock:
+            self._metrics.pop(name, None)
+
+    def metrics(self) -> List[_Metric]:
+        with self._lock:
+            return sorted(self._metrics.values(), key=lambda m: m.name)
+
+    def snapshot(self, prefix: str = "") -> dict:
+        """
+        所有指标的当前值
+        :param prefix: 只返回名称以prefix开头的指标
+        :return: {名称: {"type", "help", "values": [{"labels", "value"}], "rate"(仅计数器)}}
+        """
+        result = {}
+        for metric in self.metrics():
+            if not metric.name.startswith(prefix):
+                continue
+            values = []
+            for labels, value in metric.values().items():
+                if isinstance(metric, Histogram):
+                    counts, total, count = value
+                    value = {
+                        "count": count,
+                        "sum": total,
+                        "p50": metric.quantile(counts, 0.5),
+                        "p95": metric.quantile(counts, 0.95),
+                        "p99": metric.quantile(counts, 0.99),
+                    }
+                values.append({"labels": dict(zip(metric.labelnames, labels)), "value": value})
+            item = {"type": metric.type, "help": metric.help, "values": values}
+            if isinstance(metric, Counter) and metric._ring is not None:
+                item["rate"] = metric.rate()
+            result[metric.name] = item
+        return result
+
+    def render(self) -> str:
+        """Prometheus文本格式"""
+        lines = []
+        for metric in self.metrics():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for labels, value in sorted(metric.values().items()):
+                if isinstance(metric, Histogram):
+                    counts, total, count = value
+                    cumulative = 0
+                    for bound, n in zip(metric.buckets + (float("inf"),), counts):
+                        cumulative += n
+                        le = _format_labels(metric.labelnames, labels, f'le="{_format_value(float(bound))}"')
+                        lines.append(f"{metric.name}_bucket{le} {cumulative}")
+                    lines.append(f"{metric.name}_sum{_format_labels(metric.labelnames, labels)} {_format_value(total)}")
+                    lines.append(f"{metric.name}_count{_format_labels(metric.labelnames, labels)} {count}")
+                else:
+                    lines.append(f"{metric.name}{_format_labels(metric.labelnames, labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+
+class _ExportHandler(BaseHTTPRequestHandler):
+    registry: MetricsRegistry = REGISTRY
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        path = self.path.split('?', 1)[0]
+        if path == "/metrics":
+            body = self.registry.render().encode('utf-8')
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        elif path == "/snapshot":
+            body = json.dumps(self.registry.snapshot(), ensure_ascii=False, default=str).encode('utf-8')
+            content_type = "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class MetricsExporter:
+    """本地HTTP导出: /metrics为Prometheus文本，/snapshot为json"""
+    def __init__(self, port: int, host: str = EXPORT_HOST, registry: MetricsRegistry = REGISTRY):
+        self.port = port
+        self.host = host
+        self.registry = registry
+        self._server: ThreadingHTTPServer|None = None
+        self._thread: threading.Thread|None = None
+
+    def start(self) -> bool:
+        if self._server is not None:
+            return False
+        handler = type("ExportHandler", (_ExportHandler,), {"registry": self.registry})
+        try:
+            self._server = ThreadingHTTPServer((self.host, self.port), handler)
+        except OSError as e:
+            logger.error(f"[-]Start metrics exporter failed: {self.host}:{self.port} - {e}")
+            return False
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="MetricsExporter", daemon=True)
+        self._thread.start()
+        logger.info(f"[+]Metrics exporter start, http://{self.host}:{self.port}/metrics")
+        return True
+
+    def stop(self):
+        if self._server is None:
+            return
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+        self._server = None
+        self._thread = None
+
+
+# 多个插件可以配置同一个端口，按引用计数共用一个导出服务
+_EXPORTERS: Dict[int, list] = {}
+_EXPORTERS_LOCK = threading.Lock()
+
+
+def start_exporter(port: int) -> MetricsExporter|None:
+    """启动导出服务，端口已由其他插件启动时直接共用"""
+    with _EXPORTERS_LOCK:
+        entry = _EXPORTERS.get(port)
+        if entry is not None:
+            entry[1] += 1
+            return entry[0]
+        exporter = MetricsExporter(port)
+        if not exporter.start():
+            return None
+        _EXPORTERS[port] = [exporter, 1]
+        return exporter
+
+
+def stop_exporter(port: int):
+    """最后一个使用者停止时关闭导出服务"""
+    with _EXPORTERS_LOCK:
+        entry = _EXPORTERS.get(port)
+        if entry is None:
+            return
+        entry[1] -= 1
+        if entry[1] > 0:
+            return
+        del _EXPORTERS[port]
+    entry[0].stop()
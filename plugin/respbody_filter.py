@@ -1,7 +1,12 @@
 # -*- encoding: utf-8 -*-
+import atexit
+import hashlib
+import importlib.util
 import json
 import os.path
+import pickle
 import re
+import sys
 import traceback
 from urllib.request import Request
 from urllib.response import addinfourl
@@ -14,10 +19,45 @@ import threading
 from pathlib import Path
 from typing import List, Tuple, Callable
 from queue import Queue, Empty
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
 import time
 
+try:
+    import re._parser as sre_parse
+    import re._constants as sre_constants
+except ImportError:  # python < 3.11
+    import sre_parse
+    import sre_constants
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 from chui_http import Context, HttpRequest, HttpResponse
 
+def _load_plugin_metrics():
+    """
+    加载插件共用的指标模块lib/plugin_metrics.py，不修改sys.path
+    放在lib目录中不会被当作插件加载，各插件共用sys.modules["plugin_metrics"]中的同一份
+    """
+    module = sys.modules.get("plugin_metrics")
+    if module is not None:
+        return module
+    spec = importlib.util.spec_from_file_location("plugin_metrics", Path(__file__).resolve().parent / "lib" / "plugin_metrics.py")
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["plugin_metrics"] = module
+    try:
+        spec.loader.exec_module(module)
+    except (OSError, ImportError):
+        del sys.modules["plugin_metrics"]
+        return None
+    return module
+
+
+plugin_metrics = _load_plugin_metrics()
+
 
 # """配置日志记录器"""
 logging.basicConfig(
@@ -58,6 +98,10 @@ def description() -> dict:
                 {
                     "name": "公司",
                     "index": 3,
+                },
+                {
+                    "name": "次数",
+                    "index": 6,
                 }
             ]
         }
@@ -67,12 +111,49 @@ def description() -> dict:
 OnDataHandler: Callable[[list], None]
 
 def initialize(on_data_handler: Callable[[list], None]):
-    global OnDataHandler
+    global OnDataHandler, EXECUTOR, WATCHER, _EXPORTER_PORT
     OnDataHandler = on_data_handler
+    # 重复初始化时先停止上一次创建的后台线程和进程池
+    _shutdown_workers()
     load_extract_string()
 
+    if RULES_WATCH_INTERVAL > 0:
+        WATCHER = RuleWatcher(RULES_FILE, RULES_WATCH_INTERVAL)
+        WATCHER.start()
+
+    if WORKER_MODE:
+        EXECUTOR = ScanExecutor(
+            worker_num=WORKER_NUM,
+            queue_size=WORKER_QUEUE_SIZE,
+            full_policy=WORKER_FULL_POLICY,
+        )
+        EXECUTOR.start()
+
+    if METRICS is not None and METRICS_PORT:
+        if plugin_metrics.start_exporter(METRICS_PORT) is not None:
+            _EXPORTER_PORT = METRICS_PORT
+
+    # 同一个函数只注册一次
+    atexit.unregister(_shutdown_workers)
+    atexit.register(_shutdown_workers)
+
     pass
 
+_EXPORTER_PORT = 0
+
+def _shutdown_workers():
+    """停止规则监控、扫描进程池和指标导出"""
+    global EXECUTOR, WATCHER, _EXPORTER_PORT
+    if WATCHER is not None:
+        WATCHER.stop()
+        WATCHER = None
+    if EXECUTOR is not None:
+        EXECUTOR.shutdown()
+        EXECUTOR = None
+    if _EXPORTER_PORT:
+        plugin_metrics.stop_exporter(_EXPORTER_PORT)
+        _EXPORTER_PORT = 0
+
 def start() -> bool:
     """
     启动
@@ -105,65 +186,1675 @@ def on_response(context: Context, response: HttpResponse):
     """
     global OnDataHandler
 
-    if context.url.endswith(".js") is True:
-        if response.body.isText and response.body.payload and isinstance(response.body.payload, str):
-            result = extract_kv_with_regex(response.body.payload)
-            data = []
-            for row in result:
-                reg_item = CUSTOM_REGEXS[row[0].lower()]
-                data.append({
-                    "data": [row[0], row[1], reg_item["title"], reg_item["company"], reg_item["homepage"], reg_item["address"]],
-                    "context": {
-                        "id": context.id
-                    },
-                })
-
-            return data
-        else:
+    payload = response.body.payload
+    if not payload or not isinstance(payload, (str, bytes, bytearray, memoryview)):
+        if context.url.endswith(".js") is True:
             logger.warning(f"Invalid body:{context.id},{response.body}")
+        return None
 
+    kind = classify_response(context, response, payload)
+    if METRICS is not None:
+        METRICS.responses.inc(kind)
+        METRICS.bytes.inc(amount=len(payload))
+    if not _admit_route(kind, len(payload)):
+        return None
 
-    return None
+    # 取一次当前规则，扫描过程中规则被热加载替换也不受影响
+    ruleset = RULESET
+    if EXECUTOR is not None:
+        # 多进程模式: 入队后立即返回，结果通过OnDataHandler异步回调
+        EXECUTOR.submit(context, response, payload, ruleset, kind)
+        return None
 
-CUSTOM_REGEXS = dict()
+    result = _extract_with_cache(response, payload, ruleset, kind)
+    rows = _build_rows(context, result, ruleset)
+    if METRICS is not None and rows:
+        METRICS.findings.inc(amount=len(rows))
+    return rows
+
+def _build_rows(context: Context, result, ruleset: 'RuleSet' = None) -> list:
+    """
+    把提取结果转换为界面列表数据，最后一列为命中次数
+    已经上报过的结果只计数，次数增长到2的幂时带上新的次数再上报一行
+    """
+    rules = (ruleset or RULESET).rules
+    data = []
+    for row in result:
+        reg_item = rules.get(row[0].lower()) or BUILTIN_RULES.get(row[0])
+        if reg_item is None:
+            # 热加载后规则已被删除
+            continue
+        count = 1
+        if FINDING_INDEX is not None:
+            count = FINDING_INDEX.observe(row[0], row[1], getattr(context, 'host', None))
+            if not count:
+                continue
+        data.append({
+            "data": [row[0], row[1], reg_item["title"], reg_item["company"], reg_item["homepage"], reg_item["address"], count],
+            "context": {
+                "id": context.id
+            },
+        })
+    return data
+
+# 跨flow的结果去重
+DEDUP_ENABLED = True
+# 是否按host分别去重，开启后同一个值在不同host上各上报一次
+DEDUP_PER_HOST = False
+# 精确计数的最近结果数量
+DEDUP_LRU_SIZE = 65536
+# 布隆过滤器大小(bit)和哈希函数个数，默认1MB，百万级结果时误判率约1%
+DEDUP_BLOOM_BITS = 8 * 1024 * 1024
+DEDUP_BLOOM_HASHES = 7
+# 重复命中时，次数每翻一倍(2,4,8...)带上新的次数再上报一行，关闭后只上报首次命中
+DEDUP_REPORT_COUNTS = True
+
+
+class FindingIndex:
+    def __init__(self, lru_size: int = 65536, bloom_bits: int = 8 * 1024 * 1024, bloom_hashes: int = 7, per_host: bool = False,
+                 report_counts: bool = True):
+        """
+        会话级结果去重索引，内存占用固定
+        最近的结果在LRU中精确计数，淘汰后由布隆过滤器记住"已上报"
+
+        :param lru_size: LRU容量
+        :param bloom_bits: 布隆过滤器大小(bit)
+        :param bloom_hashes: 哈希函数个数
+        :param per_host: 是否按host分别去重
+        :param report_counts: 次数翻倍时是否再次上报
+        """
+        self.lru_size = lru_size
+        self.bloom_bits = bloom_bits
+        self.bloom_hashes = bloom_hashes
+        self.per_host = per_host
+        self.report_counts = report_counts
+
+        self._lock = threading.Lock()
+        self._bloom = bytearray((bloom_bits + 7) // 8)
+        self._recent: OrderedDict = OrderedDict()
+
+        # 统计信息
+        self.unique = 0
+        self.duplicates = 0
+
+    def _positions(self, item: tuple):
+        digest = hashlib.blake2b(repr(item).encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        for i in range(self.bloom_hashes):
+            yield (h1 + i * h2) % self.bloom_bits
+
+    def observe(self, key: str, value, host: str|None = None) -> int:
+        """
+        记录一次命中
+        :return: 需要上报时返回当前次数(首次为1，之后为2的幂)，不需要上报时返回0
+        """
+        item = (key, value, host if self.per_host else None)
+        with self._lock:
+            count = self._recent.get(item)
+            if count is not None:
+                count += 1
+                self._recent[item] = count
+                self._recent.move_to_end(item)
+                self.duplicates += 1
+                # 淘汰后重新计数的结果，次数是下限
+                if self.report_counts and count & (count - 1) == 0:
+                    return count
+                return 0
+
+            positions = list(self._positions(item))
+            seen = all(self._bloom[p >> 3] & (1 << (p & 7)) for p in positions)
+            if not seen:
+                for p in positions:
+                    self._bloom[p >> 3] |= 1 << (p & 7)
+
+            # 从LRU淘汰后再次出现的结果重新开始计数
+            self._recent[item] = 1 if not seen else 2
+            if len(self._recent) > self.lru_size:
+                self._recent.popitem(last=False)
+
+            if seen:
+                self.duplicates += 1
+                return 0
+
+            self.unique += 1
+            return 1
+
+    def counts(self, limit: int = 100) -> list:
+        """最近结果的出现次数，按次数倒序 [(规则key, 值, host, 次数)]"""
+        with self._lock:
+            items = sorted(self._recent.items(), key=lambda kv: kv[1], reverse=True)[:limit]
+        return [(key, value, host, count) for (key, value, host), count in items]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "unique": self.unique,
+                "duplicates": self.duplicates,
+                "recent": len(self._recent),
+            }
+
+    pass
+
+
+FINDING_INDEX = FindingIndex(DEDUP_LRU_SIZE, DEDUP_BLOOM_BITS, DEDUP_BLOOM_HASHES, DEDUP_PER_HOST,
+                             DEDUP_REPORT_COUNTS) if DEDUP_ENABLED else None
+
+
+def finding_counts(limit: int = 100) -> list:
+    """出现次数最多的结果 [(规则key, 值, host, 次数)]"""
+    return FINDING_INDEX.counts(limit) if FINDING_INDEX is not None else []
+
+
+def finding_stats() -> dict|None:
+    """去重统计，未开启时返回None"""
+    return FINDING_INDEX.stats() if FINDING_INDEX is not None else None
 
-def load_extract_string():
-    global CUSTOM_REGEXS
 
+RULES_FILE = os.path.join(Path(__file__).resolve().parent, "extract-string-list.json")
+# 预编译规则包，存放在规则文件旁边，记录源文件指纹，指纹不一致时重新生成
+RULES_PACK_FILE = os.path.join(Path(__file__).resolve().parent, "extract-string-list.pack")
+RULES_PACK_VERSION = 1
+# 规则文件热加载的检查间隔(秒)，0表示关闭(默认)，调试规则时可以开启
+RULES_WATCH_INTERVAL = 0
+
+
+class RuleSet:
+    def __init__(self, rules: dict, fingerprint: str = "", errors: dict|None = None, analysis: dict|None = None):
+        """
+        一份已编译的规则，创建后不再修改，热加载时整体替换
+
+        :param rules: {规则key: 规则配置}，`reg`为已编译的正则
+        :param fingerprint: 规则文件内容指纹
+        :param errors: {规则key: 错误信息}，编译失败的规则
+        :param analysis: 规则包中缓存的锚点分析结果
+        """
+        self.rules = rules
+        self.fingerprint = fingerprint
+        self.errors = errors or {}
+        self.matcher = RegexMatcher({k: v['reg'] for k, v in rules.items()}, analysis, PROFILER)
+
+        self._lock = threading.Lock()
+        self._matchers = {}
+
+    def matcher_for(self, kind: str) -> 'RegexMatcher':
+        """
+        某类响应使用的匹配引擎
+        规则可以用`scope`字段限定适用的响应类型，如`"scope": ["js", "json"]`，不设置时适用于所有类型
+        """
+        with self._lock:
+            matcher = self._matchers.get(kind)
+            if matcher is not None:
+                return matcher
+
+            keys = [k for k, v in self.rules.items() if 'scope' not in v or kind in v['scope']]
+            if len(keys) == len(self.rules):
+                matcher = self.matcher
+            else:
+                matcher = RegexMatcher({k: self.rules[k]['reg'] for k in keys}, self.matcher.analysis, PROFILER)
+            self._matchers[kind] = matcher
+            return matcher
+
+    pass
+
+
+def _compile_rules(tmp_kvs: dict) -> Tuple[dict, dict]:
+    """逐条编译规则，单条失败不影响其它规则"""
+    rules = {}
+    errors = {}
+    for k, v in tmp_kvs.items():
+        if 'disabled' in v and v['disabled'] == 1:
+            continue
+
+        if 'reg' in v:
+            try:
+                rules[k] = dict(v, reg=re.compile(v['reg']))
+            except (re.error, TypeError) as exp:
+                errors[k] = str(exp)
+                logger.error(f"[-]Compile regex failed: {k} - {str(exp)}")
+
+    return rules, errors
+
+
+def _load_rules_pack(fingerprint: str) -> RuleSet|None:
+    """读取与规则文件指纹一致的规则包"""
     try:
-        current_dir = Path(__file__).resolve().parent
-        dict_file = os.path.join(current_dir, "extract-string-list.json")
+        with open(RULES_PACK_FILE, 'rb') as file:
+            pack = pickle.load(file)
+    except FileNotFoundError:
+        return None
+    except Exception as exp:
+        logger.warning(f"[-]Load rules pack failed: {str(exp)}")
+        return None
 
-        with open(dict_file, 'r', encoding='utf8') as file:
-            tmp_kvs = json.load(file)
-            for k, v in tmp_kvs.items():
-                if 'disabled' in v and v['disabled'] == 1:
-                    continue
+    if not isinstance(pack, dict) or pack.get('version') != RULES_PACK_VERSION \
+            or pack.get('fingerprint') != fingerprint or pack.get('python') != tuple(sys.version_info[:2]):
+        return None
 
-                if 'reg' in v:
-                    v['reg'] = re.compile(v['reg'])
-                    CUSTOM_REGEXS[k] = v
+    # 版本一致但内容损坏时重新解析规则文件
+    try:
+        rules = {k: dict(v, reg=re.compile(v['reg'], v['flags'])) for k, v in pack['rules'].items()}
+        return RuleSet(rules, fingerprint, pack['errors'], pack['analysis'])
+    except Exception as exp:
+        logger.warning(f"[-]Invalid rules pack: {str(exp)}")
+        return None
 
-                pass
-            pass
-        pass
+
+def _save_rules_pack(ruleset: RuleSet):
+    """写入规则包，先写临时文件再替换，避免读到半个文件"""
+    pack = {
+        'version': RULES_PACK_VERSION,
+        'fingerprint': ruleset.fingerprint,
+        'python': tuple(sys.version_info[:2]),
+        'rules': {k: dict(v, reg=v['reg'].pattern, flags=v['reg'].flags) for k, v in ruleset.rules.items()},
+        'errors': ruleset.errors,
+        'analysis': ruleset.matcher.analysis,
+    }
+
+    tmp_file = f"{RULES_PACK_FILE}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_file, 'wb') as file:
+            pickle.dump(pack, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, RULES_PACK_FILE)
+    except Exception as exp:
+        logger.warning(f"[-]Save rules pack failed: {str(exp)}")
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+
+
+def load_rules(dict_file: str = None) -> RuleSet:
+    """
+    加载规则，优先使用指纹一致的规则包
+    规则文件无法解析时抛出异常
+    """
+    dict_file = dict_file or RULES_FILE
+    with open(dict_file, 'rb') as file:
+        raw = file.read()
+    fingerprint = hashlib.sha256(raw).hexdigest()
+
+    if dict_file == RULES_FILE:
+        ruleset = _load_rules_pack(fingerprint)
+        if ruleset is not None:
+            return ruleset
+
+    rules, errors = _compile_rules(json.loads(raw.decode('utf8')))
+    ruleset = RuleSet(rules, fingerprint, errors)
+    if dict_file == RULES_FILE:
+        _save_rules_pack(ruleset)
+    return ruleset
+
+
+# 当前生效的规则，只通过整体赋值替换
+RULESET: RuleSet = None
+# 兼容旧代码，与RULESET保持一致
+CUSTOM_REGEXS = dict()
+MATCHER: 'RegexMatcher' = None
+RULES_FINGERPRINT = ""
+
+
+def _swap_ruleset(ruleset: RuleSet):
+    global RULESET, CUSTOM_REGEXS, MATCHER, RULES_FINGERPRINT
+
+    changed = RULESET is None or RULESET.fingerprint != ruleset.fingerprint
+    RULESET = ruleset
+    CUSTOM_REGEXS = ruleset.rules
+    MATCHER = ruleset.matcher
+    RULES_FINGERPRINT = ruleset.fingerprint
+
+    PROFILER.sync(ruleset.rules)
+
+    if changed:
+        # 缓存key中带有规则指纹，这里只是及时释放旧结果
+        RESULT_CACHE.clear()
+
+
+def load_extract_string():
+    try:
+        ruleset = load_rules()
     except Exception as exp:
         logger.error(f"Load Custom Regex Failed: {str(exp)}")
+        if RULESET is not None:
+            return
+        ruleset = RuleSet({})
+
+    _swap_ruleset(ruleset)
+    logger.info(f"[+]Load rules[{len(ruleset.rules)}], failed[{len(ruleset.errors)}]")
 
     pass
 
-def extract_kv_with_regex(data):
-    global CUSTOM_REGEXS
 
-    custom_kvs = set()
+class RuleWatcher:
+    def __init__(self, dict_file: str, interval: float = 2):
+        """
+        监控规则文件，变化后在后台线程重新编译并替换规则，不阻塞正在进行的扫描
+
+        :param dict_file: 规则文件
+        :param interval: 检查间隔(秒)
+        """
+        self.dict_file = dict_file
+        self.interval = interval
 
-    for key, regex_item in CUSTOM_REGEXS.items():
-        for found in regex_item['reg'].findall(data):
-            kv = (key, found)
-            custom_kvs.add(kv)
+        self._stop_event = threading.Event()
+        self._thread: threading.Thread|None = None
+        self._stat = self._file_stat()
+
+    def _file_stat(self):
+        try:
+            st = os.stat(self.dict_file)
+            return st.st_mtime_ns, st.st_size
+        except OSError:
+            return None
+
+    def start(self):
+        if self._thread is not None:
+            return
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._worker, name="RuleWatcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+
+        self._stop_event.set()
+        self._thread.join(timeout=self.interval + 1)
+        self._thread = None
+
+    def _worker(self):
+        while not self._stop_event.wait(self.interval):
+            stat = self._file_stat()
+            if stat is None or stat == self._stat:
+                continue
+            self._stat = stat
+
+            try:
+                ruleset = load_rules(self.dict_file)
+            except Exception as exp:
+                logger.error(f"[-]Reload rules failed, keep current rules: {str(exp)}")
+                continue
+
+            if RULESET is not None and ruleset.fingerprint == RULESET.fingerprint:
+                continue
+
+            _swap_ruleset(ruleset)
+            logger.info(f"[+]Reload rules[{len(ruleset.rules)}], failed[{len(ruleset.errors)}]")
         pass
 
-    return custom_kvs
+    pass
+
+
+WATCHER: RuleWatcher = None
+
+
+def rule_errors() -> dict:
+    """当前规则中编译失败的规则 {规则key: 错误信息}"""
+    return dict(RULESET.errors) if RULESET is not None else {}
+
+
+# 单条规则每扫描RULE_BUDGET_BYTES字节的时间预算(秒)，按本次扫描的字节数等比放大，0表示不限制
+# 预算只在两次正则调用之间检查，无法打断单次调用内部的灾难性回溯，只能在调用返回后放弃该规则
+RULE_TIME_BUDGET = 0.5
+RULE_BUDGET_BYTES = 1024 * 1024
+# 规则超出预算的次数达到该值后自动禁用，0表示不自动禁用
+RULE_MAX_OVERRUNS = 3
+# 只有不超过该大小(约为流式扫描的一个窗口)的扫描超时才计入自动禁用次数，大body超时只放弃本次扫描
+RULE_DISABLE_MAX_BYTES = 2 * 1024 * 1024
+# 无锚点规则按窗口分段扫描的窗口大小，每个窗口之间检查一次时间预算
+RULE_SCAN_WINDOW = 64 * 1024
+# 每条规则保留的最近耗时样本数，用于计算p50/p99
+RULE_LATENCY_SAMPLES = 1024
+# 共用的前缀过滤扫描在统计中的key
+PREFILTER_KEY = "__prefilter__"
+
+
+class RuleProfiler:
+    def __init__(self, budget: float = 0.5, max_overruns: int = 3, samples: int = 1024):
+        """
+        规则耗时统计和超时保护
+
+        :param budget: 单条规则每扫描RULE_BUDGET_BYTES字节的时间预算(秒)
+        :param max_overruns: 超出预算多少次后自动禁用该规则
+        :param samples: 每条规则保留的最近耗时样本数
+        """
+        self.budget = budget
+        self.max_overruns = max_overruns
+        self.samples = samples
+
+        self._lock = threading.Lock()
+        self._stats = {}
+        # 已自动禁用的规则，扫描时直接跳过
+        self.disabled = frozenset()
+        self._patterns = {}
+
+    def _rule_stats(self, key: str) -> dict:
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = {
+                "calls": 0,
+                "time": 0.0,
+                "bytes": 0,
+                "matches": 0,
+                "overruns": 0,
+                "latency": deque(maxlen=self.samples),
+            }
+        return stats
+
+    def budget_for(self, nbytes: int) -> float:
+        """扫描nbytes字节时单条规则的时间预算，0表示不限制"""
+        if not self.budget:
+            return 0
+        return self.budget * max(nbytes / RULE_BUDGET_BYTES, 1.0)
+
+    def record_call(self, nbytes: int, spent: dict, found: dict, aborted: set, prefilter_time: float):
+        """记录一次扫描调用"""
+        with self._lock:
+            stats = self._rule_stats(PREFILTER_KEY)
+            stats["calls"] += 1
+            stats["time"] += prefilter_time
+            stats["bytes"] += nbytes
+            stats["latency"].append(prefilter_time)
+
+            for key in self._patterns.keys() - self.disabled:
+                elapsed = spent.get(key, 0.0)
+                stats = self._rule_stats(key)
+                stats["calls"] += 1
+                stats["time"] += elapsed
+                stats["bytes"] += nbytes
+                stats["matches"] += found.get(key, 0)
+                stats["latency"].append(elapsed)
+
+            for key in aborted:
+                stats = self._rule_stats(key)
+                if nbytes > RULE_DISABLE_MAX_BYTES:
+                    logger.warning(f"[-]Rule exceeded time budget on large body: {key} - {spent.get(key, 0.0):.3f}s, {nbytes} bytes")
+                    continue
+                stats["overruns"] += 1
+                logger.warning(f"[-]Rule exceeded time budget: {key} - {spent.get(key, 0.0):.3f}s, overruns[{stats['overruns']}]")
+                if 0 < self.max_overruns <= stats["overruns"] and key not in self.disabled:
+                    self.disabled = self.disabled | {key}
+                    logger.error(f"[-]Rule disabled after {stats['overruns']} overruns: {key}")
+
+    def sync(self, rules: dict):
+        """规则热加载后调用，正则有变化的规则重新启用并清空统计"""
+        with self._lock:
+            patterns = {k: v['reg'].pattern for k, v in rules.items()}
+            for key, pattern in self._patterns.items():
+                if patterns.get(key) != pattern:
+                    self._stats.pop(key, None)
+                    self.disabled = self.disabled - {key}
+            self._patterns = patterns
+
+    def enable(self, key: str):
+        """手动重新启用被自动禁用的规则"""
+        with self._lock:
+            self.disabled = self.disabled - {key}
+            stats = self._stats.get(key)
+            if stats is not None:
+                stats["overruns"] = 0
+
+    def drain(self) -> dict:
+        """取出并清空统计，用于子进程向主进程汇报"""
+        with self._lock:
+            stats = self._stats
+            self._stats = {}
+            return {"stats": stats, "disabled": self.disabled}
+
+    def merge(self, delta: dict):
+        """合并子进程汇报的统计"""
+        with self._lock:
+            for key, other in delta["stats"].items():
+                stats = self._rule_stats(key)
+                for name in ("calls", "time", "bytes", "matches", "overruns"):
+                    stats[name] += other[name]
+                stats["latency"].extend(other["latency"])
+            self.disabled = self.disabled | (delta["disabled"] & self._patterns.keys())
+
+    def stats(self) -> dict:
+        """{规则key: 累计耗时、扫描字节数、命中数、超时次数、p50/p99单次耗时}"""
+        with self._lock:
+            result = {}
+            for key, stats in self._stats.items():
+                latency = sorted(stats["latency"])
+                result[key] = {
+                    "calls": stats["calls"],
+                    "time": stats["time"],
+                    "bytes": stats["bytes"],
+                    "matches": stats["matches"],
+                    "overruns": stats["overruns"],
+                    "disabled": key in self.disabled,
+                    "p50": latency[int(0.5 * (len(latency) - 1))] if latency else 0.0,
+                    "p99": latency[int(0.99 * (len(latency) - 1))] if latency else 0.0,
+                }
+            return result
+
+    pass
+
+
+PROFILER = RuleProfiler(RULE_TIME_BUDGET, RULE_MAX_OVERRUNS, RULE_LATENCY_SAMPLES)
+
+
+def rule_stats() -> dict:
+    """每条规则的耗时统计"""
+    return PROFILER.stats()
+
+
+def dump_rule_stats(file: str = None) -> dict:
+    """
+    输出规则耗时统计，按累计耗时倒序
+    :param file: 指定时写入json文件，否则打印到日志
+    """
+    stats = dict(sorted(PROFILER.stats().items(), key=lambda kv: kv[1]["time"], reverse=True))
+    if file:
+        with open(file, 'w', encoding='utf8') as f:
+            json.dump(stats, f, ensure_ascii=False, indent=2)
+        return stats
+
+    for key, item in stats.items():
+        rate = item["bytes"] / item["time"] / 1024 / 1024 if item["time"] > 0 else 0
+        logger.info(f"Rule stat[{key}]: "
+                    f"calls: {item['calls']}"
+                    f", time: {item['time']:.3f}s"
+                    f", rate: {rate:.1f}MB/s"
+                    f", matches: {item['matches']}"
+                    f", p50: {item['p50'] * 1000:.3f}ms"
+                    f", p99: {item['p99'] * 1000:.3f}ms"
+                    f", overruns: {item['overruns']}"
+                    f"{', disabled' if item['disabled'] else ''}")
+    return stats
+
+def _get_header(response: HttpResponse, name: str) -> str|None:
+    """读取响应头，兼容`["Name: value"]`列表和字典两种格式"""
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+
+    name = name.lower()
+    if isinstance(headers, dict):
+        for k, v in headers.items():
+            if k.lower() == name:
+                return v
+        return None
+
+    for line in headers:
+        k, sep, v = line.partition(':')
+        if sep and k.strip().lower() == name:
+            return v.strip()
+    return None
+
+
+def _extract_with_cache(response: HttpResponse, payload, ruleset: 'RuleSet', kind: str = "js") -> set:
+    """带结果缓存的提取，相同的body只扫描一次"""
+    key = (ruleset.fingerprint, kind) + RESULT_CACHE.make_key(payload, _get_header(response, 'ETag'))
+    result = RESULT_CACHE.get(key)
+    if result is None:
+        begin = time.perf_counter()
+        result = _scan_payload(payload, ruleset, kind)
+        if METRICS is not None:
+            METRICS.scan.observe(time.perf_counter() - begin, kind)
+        RESULT_CACHE.put(key, result)
+    return result
+
+
+def _scan_payload(payload, ruleset: 'RuleSet', kind: str = "js") -> frozenset:
+    matcher = ruleset.matcher_for(kind)
+
+    if kind == "html":
+        # html只扫描内联脚本，规则按html类型筛选，高熵检测按js处理
+        result = set()
+        for script in _iter_inline_scripts(payload):
+            result |= _scan_body(script, matcher, "js")
+        return frozenset(result)
+
+    return frozenset(_scan_body(payload, matcher, kind))
+
+
+def _scan_body(payload, matcher: 'RegexMatcher', kind: str) -> set:
+    if isinstance(payload, str):
+        result = matcher.findall(payload)
+    else:
+        # 二进制body分块扫描，不做整体解码
+        result = scan_stream(_iter_chunks(payload), matcher)
+
+    if ENTROPY_ENABLED and kind in ENTROPY_KINDS:
+        result |= detect_high_entropy(payload)
+    return result
+
+
+# 高熵字符串检测，发现规则库中没有的随机token、JWT secret等，依赖numpy
+# 默认关闭: 打包产物中的integrity哈希、chunk hash等会产生大量误报，需要时手动开启
+ENTROPY_ENABLED = False
+# 参与检测的响应类型
+ENTROPY_KINDS = ("js", "json")
+ENTROPY_MIN_LEN = 20
+ENTROPY_MAX_LEN = 128
+# 香农熵阈值(bit/字符)，32位hex哈希约为3.8，随机base64约为4.5以上
+ENTROPY_THRESHOLD = 4.0
+# 每批向量化计算的token数量
+ENTROPY_BATCH = 65536
+ENTROPY_RULE_KEY = "high_entropy_string"
+# 内置检测器的展示信息，与规则文件中的格式一致
+BUILTIN_RULES = {
+    ENTROPY_RULE_KEY: {
+        "title": "高熵字符串(疑似密钥)", "company": "",
+        "homepage": "", "address": ""
+    },
+}
+
+# 引号包围的字面量
+_QUOTED_TOKEN = re.compile(r"""["'`]([A-Za-z0-9+/=_\-]{%d,%d})["'`]""" % (ENTROPY_MIN_LEN, ENTROPY_MAX_LEN))
+_QUOTED_TOKEN_BYTES = re.compile(_QUOTED_TOKEN.pattern.encode())
+
+# 字符类别: 1 大写 2 小写 4 数字 8 符号
+_CHAR_CLASS = None
+if np is not None:
+    _CHAR_CLASS = np.zeros(256, dtype=np.uint8)
+    _CHAR_CLASS[ord('A'):ord('Z') + 1] = 1
+    _CHAR_CLASS[ord('a'):ord('z') + 1] = 2
+    _CHAR_CLASS[ord('0'):ord('9') + 1] = 4
+    for c in "+/=_-":
+        _CHAR_CLASS[ord(c)] = 8
+    # 类别位图 -> 类别个数
+    _CLASS_COUNT = np.array([bin(i).count("1") for i in range(16)], dtype=np.uint8)
+
+
+def _iter_quoted_tokens(payload):
+    """提取引号包围的候选token，二进制body分块处理，块之间保留重叠"""
+    if isinstance(payload, str):
+        yield from _QUOTED_TOKEN.findall(payload)
+        return
+
+    overlap = ENTROPY_MAX_LEN + 2
+    carry = b""
+    for chunk in _iter_chunks(payload):
+        window = carry + chunk
+        for token in _QUOTED_TOKEN_BYTES.findall(window):
+            yield token.decode('ascii')
+        carry = window[-overlap:]
+
+
+def _score_tokens(tokens: list):
+    """
+    批量计算香农熵和字符类别特征
+    :return: (熵, 类别位图, 数字个数) 三个数组
+    """
+    lengths = np.fromiter(map(len, tokens), dtype=np.int64, count=len(tokens))
+    buf = np.frombuffer("".join(tokens).encode('ascii'), dtype=np.uint8)
+    ids = np.repeat(np.arange(len(tokens), dtype=np.int64), lengths)
+    offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+
+    # 按(token, 字符)统计出现次数: H = log2(L) - sum(c*log2(c)) / L
+    uniq, counts = np.unique(ids * 256 + buf, return_counts=True)
+    counts = counts.astype(np.float64)
+    weighted = np.bincount(uniq >> 8, weights=counts * np.log2(counts), minlength=len(tokens))
+    entropy = np.log2(lengths) - weighted / lengths
+
+    classes = _CHAR_CLASS[buf]
+    class_bits = np.bitwise_or.reduceat(classes, offsets)
+    digits = np.add.reduceat((classes == 4).astype(np.int64), offsets)
+    return entropy, class_bits, digits
+
+
+def detect_high_entropy(payload) -> set:
+    """
+    检测高熵字符串
+    :return: {(ENTROPY_RULE_KEY, token)}
+    """
+    if np is None:
+        return set()
+
+    found = set()
+    tokens = list(set(_iter_quoted_tokens(payload)))
+    for i in range(0, len(tokens), ENTROPY_BATCH):
+        batch = tokens[i:i + ENTROPY_BATCH]
+        entropy, class_bits, digits = _score_tokens(batch)
+        # 至少包含数字、字母在内的三类字符，排除驼峰标识符、纯hex哈希等
+        mask = (entropy >= ENTROPY_THRESHOLD) & (digits >= 2) & ((class_bits & 3) != 0) \
+            & (_CLASS_COUNT[class_bits] >= 3)
+        for index in np.flatnonzero(mask):
+            found.add((ENTROPY_RULE_KEY, batch[index]))
+    return found
+
+
+# 响应分类
+# 各类响应的body大小上限，超出的不扫描；不在表中的类型(如skip)不扫描
+ROUTES = {
+    "js": {"max_size": 50 * 1024 * 1024},
+    "json": {"max_size": 20 * 1024 * 1024},
+    "html": {"max_size": 5 * 1024 * 1024},
+    "sourcemap": {"max_size": 100 * 1024 * 1024},
+}
+# 嗅探body开头的字节数
+SNIFF_SIZE = 4096
+
+_CONTENT_TYPES = [
+    ("javascript", "js"),
+    ("ecmascript", "js"),
+    ("application/json", "json"),
+    ("+json", "json"),
+    ("text/html", "html"),
+    ("application/xhtml", "html"),
+    ("image/", "skip"),
+    ("video/", "skip"),
+    ("audio/", "skip"),
+    ("font/", "skip"),
+    ("application/octet-stream", "skip"),
+    ("application/zip", "skip"),
+    ("application/pdf", "skip"),
+    ("application/wasm", "skip"),
+    ("application/x-protobuf", "skip"),
+    ("text/css", "skip"),
+]
+_EXTENSIONS = {
+    ".js": "js", ".mjs": "js", ".cjs": "js", ".jsx": "js",
+    ".json": "json",
+    ".map": "sourcemap",
+    ".html": "html", ".htm": "html",
+}
+# 不表示具体类型的Content-Type，URL有明确的脚本/数据扩展名时以扩展名为准
+_GENERIC_CONTENT_TYPES = ("application/octet-stream",)
+_SKIP_EXTENSIONS = {
+    ".png", ".jpg", ".jpeg", ".gif", ".webp", ".ico", ".svg", ".bmp", ".avif",
+    ".woff", ".woff2", ".ttf", ".otf", ".eot",
+    ".mp3", ".mp4", ".webm", ".m3u8", ".ts", ".flv",
+    ".zip", ".gz", ".rar", ".7z", ".pdf", ".apk", ".exe", ".wasm", ".css",
+}
+_JS_TOKENS = re.compile(r"\b(?:function|var|let|const|return|window|document|typeof|=>|import|export|require|define)\b|=>")
+_SCRIPT_TAG = re.compile(r"<script\b([^>]*)>(.*?)</script\s*>", re.IGNORECASE | re.DOTALL)
+_SCRIPT_TAG_BYTES = re.compile(_SCRIPT_TAG.pattern.encode(), re.IGNORECASE | re.DOTALL)
+
+_route_lock = threading.Lock()
+ROUTE_STATS = {}
+
+
+def _sniff(payload) -> str|None:
+    """根据body开头的内容判断类型"""
+    head = payload[:SNIFF_SIZE]
+    if not isinstance(head, str):
+        head = bytes(head)
+        if b"\x00" in head:
+            return "skip"
+        head = head.decode('utf-8', 'ignore')
+
+    head = head.lstrip("\ufeff \t\r\n")
+    lower = head[:64].lower()
+    if lower.startswith(("<!doctype html", "<html", "<head", "<body", "<script")):
+        return "html"
+    if head.startswith("{") and '"mappings"' in head and '"version"' in head:
+        return "sourcemap"
+    if head.startswith(("{", "[")):
+        return "json"
+    if head.startswith(")]}'"):
+        return "json"
+    if _JS_TOKENS.search(head):
+        return "js"
+    return None
+
+
+def classify_response(context: Context, response: HttpResponse, payload) -> str:
+    """
+    按Content-Type、URL、body嗅探对响应分类
+    :return: js/json/html/sourcemap/skip
+    """
+    kind = None
+    content_type = (_get_header(response, 'Content-Type') or "").lower()
+    for token, value in _CONTENT_TYPES:
+        if token in content_type:
+            kind = value
+            break
+
+    path = urllib.parse.urlsplit(context.url).path.lower()
+    ext = os.path.splitext(path)[1]
+    if ext in _EXTENSIONS and any(token in content_type for token in _GENERIC_CONTENT_TYPES):
+        kind = None
+    if kind is None:
+        kind = _EXTENSIONS.get(ext)
+        if kind is None and ext in _SKIP_EXTENSIONS:
+            kind = "skip"
+
+    if kind == "skip":
+        return kind
+
+    sniffed = _sniff(payload)
+    if sniffed in ("skip", "html") or (sniffed == "sourcemap" and kind in (None, "json")):
+        # 常见于`.js`地址返回错误页面或二进制内容
+        return sniffed
+    if kind == "json" and ext == ".map":
+        return "sourcemap"
+
+    return kind or sniffed or "skip"
+
+
+def _admit_route(kind: str, size: int) -> bool:
+    """按分类的大小上限决定是否扫描，并计数"""
+    route = ROUTES.get(kind)
+    admitted = route is not None and size <= route["max_size"]
+
+    name = kind if admitted or route is None else f"{kind}_oversize"
+    with _route_lock:
+        ROUTE_STATS[name] = ROUTE_STATS.get(name, 0) + 1
+    return admitted
+
+
+def route_stats() -> dict:
+    """各类响应的计数，`<类型>_oversize`为超出大小上限未扫描的数量"""
+    with _route_lock:
+        return dict(ROUTE_STATS)
+
+
+def _iter_inline_scripts(payload):
+    """html中的内联脚本，忽略外链脚本"""
+    if isinstance(payload, str):
+        pattern = _SCRIPT_TAG
+    else:
+        pattern = _SCRIPT_TAG_BYTES
+        payload = bytes(payload)
+
+    for m in pattern.finditer(payload):
+        body = m.group(2)
+        if body.strip():
+            yield body
+
+
+class ResultCache:
+    def __init__(self, max_entries: int = 4096, max_bytes: int = 16 * 1024 * 1024):
+        """
+        以body内容寻址的提取结果缓存(LRU)
+
+        :param max_entries: 最多缓存的body数量
+        :param max_bytes: 缓存结果占用的最大字节数(按结果字符串长度估算)
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        self._items: OrderedDict = OrderedDict()
+        self._bytes = 0
+
+        # 统计信息
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(payload, etag: str|None = None):
+        """
+        生成缓存key
+        有强ETag时使用`ETag+长度`，否则使用body内容的哈希
+        """
+        if etag and not etag.startswith('W/'):
+            return 'etag', etag, len(payload)
+
+        # 分块计算哈希，避免整体编码产生body大小的拷贝
+        digest = hashlib.blake2b(digest_size=16)
+        for chunk in _iter_chunks(payload):
+            digest.update(chunk.encode('utf-8', 'surrogatepass') if isinstance(chunk, str) else chunk)
+        return 'blake2b', digest.digest(), len(payload)
+
+    @staticmethod
+    def _sizeof(result: frozenset) -> int:
+        return 64 + sum(len(key) + len(str(value)) + 64 for key, value in result)
+
+    def get(self, key) -> frozenset|None:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item
+
+    def put(self, key, result: frozenset):
+        size = self._sizeof(result)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._bytes -= self._sizeof(old)
+
+            self._items[key] = result
+            self._bytes += size
+
+            while len(self._items) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self._bytes -= self._sizeof(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._items),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    pass
+
+
+RESULT_CACHE = ResultCache()
+
+
+def cache_stats() -> dict:
+    """结果缓存的命中/未命中/淘汰计数"""
+    return RESULT_CACHE.stats()
+
+
+# 多进程扫描模式
+# 开启后`on_response`只负责入队，正则提取在子进程中执行，不再占用代理回调线程和GIL
+WORKER_MODE = False
+WORKER_NUM = max((os.cpu_count() or 2) - 1, 1)
+# 排队+执行中的body数量上限
+WORKER_QUEUE_SIZE = 64
+# 队列满时的策略: drop 直接丢弃 / sample 超过半满后按比例抽样、满了丢弃 / block 阻塞等待
+WORKER_FULL_POLICY = "drop"
+WORKER_SAMPLE_RATE = 10
+WORKER_BLOCK_TIMEOUT = 5
+
+EXECUTOR: 'ScanExecutor' = None
+
+
+def _pool_initializer():
+    """子进程初始化，每个子进程只编译一次规则"""
+    load_extract_string()
+
+
+def _pool_scan(payload, fingerprint: str, kind: str = "js") -> Tuple[str, frozenset, dict]:
+    """
+    子进程中执行提取，主进程规则已热加载时先从规则包重新加载
+    同时返回本进程的规则耗时统计增量，由主进程汇总
+    """
+    if RULESET is None or RULESET.fingerprint != fingerprint:
+        load_extract_string()
+
+    ruleset = RULESET
+    result = _scan_payload(payload, ruleset, kind)
+    return ruleset.fingerprint, result, PROFILER.drain()
+
+
+class ScanExecutor:
+    def __init__(self, worker_num: int = 4, queue_size: int = 64, full_policy: str = "drop"):
+        """
+        多进程扫描执行器
+
+        :param worker_num: 子进程数量
+        :param queue_size: 排队+执行中的body数量上限
+        :param full_policy: 队列满时的策略 drop/sample/block
+        """
+        if full_policy not in ("drop", "sample", "block"):
+            raise ValueError(f"Invalid full policy: {full_policy}")
+
+        self.worker_num = max(worker_num, 1)
+        self.queue_size = max(queue_size, 1)
+        self.full_policy = full_policy
+
+        self._pool: ProcessPoolExecutor|None = None
+        self._slots = threading.BoundedSemaphore(self.queue_size)
+        self._lock = threading.Lock()
+
+        # 统计信息
+        self.pending = 0
+        self.submitted = 0
+        self.completed = 0
+        self.dropped = 0
+        self.sampled_out = 0
+        self.failed = 0
+        self._sample_counter = 0
+
+    def start(self):
+        if self._pool is not None:
+            return
+
+        self._pool = ProcessPoolExecutor(max_workers=self.worker_num, initializer=_pool_initializer)
+        logger.info(f"[+]Scan executor start, workers[{self.worker_num}], queue[{self.queue_size}], policy[{self.full_policy}]")
+
+    def shutdown(self):
+        if self._pool is None:
+            return
+
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self._pool = None
+        logger.info(f"[+]Scan executor stopped, {self.stats()}")
+
+    def _admit(self) -> bool:
+        """按队列满时的策略申请一个排队位置，被拒绝时只按一种原因计数"""
+        if self.full_policy == "sample":
+            with self._lock:
+                if self.pending >= self.queue_size // 2:
+                    self._sample_counter += 1
+                    if self._sample_counter % WORKER_SAMPLE_RATE != 0:
+                        self.sampled_out += 1
+                        return False
+
+        if self.full_policy == "block":
+            admitted = self._slots.acquire(timeout=WORKER_BLOCK_TIMEOUT)
+        else:
+            admitted = self._slots.acquire(blocking=False)
+
+        if not admitted:
+            with self._lock:
+                self.dropped += 1
+        return admitted
+
+    def submit(self, context: Context, response: HttpResponse, payload, ruleset: 'RuleSet', kind: str = "js") -> bool:
+        """
+        提交一个body，命中缓存时直接回调
+        :return: 是否被接收
+        """
+        key = (kind,) + RESULT_CACHE.make_key(payload, _get_header(response, 'ETag'))
+        result = RESULT_CACHE.get((ruleset.fingerprint,) + key)
+        if result is not None:
+            self._deliver(context, result, ruleset)
+            return True
+
+        if self._pool is None:
+            with self._lock:
+                self.dropped += 1
+            return False
+
+        if not self._admit():
+            return False
+
+        if isinstance(payload, memoryview):
+            payload = payload.tobytes()
+
+        with self._lock:
+            self.pending += 1
+            self.submitted += 1
+
+        try:
+            future = self._pool.submit(_pool_scan, payload, ruleset.fingerprint, kind)
+        except Exception as exp:
+            logger.error(f"[-]Submit scan task failed: {str(exp)}")
+            self._release(failed=True)
+            return False
+
+        begin = time.perf_counter()
+        future.add_done_callback(lambda f: self._on_done(f, context, key, begin))
+        return True
+
+    def _release(self, failed: bool = False):
+        with self._lock:
+            self.pending -= 1
+            if failed:
+                self.failed += 1
+            else:
+                self.completed += 1
+        self._slots.release()
+
+    def _on_done(self, future, context: Context, key, begin: float):
+        try:
+            fingerprint, result, profile = future.result()
+        except Exception as exp:
+            logger.error(f"[-]Scan task failed: {context.id} - {str(exp)}")
+            self._release(failed=True)
+            return
+
+        self._release()
+        if METRICS is not None:
+            METRICS.task.observe(time.perf_counter() - begin, key[0])
+        PROFILER.merge(profile)
+        RESULT_CACHE.put((fingerprint,) + key, result)
+        self._deliver(context, result)
+
+    def _deliver(self, context: Context, result, ruleset: 'RuleSet' = None):
+        data = _build_rows(context, result, ruleset)
+        if not data:
+            return
+
+        begin = time.perf_counter()
+        try:
+            OnDataHandler(data)
+        except Exception as exp:
+            logger.error(f"[-]On data handler error: {str(exp)}")
+        if METRICS is not None:
+            METRICS.findings.inc(amount=len(data))
+            METRICS.callback.observe(time.perf_counter() - begin)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "pending": self.pending,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "dropped": self.dropped,
+                "sampled_out": self.sampled_out,
+                "failed": self.failed,
+            }
+
+    pass
+
+
+def executor_stats() -> dict|None:
+    """多进程模式的队列统计，未开启时返回None"""
+    return EXECUTOR.stats() if EXECUTOR is not None else None
+
+
+# 指标: 注册到plugin_metrics.REGISTRY，与其他插件共用
+METRICS_ENABLED = plugin_metrics is not None
+# 非0时在本地端口导出Prometheus文本格式(/metrics)和json快照(/snapshot)，与其他插件配置同一端口时共用
+METRICS_PORT = 0
+
+
+class FilterMetrics:
+    def __init__(self, registry):
+        self.responses = registry.counter("filter_responses_total", "Responses received by route kind", ("kind",), rate=True)
+        self.bytes = registry.counter("filter_bytes_total", "Response body bytes received", rate=True)
+        self.scan = registry.histogram("filter_scan_seconds", "Body scan latency on cache miss", ("kind",))
+        self.task = registry.histogram("filter_task_seconds", "Worker task latency including queueing", ("kind",))
+        self.findings = registry.counter("filter_findings_total", "Finding rows reported")
+        self.callback = registry.histogram("filter_callback_seconds", "Async result callback latency")
+        registry.gauge_func("filter_executor_tasks", "Worker queue counters", ("state",),
+                            lambda: {(k,): v for k, v in EXECUTOR.stats().items()} if EXECUTOR is not None else {})
+
+
+METRICS = FilterMetrics(plugin_metrics.REGISTRY) if METRICS_ENABLED else None
+
+
+def metrics_snapshot() -> dict:
+    """插件指标快照"""
+    if METRICS is None:
+        return {}
+    return plugin_metrics.REGISTRY.snapshot("filter_")
+
+
+def extract_kv_with_regex(data):
+    return RULESET.matcher.findall(data)
+
+
+# 单次扫描的多模式匹配引擎
+# 1. 从每条规则中提取必然出现的字面量锚点(如`AKID`、`LTAI`、`JDC_`)，合并为一个前缀过滤正则，只扫描一遍body
+# 2. 仅在锚点命中位置用规则原正则做`match`校验
+# 3. 提取不到锚点的规则，先用合并后的大正则判断是否可能命中，命中后再逐条执行
+MIN_ANCHOR_LEN = 2
+# 无锚点规则的必需字面量最小长度
+MIN_REQUIRED_LEN = 3
+MAX_ANCHOR_LEN = 16
+MAX_ANCHOR_COUNT = 32
+
+
+def _match_value(m: re.Match):
+    """与`findall`保持一致的返回值"""
+    groups = m.groups('')
+    if len(groups) == 0:
+        return m.group(0)
+    if len(groups) == 1:
+        return groups[0]
+    return groups
+
+
+def _literal_prefixes(items, max_len: int = MAX_ANCHOR_LEN) -> Tuple[set|None, bool]:
+    """
+    计算一段正则语法树所有匹配必然以之开头的字面量集合
+    :param max_len: 字面量达到该长度后停止展开
+    :return: (字面量集合, 是否整段都是字面量)，无法提取时集合为None
+    """
+    prefixes = {""}
+    for op, av in items:
+        if op is sre_constants.LITERAL:
+            prefixes = {p + chr(av) for p in prefixes}
+        elif op is sre_constants.IN and all(sub_op is sre_constants.LITERAL for sub_op, _ in av) and len(av) <= 4:
+            prefixes = {p + chr(c) for p in prefixes for _, c in av}
+        elif op is sre_constants.SUBPATTERN:
+            _, add_flags, del_flags, sub = av
+            if add_flags & re.IGNORECASE or del_flags:
+                return _usable_prefixes(prefixes), False
+            sub_prefixes, complete = _literal_prefixes(sub, max_len)
+            if sub_prefixes is None:
+                return _usable_prefixes(prefixes), False
+            prefixes = {p + s for p in prefixes for s in sub_prefixes}
+            if not complete:
+                return _usable_prefixes(prefixes), False
+        elif op is sre_constants.BRANCH:
+            branch_prefixes = set()
+            complete = True
+            for branch in av[1]:
+                sub_prefixes, sub_complete = _literal_prefixes(branch, max_len)
+                if sub_prefixes is None:
+                    return _usable_prefixes(prefixes), False
+                branch_prefixes |= sub_prefixes
+                complete = complete and sub_complete
+            prefixes = {p + s for p in prefixes for s in branch_prefixes}
+            if not complete:
+                return _usable_prefixes(prefixes), False
+        else:
+            return _usable_prefixes(prefixes), False
+
+        if len(prefixes) > MAX_ANCHOR_COUNT:
+            return None, False
+        if min(len(p) for p in prefixes) >= max_len:
+            return _usable_prefixes(prefixes), False
+
+    return prefixes, True
+
+
+def _usable_prefixes(prefixes: set) -> set|None:
+    if len(prefixes) == 0 or min(len(p) for p in prefixes) < MIN_ANCHOR_LEN:
+        return None
+    return prefixes
+
+
+def _extract_anchors(pattern: re.Pattern) -> Tuple[set|None, int]:
+    """
+    提取规则的锚点
+    :return: (锚点集合, 匹配起始位置相对锚点的偏移)
+    锚点在匹配开头时偏移为0；锚点为定长的后行断言`(?<=...)`时，偏移为断言长度
+    """
+    if pattern.flags & re.IGNORECASE:
+        return None, 0
+
+    try:
+        items = list(sre_parse.parse(pattern.pattern, pattern.flags))
+    except Exception:
+        return None, 0
+
+    for index, (op, av) in enumerate(items):
+        if op is sre_constants.AT:
+            continue
+
+        if op is sre_constants.ASSERT and av[0] < 0:
+            # 后行断言整段为字面量时，取其末尾做锚点，匹配起始位置紧跟在锚点之后
+            behind, complete = _literal_prefixes(av[1], max_len=sys.maxsize)
+            if complete and behind and len(behind) == 1 and len(next(iter(behind))) >= MIN_ANCHOR_LEN:
+                anchor = next(iter(behind))[-MAX_ANCHOR_LEN:]
+                return {anchor}, len(anchor)
+            continue
+
+        if op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+            continue
+
+        prefixes, _ = _literal_prefixes(items[index:])
+        return _usable_prefixes(prefixes) if prefixes else None, 0
+
+    return None, 0
+
+
+def _pattern_span(pattern: re.Pattern) -> Tuple[int, int]:
+    """
+    估算规则的最大匹配长度和需要的前后文长度(断言、`\\b`)
+    不定长的规则按`STREAM_MAX_MATCH`截断
+    """
+    try:
+        items = sre_parse.parse(pattern.pattern, pattern.flags)
+    except Exception:
+        return STREAM_MAX_MATCH, STREAM_MAX_MATCH
+
+    width = min(items.getwidth()[1], STREAM_MAX_MATCH)
+    margin = 1
+    for op, av in items:
+        if op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+            margin += min(av[1].getwidth()[1], STREAM_MAX_MATCH)
+    return width, margin
+
+
+def _literal_runs(items) -> List[str]:
+    """语法树中每个匹配都必然包含的连续字面量"""
+    runs = []
+    current = ""
+    for op, av in items:
+        if op is sre_constants.LITERAL:
+            current += chr(av)
+            continue
+
+        runs.append(current)
+        current = ""
+        if op is sre_constants.SUBPATTERN and not av[1] and not av[2]:
+            runs.extend(_literal_runs(av[3]))
+        elif op is sre_constants.ASSERT:
+            runs.extend(_literal_runs(av[1]))
+    runs.append(current)
+    return [run for run in runs if run]
+
+
+def _required_literal(pattern: re.Pattern) -> str|None:
+    """
+    规则匹配时body中必然出现的最长字面量(包含前后断言)
+    body中不含该字面量时可以直接跳过整条规则
+    """
+    if pattern.flags & re.IGNORECASE:
+        return None
+
+    try:
+        runs = _literal_runs(sre_parse.parse(pattern.pattern, pattern.flags))
+    except Exception:
+        return None
+
+    longest = max(runs, key=len, default="")
+    return longest if len(longest) >= MIN_REQUIRED_LEN else None
+
+
+def _has_group_ref(items) -> bool:
+    """语法树中是否有反向引用(含条件分组)，这类规则合并为一个正则后分组编号会变化"""
+    for op, av in items:
+        if op is sre_constants.GROUPREF or op is sre_constants.GROUPREF_EXISTS:
+            return True
+        nodes = [av]
+        while nodes:
+            node = nodes.pop()
+            if isinstance(node, sre_parse.SubPattern):
+                if _has_group_ref(node):
+                    return True
+            elif isinstance(node, (tuple, list)):
+                nodes.extend(node)
+    return False
+
+
+def _can_combine(pattern: re.Pattern) -> bool:
+    try:
+        return not _has_group_ref(sre_parse.parse(pattern.pattern, pattern.flags))
+    except Exception:
+        return False
+
+
+class RegexMatcher:
+    def __init__(self, regexs: dict, analysis: dict|None = None, profiler: 'RuleProfiler' = None):
+        """
+        构建匹配引擎
+        :param regexs: {规则key: 已编译的正则}，str和bytes正则不能混用
+        :param analysis: {规则key: (最大匹配长度, 前后文长度, 锚点, 偏移, 必需字面量)}，规则包中缓存的分析结果
+        :param profiler: 规则耗时统计
+        """
+        self.regexs = regexs
+        self.profiler = profiler
+        self.binary = any(isinstance(reg.pattern, bytes) for reg in regexs.values())
+
+        # 锚点 -> [(规则key, 偏移)]，包含所有以该锚点为前缀的更短锚点对应的规则
+        self.anchored: dict = {}
+        self.fallback: List[str] = []
+
+        # 流式扫描时窗口需要重叠的长度
+        self.max_width = 0
+        self.margin = 0
+
+        # 后行断言锚点在匹配起始位置之前的最大距离
+        self.max_offset = 0
+
+        self.analysis = {}
+        analysis = analysis or {}
+
+        # 无锚点规则 -> 必需字面量
+        self.required = {}
+
+        anchor_rules = {}
+        for key, reg in regexs.items():
+            if key in analysis:
+                width, margin, anchors, offset, required = analysis[key]
+            else:
+                width, margin = _pattern_span(reg)
+                anchors, offset = _extract_anchors(reg)
+                required = _required_literal(reg)
+            self.analysis[key] = (width, margin, anchors, offset, required)
+
+            self.max_width = max(self.max_width, width)
+            self.margin = max(self.margin, margin)
+
+            if anchors is None:
+                self.fallback.append(key)
+                if required is not None:
+                    self.required[key] = required.encode('latin-1') if self.binary else required
+                continue
+            self.max_offset = max(self.max_offset, offset)
+            for anchor in anchors:
+                if self.binary:
+                    anchor = anchor.encode('latin-1')
+                anchor_rules.setdefault(anchor, []).append((key, offset))
+
+        # 长的锚点优先，同一位置只会报告一个锚点，更短的锚点通过前缀关系补齐
+        anchors = sorted(anchor_rules.keys(), key=lambda a: (-len(a), a))
+        for anchor in anchors:
+            self.anchored[anchor] = [
+                rule for other in anchors if anchor.startswith(other) for rule in anchor_rules[other]
+            ]
+
+        # 锚点合并为一个字面量分支正则，逐个位置`search`，比零宽断言写法快数倍
+        self.prefilter = None
+        if anchors:
+            self.prefilter = re.compile(self._join([b"", ""], anchors, [b"", ""]))
+
+        # 无锚点规则合并为一个正则，只用于定位最早可能命中的位置
+        # 含反向引用的规则不参与合并，始终逐条执行
+        self.combined = None
+        self.gated = set()
+        if len(self.fallback) > 1:
+            self.gated = {key for key in self.fallback if _can_combine(regexs[key])}
+        if len(self.gated) > 1:
+            try:
+                self.combined = re.compile(self._join([b"(?:", "(?:"], [regexs[key].pattern for key in self.fallback if key in self.gated], [b")", ")"], escape=False))
+            except re.error as exp:
+                logger.warning(f"[-]Combine fallback regex failed: {str(exp)}")
+                self.combined = None
+        if self.combined is None:
+            self.gated = set()
+
+        self._binary_matcher = None
+
+        logger.info(f"[+]Regex matcher: anchored rules[{len(regexs) - len(self.fallback)}], fallback rules[{len(self.fallback)}]")
+
+    def _join(self, head: list, parts: list, tail: list, escape: bool = True):
+        """拼接正则源码，兼容str/bytes"""
+        index = 0 if self.binary else 1
+        if escape:
+            parts = [re.escape(p) for p in parts]
+            return head[index] + (b"|" if self.binary else "|").join(parts) + tail[index]
+        return (b"|" if self.binary else "|").join(head[index] + p + tail[index] for p in parts)
+
+    def to_binary(self) -> 'RegexMatcher':
+        """用于直接扫描`bytes`/`memoryview`的引擎，规则按UTF-8编码，非ASCII字节视为非单词字符"""
+        if self.binary:
+            return self
+
+        if self._binary_matcher is None:
+            regexs = {}
+            for key, reg in self.regexs.items():
+                try:
+                    regexs[key] = re.compile(reg.pattern.encode('utf-8'), reg.flags & ~re.UNICODE)
+                except re.error as exp:
+                    logger.warning(f"[-]Compile binary regex failed: {key} - {str(exp)}")
+            self._binary_matcher = RegexMatcher(regexs, profiler=self.profiler)
+        return self._binary_matcher
+
+    def iter_matches(self, data, pos: int = 0, skip: dict|None = None):
+        """
+        遍历所有命中，每条规则内部与`findall`一样从左到右、互不重叠
+        设置了`profiler`时统计每条规则的耗时，单条规则超出时间预算后放弃该规则本次的扫描
+
+        :param data: str，或二进制引擎下的bytes-like对象
+        :param pos: 只报告起始位置不小于`pos`的命中
+        :param skip: {规则key: 位置}，该规则只报告起始位置不小于该位置的命中
+        :return: 生成器 (规则key, 起始位置, 结束位置, 值)
+        """
+        regexs = self.regexs
+        skip = skip or {}
+        profiler = self.profiler
+        disabled = profiler.disabled if profiler is not None else frozenset()
+        budget = profiler.budget_for(len(data) - pos) if profiler is not None else 0
+
+        # 本次调用各规则的耗时、命中数、是否超时
+        spent = {}
+        found = {}
+        aborted = set()
+        prefilter_time = 0.0
+        perf_counter = time.perf_counter
+
+        try:
+            if self.prefilter is not None:
+                begin = perf_counter()
+                last_end = dict(skip)
+                search = self.prefilter.search
+                hit = search(data, max(pos - self.max_offset, 0))
+                while hit is not None:
+                    hit_pos = hit.start()
+                    # 下一个锚点可能与当前锚点重叠，从下一个字符继续
+                    next_hit = search(data, hit_pos + 1)
+                    for key, offset in self.anchored[hit.group()]:
+                        start = hit_pos + offset
+                        if start < last_end.get(key, pos) or key in disabled or key in aborted:
+                            continue
+
+                        t0 = perf_counter()
+                        m = regexs[key].match(data, start)
+                        elapsed = spent[key] = spent.get(key, 0.0) + perf_counter() - t0
+                        if budget and elapsed > budget:
+                            aborted.add(key)
+
+                        if m is None:
+                            continue
+                        last_end[key] = max(m.end(), start + 1)
+                        found[key] = found.get(key, 0) + 1
+                        yield key, m.start(), m.end(), _match_value(m)
+                    hit = next_hit
+                prefilter_time = perf_counter() - begin - sum(spent.values())
+
+            fallback = [key for key in self.fallback if key not in self.required or self.required[key] in data]
+            if not fallback:
+                return
+
+            # 合并正则未命中时，参与合并的规则都可以跳过
+            # 有规则被禁用后合并正则中仍包含该规则，不再使用合并正则
+            first = pos
+            if self.combined is not None and not self.gated & disabled:
+                t0 = perf_counter()
+                hit = self.combined.search(data, pos)
+                prefilter_time += perf_counter() - t0
+                first = hit.start() if hit is not None else None
+
+            # 单次`search`内部无法中断，按窗口分段扫描，每个窗口和每次命中之后检查预算
+            # 与流式扫描一样，窗口之间重叠最大匹配长度和前后文长度，只接收起始位置在窗口内的命中
+            overlap = self.max_width + 2 * self.margin
+            end = len(data)
+            for key in fallback:
+                if key in disabled:
+                    continue
+                start = pos
+                if key in self.gated:
+                    if first is None:
+                        continue
+                    start = first
+
+                reg = regexs[key]
+                elapsed = 0.0
+                start = max(start, skip.get(key, pos))
+                while start <= end and key not in aborted:
+                    boundary = start + RULE_SCAN_WINDOW
+                    endpos = boundary + overlap
+                    if endpos >= end:
+                        boundary = endpos = end
+                    matches = reg.finditer(data, start, endpos)
+                    next_start = boundary
+                    while True:
+                        # 计时不包含调用方处理命中的时间
+                        t0 = perf_counter()
+                        m = next(matches, None)
+                        elapsed += perf_counter() - t0
+                        if budget and elapsed > budget:
+                            aborted.add(key)
+                        if m is None or (endpos < end and m.start() >= boundary):
+                            break
+                        next_start = max(next_start, m.end(), m.start() + 1)
+                        found[key] = found.get(key, 0) + 1
+                        yield key, m.start(), m.end(), _match_value(m)
+                        if key in aborted:
+                            break
+                    if endpos >= end:
+                        break
+                    start = next_start
+                spent[key] = elapsed
+        finally:
+            if profiler is not None:
+                profiler.record_call(len(data) - pos, spent, found, aborted, prefilter_time)
+
+    def findall(self, data) -> set:
+        """返回 {(规则key, 值)}"""
+        return {(key, value) for key, _, _, value in self.iter_matches(data)}
+
+    pass
+
+
+# 流式扫描
+# 单条规则最大匹配长度的上限，不定长规则(如`\\d+`)超过该长度的命中在分块边界处可能被截断
+STREAM_MAX_MATCH = 4096
+# 每次读取的分块大小
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+
+def _iter_chunks(payload, chunk_size: int = STREAM_CHUNK_SIZE):
+    """把str/bytes-like的body切分为分块，bytes-like使用memoryview避免拷贝"""
+    if not isinstance(payload, str):
+        payload = memoryview(payload).cast('B')
+    for i in range(0, len(payload), chunk_size):
+        yield payload[i:i + chunk_size]
+
+
+def _decode_value(value):
+    if isinstance(value, bytes):
+        return value.decode('utf-8', 'replace')
+    if isinstance(value, tuple):
+        return tuple(_decode_value(v) for v in value)
+    return value
+
+
+def scan_stream(chunks, matcher: RegexMatcher = None) -> set:
+    """
+    分块扫描body，内存占用上限为 分块大小+窗口重叠长度
+
+    :param chunks: str分块，或bytes/bytearray/memoryview分块(无需整体UTF-8解码)
+    :param matcher: 匹配引擎，默认为当前加载的规则
+    :return: {(规则key, 值)}，与整体扫描`extract_kv_with_regex`结果一致
+    """
+    matcher = matcher or RULESET.matcher
+
+    results = set()
+    # 窗口在整个body中的起始偏移
+    base = 0
+    window = None
+    # 窗口开头这段已经在上一个窗口中处理过，只作为前文使用
+    settled = 0
+    # 每条规则上一次命中的结束位置(全局偏移)
+    last_end = {}
+
+    def _scan(window, base: int, settled: int, boundary: int):
+        skip = {key: max(end - base, settled) for key, end in last_end.items()}
+        for key, start, end, value in engine.iter_matches(window, settled, skip):
+            if start >= boundary:
+                continue
+            last_end[key] = base + max(end, start + 1)
+            results.add((key, _decode_value(value)))
+
+    engine = None
+    for chunk in chunks:
+        if engine is None:
+            engine = matcher if isinstance(chunk, str) else matcher.to_binary()
+            overlap = engine.max_width + 2 * engine.margin
+            window = chunk[:0] if isinstance(chunk, str) else b""
+
+        window = window + chunk
+        boundary = len(window) - overlap
+        # 分块过小时先累积，避免反复扫描重叠部分
+        if boundary - settled < overlap:
+            continue
+
+        # 起始位置在boundary之后的命中可能不完整，留到下一个窗口
+        _scan(window, base, settled, boundary)
+
+        cut = max(boundary - engine.margin, 0)
+        base += cut
+        window = window[cut:]
+        settled = boundary - cut
+
+    if window:
+        _scan(window, base, settled, len(window))
+
+    return results
 
 
 if __name__ == "__main__":
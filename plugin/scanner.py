@@ -1,6 +1,20 @@
 # -*- encoding: utf-8 -*-
+import array
+import asyncio
+import bisect
+import concurrent.futures
+import email.utils
+import http.client
+import importlib.util
+import io
+import itertools
+import hashlib
+import heapq
 import json
+import mmap
 import os.path
+import re
+import ssl
 import traceback
 from urllib.request import Request
 from urllib.response import addinfourl
@@ -8,15 +22,42 @@ import urllib.error
 import queue
 import urllib.parse
 import socket
+import sqlite3
+import struct
+import sys
 import logging
 import threading
+from collections import OrderedDict, deque
 from pathlib import Path
 from typing import List, Tuple, Callable
 from queue import Queue, Empty
 import time
+import uuid
+import weakref
 
 from chui_http import Context, HttpRequest, HttpResponse
 
+def _load_plugin_metrics():
+    """
+    加载插件共用的指标模块lib/plugin_metrics.py，不修改sys.path
+    放在lib目录中不会被当作插件加载，各插件共用sys.modules["plugin_metrics"]中的同一份
+    """
+    module = sys.modules.get("plugin_metrics")
+    if module is not None:
+        return module
+    spec = importlib.util.spec_from_file_location("plugin_metrics", Path(__file__).resolve().parent / "lib" / "plugin_metrics.py")
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["plugin_metrics"] = module
+    try:
+        spec.loader.exec_module(module)
+    except (OSError, ImportError):
+        del sys.modules["plugin_metrics"]
+        return None
+    return module
+
+
+plugin_metrics = _load_plugin_metrics()
+
 
 class NoRedirectHandler(urllib.request.HTTPRedirectHandler):
     """自定义重定向处理器，禁止重定向"""
@@ -24,8 +65,142 @@ class NoRedirectHandler(urllib.request.HTTPRedirectHandler):
         return None  # 返回 None 表示不处理重定向
 
 
+# DNS缓存: 所有扫描线程和异步引擎共用，同一主机只解析一次
+# getaddrinfo不返回记录的TTL，按DNS_CACHE_TTL统一过期，解析失败按DNS_NEGATIVE_TTL缓存
+DNS_CACHE_ENABLED = True
+DNS_CACHE_TTL = 300
+DNS_NEGATIVE_TTL = 30
+DNS_CACHE_SIZE = 4096
+
+
+class DnsCache:
+    """带过期时间的解析缓存，并发解析同一主机时只有一个线程真正发起查询"""
+    def __init__(self, ttl: float = DNS_CACHE_TTL, negative_ttl: float = DNS_NEGATIVE_TTL, max_size: int = DNS_CACHE_SIZE):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._pending = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _cached(self, key: tuple):
+        """:return: (是否命中, 结果或异常)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[1]
+
+    @staticmethod
+    def _result(value):
+        if isinstance(value, socket.gaierror):
+            raise socket.gaierror(value.errno, value.strerror)
+        return value
+
+    def resolve(self, host: str, port: int) -> list:
+        """与socket.getaddrinfo(host, port, type=SOCK_STREAM)的返回值一致"""
+        key = (host.lower(), port)
+        found, value = self._cached(key)
+        if found:
+            return self._result(value)
+
+        with self._lock:
+            lock = self._pending.setdefault(key, threading.Lock())
+        with lock:
+            # 等待期间其他线程可能已经解析完成
+            found, value = self._cached(key)
+            if found:
+                return self._result(value)
+            try:
+                value = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+                expires = time.monotonic() + self.ttl
+            except socket.gaierror as e:
+                value = e
+                expires = time.monotonic() + self.negative_ttl
+            with self._lock:
+                self.misses += 1
+                self._entries[key] = (expires, value)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+                self._pending.pop(key, None)
+        return self._result(value)
+
+    async def resolve_async(self, host: str, port: int) -> list:
+        """命中缓存时不切换线程，未命中时在线程池中解析"""
+        found, value = self._cached((host.lower(), port))
+        if found:
+            return self._result(value)
+        return await asyncio.get_running_loop().run_in_executor(None, self.resolve, host, port)
+
+    def create_connection(self, address: Tuple[str, int], timeout=socket._GLOBAL_DEFAULT_TIMEOUT, source_address=None, *args, **kwargs) -> socket.socket:
+        """socket.create_connection的替代，使用缓存的解析结果"""
+        host, port = address
+        error = None
+        for family, type_, proto, _, sockaddr in self.resolve(host, port):
+            sock = None
+            try:
+                sock = socket.socket(family, type_, proto)
+                if timeout is not socket._GLOBAL_DEFAULT_TIMEOUT:
+                    sock.settimeout(timeout)
+                if source_address:
+                    sock.bind(source_address)
+                sock.connect(sockaddr)
+                return sock
+            except OSError as e:
+                error = e
+                if sock is not None:
+                    sock.close()
+        raise error or OSError(f"getaddrinfo returns an empty list: {host}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+DNS_CACHE = DnsCache() if DNS_CACHE_ENABLED else None
+
+
+class _CachedHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = DNS_CACHE.create_connection
+
+
+class _CachedHTTPSConnection(http.client.HTTPSConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = DNS_CACHE.create_connection
+
+
+_CACHED_CONNECTIONS = {
+    http.client.HTTPConnection: _CachedHTTPConnection,
+    http.client.HTTPSConnection: _CachedHTTPSConnection,
+}
+
+
+class _CachedResolveMixin:
+    """建立连接时使用DNS缓存，TLS的SNI和证书校验仍使用原主机名"""
+    def do_open(self, http_class, req, **http_conn_args):
+        return super().do_open(_CACHED_CONNECTIONS.get(http_class, http_class), req, **http_conn_args)
+
+
+class CachedHTTPHandler(_CachedResolveMixin, urllib.request.HTTPHandler):
+    pass
+
+
+class CachedHTTPSHandler(_CachedResolveMixin, urllib.request.HTTPSHandler):
+    pass
+
+
 # 创建自定义的 OpenerDirector，禁用重定向
-opener = urllib.request.build_opener(NoRedirectHandler)
+opener = urllib.request.build_opener(NoRedirectHandler, *((CachedHTTPHandler, CachedHTTPSHandler) if DNS_CACHE is not None else ()))
 urllib.request.install_opener(opener)  # 全局生效（可选）
 
 
@@ -86,30 +261,1340 @@ def _get_response_length(response: addinfourl|None) -> int:
         response.close()
         return len(data)
 
+# 探测模式: get   完整GET请求
+#          head  先发HEAD请求，只有感兴趣的命中才拉取完整body
+#          range GET请求带Range头，只读取body前PROBE_RANGE_BYTES字节
+# 服务端不能正确处理HEAD/Range时，该主机回退为GET
+PROBE_MODE = "get"
+PROBE_RANGE_BYTES = 1024
+# 只有这些状态码的命中才会拉取完整body，其余命中只保留响应头和body前缀
+PROBE_FETCH_STATUS = (200,)
+# 拉取完整body的大小上限，响应头声明的长度超过上限时只记录响应头，未声明长度时最多读取上限字节，0表示不限制
+PROBE_FETCH_MAX_BYTES = 1024 * 1024
+# 只拉取这些类型的body(Content-Type包含其中之一，未声明类型时也拉取)，图片、压缩包等只记录响应头
+PROBE_FETCH_TYPES = ("text/", "json", "xml", "javascript")
+# 表示服务端不支持该探测方式的状态码
+_PROBE_UNSUPPORTED = {
+    "head": (400, 405, 501),
+    "range": (416, 501),
+}
+
+
+def _probe_args(mode: str) -> Tuple[str, dict]:
+    """探测请求的method和附加请求头"""
+    if mode == "head":
+        return "HEAD", {}
+    return "GET", {"Range": f"bytes=0-{PROBE_RANGE_BYTES - 1}"}
+
+
+def _need_fetch(probe: 'ProbeResponse', mode: str, prefix: int) -> bool:
+    """探测命中是否需要拉取完整body: 状态码匹配、body未读完、文本类型且不超过大小上限"""
+    if probe.status not in PROBE_FETCH_STATUS:
+        return False
+    if mode != "head" and probe.content_length <= prefix:
+        return False
+    content_type = (probe.headers.get("Content-Type") or "").lower()
+    if (PROBE_FETCH_MAX_BYTES > 0 and probe.content_length > PROBE_FETCH_MAX_BYTES) or \
+            (content_type and not any(t in content_type for t in PROBE_FETCH_TYPES)):
+        PROBE_HOSTS.count_skip()
+        return False
+    return True
+
+
+def _content_length(headers, default: int) -> int:
+    """完整body长度，优先使用Content-Range中的总长度"""
+    content_range = headers.get("Content-Range", "")
+    total = content_range.rpartition("/")[2].strip()
+    if total.isdigit():
+        return int(total)
+    content_length = headers.get("Content-Length", "")
+    if content_length.isdigit():
+        return int(content_length)
+    return default
+
+
+class HostProbeModes:
+    """记录主机的探测方式，HEAD/Range处理异常的主机回退为GET"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._fallback = set()
+        self._verified = set()
+
+        # 统计信息
+        self.fallbacks = 0
+        self.fetches = 0
+        self.skipped = 0
+
+    def mode_for(self, host: str, mode: str) -> str:
+        if mode == "get" or host in self._fallback:
+            return "get"
+        return mode
+
+    def fallback(self, host: str, mode: str, reason: str):
+        with self._lock:
+            if host in self._fallback:
+                return
+            self._fallback.add(host)
+            self.fallbacks += 1
+        logger.info(f"[+]Probe fallback to GET[{host}], {mode}: {reason}")
+
+    def need_verify(self, host: str) -> bool:
+        """每个主机首个HEAD命中需要用GET校验一次状态码"""
+        with self._lock:
+            if host in self._verified:
+                return False
+            self._verified.add(host)
+            return True
+
+    def count_fetch(self):
+        with self._lock:
+            self.fetches += 1
+
+    def count_skip(self):
+        with self._lock:
+            self.skipped += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "fallback_hosts": len(self._fallback),
+                "verified_hosts": len(self._verified),
+                "fallbacks": self.fallbacks,
+                "fetches": self.fetches,
+                "skipped_fetches": self.skipped,
+            }
+
+
+PROBE_HOSTS = HostProbeModes()
+
+
+def probe_stats() -> dict:
+    """探测模式统计"""
+    return PROBE_HOSTS.stats()
+
+
+class ProbeResponse:
+    """
+    探测请求的响应，接口与urllib的addinfourl一致
+    只保留响应头和body前缀，第一次read()时才拉取完整body
+    """
+    def __init__(self, url: str, status: int, reason: str, headers, body: bytes, fetch: Callable[[], bytes]|None = None):
+        self.url = url
+        self.status = status
+        self.code = status
+        self.reason = reason
+        self.headers = headers
+        self.msg = reason
+        # 完整body长度
+        self.content_length = _content_length(headers, len(body))
+        self._fp = io.BytesIO(body)
+        self._fetch = fetch
+        # 异步引擎中需要补发GET拉取完整body
+        self.deferred = False
+
+    def getheader(self, name: str, default=None):
+        return self.headers.get(name, default)
+
+    def getcode(self) -> int:
+        return self.status
+
+    def geturl(self) -> str:
+        return self.url
+
+    def info(self):
+        return self.headers
+
+    def read(self, amt: int = None) -> bytes:
+        if self._fetch is not None:
+            fetch, self._fetch = self._fetch, None
+            try:
+                self._fp = io.BytesIO(fetch())
+                PROBE_HOSTS.count_fetch()
+            except Exception as e:
+                logger.warning(f"[-]Fetch body failed: {self.url} - {str(e)}")
+        return self._fp.read(amt)
+
+    def peek(self) -> bytes:
+        """已读取的body，不触发拉取"""
+        return self._fp.getvalue()
+
+    def close(self):
+        self._fetch = None
+        self._fp.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+# 泛解析/软404校准: 每个目标的每个目录先请求随机不存在的路径，记录响应指纹，
+# 与指纹匹配的命中视为泛解析结果直接丢弃，不进入回调
+WILDCARD_CALIBRATION = True
+# 每个目录的校准请求数
+WILDCARD_PROBES = 2
+# 单个目标最多校准的目录数，超过后新目录不再校准
+WILDCARD_MAX_DIRECTORIES = 256
+# simhash汉明距离阈值
+WILDCARD_SIMHASH_DISTANCE = 6
+# 没有body时按长度比较的容差
+WILDCARD_LENGTH_TOLERANCE = 0.02
+# 参与指纹计算的body前缀长度
+WILDCARD_FINGERPRINT_BYTES = 65536
+
+_TOKEN = re.compile(rb'[A-Za-z0-9_]+')
+# 时间戳、请求ID等数字统一替换，减少动态内容对simhash的影响
+_DIGITS = re.compile(rb'[0-9]+')
+
+
+def _is_hit(status: int) -> bool:
+    """与_handle_result的命中条件一致"""
+    return status in [200, 403] or (300 <= status < 400)
+
+
+def _simhash(data: bytes) -> int:
+    """64位simhash，按单词计算"""
+    weights = [0] * 64
+    for token in set(_TOKEN.findall(_DIGITS.sub(b'0', data))):
+        value = int.from_bytes(hashlib.blake2b(token, digest_size=8).digest(), 'little')
+        for bit in range(64):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    return sum(1 << bit for bit in range(64) if weights[bit] > 0)
+
+
+class ResponseFingerprint:
+    """响应指纹: 状态码、Content-Type、长度、body的simhash、归一化的Location"""
+    __slots__ = ('status', 'content_type', 'length', 'simhash', 'location', 'echo')
+
+    def __init__(self, status: int, content_type: str, length: int, simhash: int|None, location: str, echo: int = 0):
+        self.status = status
+        self.content_type = content_type
+        self.length = length
+        self.simhash = simhash
+        self.location = location
+        # 没有body时无法去掉回显的路径，记录路径长度用于放宽长度比较
+        self.echo = echo
+
+    @staticmethod
+    def from_response(path: str, status: int, response) -> 'ResponseFingerprint':
+        """
+        计算指纹，body和Location中回显的请求路径先替换掉，避免路径长度影响结果
+        :param response: ProbeResponse或AsyncResponse
+        """
+        body = response.peek()[:WILDCARD_FINGERPRINT_BYTES]
+        length = getattr(response, 'content_length', len(body))
+        name = path.rstrip('/').rsplit('/', 1)[-1]
+        location = response.headers.get('Location', '')
+
+        echoes = {path, urllib.parse.unquote(path), name, urllib.parse.unquote(name)} - {''}
+        for echo in sorted(echoes, key=len, reverse=True):
+            location = location.replace(echo, '{}')
+            echo = echo.encode('utf-8', 'ignore')
+            count = body.count(echo)
+            if count:
+                body = body.replace(echo, b'')
+                length -= count * len(echo)
+
+        content_type = response.headers.get('Content-Type', '').split(';', 1)[0].strip().lower()
+        if body:
+            return ResponseFingerprint(status, content_type, length, _simhash(body), location)
+        return ResponseFingerprint(status, content_type, length, None, location, len(path))
+
+    def matches(self, other: 'ResponseFingerprint') -> bool:
+        if self.status != other.status or self.content_type != other.content_type:
+            return False
+        if 300 <= self.status < 400:
+            return self.location == other.location
+        similar_length = abs(self.length - other.length) <= max(self.length, other.length) * WILDCARD_LENGTH_TOLERANCE
+        if self.simhash is not None and other.simhash is not None:
+            # 长度接近时允许更大的汉明距离，短页面中少量动态单词就会翻转较多位
+            distance = bin(self.simhash ^ other.simhash).count('1')
+            return distance <= WILDCARD_SIMHASH_DISTANCE * (2 if similar_length else 1)
+        # 路径可能在body中回显多次，按两次估算
+        slack = 2 * abs(self.echo - other.echo)
+        return similar_length or abs(self.length - other.length) <= slack
+
+
+class WildcardCalibrator:
+    """单个目标的泛解析指纹，按目录保存"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clusters = {}
+        self._locks = {}
+
+    @staticmethod
+    def directory_of(path: str) -> str:
+        path = path.strip('/')
+        return path.rsplit('/', 1)[0] if '/' in path else ''
+
+    @staticmethod
+    def random_paths(directory: str) -> List[str]:
+        """随机路径，其中一个带扩展名"""
+        prefix = f"{directory}/" if directory else ""
+        paths = [f"{prefix}{uuid.uuid4().hex[:12]}" for _ in range(WILDCARD_PROBES)]
+        if paths:
+            paths[-1] += ".php"
+        return paths
+
+    def lock_for(self, directory: str) -> threading.Lock:
+        with self._lock:
+            lock = self._locks.get(directory)
+            if lock is None:
+                lock = self._locks[directory] = threading.Lock()
+            return lock
+
+    def is_calibrated(self, directory: str) -> bool:
+        # 目录过多时不再校准，按未校准处理
+        return directory in self._clusters or len(self._clusters) >= WILDCARD_MAX_DIRECTORIES
+
+    def add(self, directory: str, fingerprints: List[ResponseFingerprint]):
+        with self._lock:
+            self._clusters[directory] = fingerprints
+            self._locks.pop(directory, None)
+        if fingerprints:
+            logger.info(f"[+]Wildcard response detected[/{directory}], status: {[fp.status for fp in fingerprints]}")
+
+    def match(self, directory: str, fingerprint: ResponseFingerprint) -> bool:
+        return any(fingerprint.matches(fp) for fp in self._clusters.get(directory, ()))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "directories": len(self._clusters),
+                "wildcard_directories": sum(1 for fps in self._clusters.values() if fps),
+            }
+
+
+# 自适应并发(AIMD): 每轮请求延迟、错误率正常时并发+1，
+# 超时、429/503、p95延迟升高时并发减半；首次拥塞前按慢启动每轮翻倍
+ADAPTIVE_CONCURRENCY = True
+ADAPTIVE_MIN_CONCURRENCY = 1
+# 线程引擎的并发上限(线程数)
+ADAPTIVE_MAX_THREADS = 50
+# p95延迟超过基线的倍数，且增加量超过ADAPTIVE_LATENCY_DELTA(秒)时视为拥塞
+# 绝对增量用于过滤低延迟目标上的抖动
+ADAPTIVE_LATENCY_FACTOR = 3.0
+ADAPTIVE_LATENCY_DELTA = 0.02
+# 每轮错误率超过该值视为拥塞
+ADAPTIVE_ERROR_RATE = 0.1
+# 统计展示用的延迟样本数
+ADAPTIVE_WINDOW = 200
+# 每轮最少请求数，并发较低时避免按个别样本调整
+ADAPTIVE_MIN_ROUND = 10
+# Retry-After最长等待时间(秒)
+ADAPTIVE_MAX_RETRY_AFTER = 60
+# 每个目标每秒最大请求数，0表示不限制
+MAX_REQUESTS_PER_SECOND = 0
+# 表示服务端过载的状态码
+_CONGESTION_STATUS = (429, 503)
+
+
+def _parse_retry_after(value: str|None) -> float|None:
+    """Retry-After支持秒数和HTTP日期两种格式"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(email.utils.parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class AdaptiveLimiter:
+    """
+    单个目标的自适应并发控制
+    线程引擎通过acquire阻塞等待，异步引擎通过try_acquire返回的等待时间自行调度
+    """
+    def __init__(self, initial: int, max_limit: int, min_limit: int = ADAPTIVE_MIN_CONCURRENCY, max_rps: float = MAX_REQUESTS_PER_SECOND):
+        self.min_limit = max(min_limit, 1)
+        self.max_limit = max(max_limit, self.min_limit)
+        self.limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self.max_rps = max_rps
+
+        self._cond = threading.Condition(threading.Lock())
+        self.in_flight = 0
+        self._latencies = deque(maxlen=ADAPTIVE_WINDOW)
+        self._round_latencies = []
+        self._baseline = None
+        self._round_done = 0
+        self._round_errors = 0
+        self._round_decreased = False
+        self._pause_until = 0.0
+        self._next_slot = 0.0
+        self._slow_start = True
+
+        # 统计信息
+        self.increases = 0
+        self.decreases = 0
+
+    def try_acquire(self) -> float:
+        """
+        尝试占用一个并发名额
+        :return: 0表示成功，否则为建议的等待时间(秒)
+        """
+        with self._cond:
+            now = time.monotonic()
+            if now < self._pause_until:
+                return self._pause_until - now
+            if self.in_flight >= int(self.limit):
+                return 0.05
+            if self.max_rps > 0:
+                if now < self._next_slot:
+                    return self._next_slot - now
+                self._next_slot = max(now, self._next_slot) + 1.0 / self.max_rps
+            self.in_flight += 1
+            return 0.0
+
+    def acquire(self, stop_event: threading.Event = None) -> bool:
+        """阻塞直到占用一个并发名额，扫描停止时返回False"""
+        while stop_event is None or not stop_event.is_set():
+            wait = self.try_acquire()
+            if wait == 0:
+                return True
+            with self._cond:
+                self._cond.wait(timeout=min(wait, 1.0))
+        return False
+
+    def cancel(self):
+        """归还未使用的名额，不参与并发调整"""
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def release(self, latency: float|None, congested: bool = False, retry_after: float|None = None):
+        """
+        释放并发名额，并根据本次请求结果调整并发
+        :param latency: 请求耗时(秒)，网络错误时为None
+        :param congested: 是否出现超时、429/503等过载信号
+        :param retry_after: 服务端要求的等待时间(秒)
+        """
+        with self._cond:
+            now = time.monotonic()
+            self.in_flight -= 1
+            if latency is not None:
+                self._latencies.append(latency)
+                self._round_latencies.append(latency)
+            self._round_done += 1
+            if congested:
+                self._round_errors += 1
+            if retry_after:
+                self._pause_until = max(self._pause_until, now + min(retry_after, ADAPTIVE_MAX_RETRY_AFTER))
+
+            if congested and not self._round_decreased:
+                # 过载信号立即减半，同一轮内只减一次
+                self._decrease()
+            elif self._round_done >= max(int(self.limit), ADAPTIVE_MIN_ROUND):
+                self._end_round()
+            self._cond.notify_all()
+
+    @staticmethod
+    def _p95(samples) -> float:
+        latencies = sorted(samples)
+        return latencies[int(len(latencies) * 0.95)] if latencies else 0.0
+
+    def _end_round(self):
+        """一轮(约等于当前并发数个请求)结束，按本轮延迟决定加或减"""
+        latencies = sorted(self._round_latencies)
+        p95 = self._p95(latencies)
+        if latencies:
+            p50 = latencies[len(latencies) // 2]
+            # 基线取历史最低的p50，允许缓慢上浮以适应目标负载变化
+            # 已降到最低并发时的延迟即为目标的空载延迟，直接作为基线
+            if self._baseline is None or p50 < self._baseline or self.limit <= self.min_limit:
+                self._baseline = p50
+            else:
+                self._baseline += (p50 - self._baseline) * 0.01
+
+        slow = self._baseline is not None and p95 > self._baseline * ADAPTIVE_LATENCY_FACTOR \
+            and p95 - self._baseline > ADAPTIVE_LATENCY_DELTA
+        if self._round_errors > self._round_done * ADAPTIVE_ERROR_RATE or slow:
+            if not self._round_decreased:
+                self._decrease()
+                return
+        elif self.limit < self.max_limit:
+            self.limit = min(self.limit * 2 if self._slow_start else self.limit + 1, self.max_limit)
+            self.increases += 1
+        self._reset_round()
+
+    def _decrease(self):
+        self._slow_start = False
+        self.limit = max(self.limit * 0.5, self.min_limit)
+        self.decreases += 1
+        self._reset_round()
+        self._round_decreased = True
+
+    def _reset_round(self):
+        self._round_done = 0
+        self._round_errors = 0
+        self._round_decreased = False
+        self._round_latencies = []
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "concurrency": int(self.limit),
+                "in_flight": self.in_flight,
+                "p95_ms": round(self._p95(self._latencies) * 1000, 1),
+                "baseline_ms": round((self._baseline or 0) * 1000, 1),
+                "paused": max(self._pause_until - time.monotonic(), 0.0),
+                "increases": self.increases,
+                "decreases": self.decreases,
+            }
+
+
+# urllib.parse.quote不会编码的字符
+_QUOTE_SAFE = re.compile(r'[A-Za-z0-9_.\-~/]*')
+
+# 字典编译后的缓存文件，使用mmap加载，多个进程/目标共享同一份内存
+WORDLIST_MMAP = True
+WORDLIST_CACHE_SUFFIX = ".wordlist"
+_WORDLIST_MAGIC = b"SFWL\x01"
+# magic, 源文件mtime_ns, 源文件大小, 路径数, 偏移数组类型, 数据长度
+_WORDLIST_HEADER = struct.Struct("<5sqqQcQ")
+
+
+class Wordlist:
+    """
+    只读的紧凑字典: 所有路径按utf-8编码拼接为一块连续数据，另存一个偏移数组
+    100万条路径约占用 数据长度 + 4MB，远小于同样内容的set[str]
+    """
+    # 构建时已去重
+    has_duplicates = False
+
+    def __init__(self, data, offsets, source=None):
+        # data: bytes或mmap，offsets: array或memoryview，长度为路径数+1
+        self._data = data
+        self._offsets = offsets
+        self._mmap = source
+
+    @staticmethod
+    def from_paths(paths) -> 'Wordlist':
+        """从路径迭代器构建，重复路径只保留第一次出现"""
+        if isinstance(paths, (Wordlist, GeneratedWordlist, MergedWordlist)):
+            return paths
+        buf = bytearray()
+        offsets = array.array('Q', [0])
+        seen = set()
+        for path in paths:
+            if path in seen:
+                continue
+            seen.add(path)
+            buf += path.encode('utf-8')
+            offsets.append(len(buf))
+        del seen
+        if len(buf) < 2 ** 32:
+            offsets = array.array('I', offsets)
+        return Wordlist(bytes(buf), offsets)
+
+    @staticmethod
+    def load(file: str, source_file: str = None) -> 'Wordlist|None':
+        """
+        mmap加载编译好的字典，源文件已修改或格式不对时返回None
+        :param source_file: 源字典文件，用于校验缓存是否过期
+        """
+        try:
+            with open(file, 'rb') as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+
+        view = offsets = data = None
+        try:
+            magic, mtime, size, count, typecode, data_len = _WORDLIST_HEADER.unpack_from(mm, 0)
+            if magic != _WORDLIST_MAGIC:
+                raise ValueError("bad magic")
+            if source_file is not None:
+                stat = os.stat(source_file)
+                if (stat.st_mtime_ns, stat.st_size) != (mtime, size):
+                    raise ValueError("stale")
+            typecode = typecode.decode()
+            begin = _WORDLIST_HEADER.size
+            end = begin + (count + 1) * array.array(typecode).itemsize
+            if end + data_len != len(mm):
+                raise ValueError("truncated")
+            view = memoryview(mm)
+            offsets = view[begin:end].cast(typecode)
+            data = view[end:end + data_len]
+            if offsets[0] != 0 or offsets[-1] != data_len:
+                raise ValueError("bad offsets")
+            return Wordlist(data, offsets, mm)
+        except (ValueError, TypeError, OSError, struct.error):
+            # 文件被截断或损坏，返回None由调用方重新生成缓存
+            # mmap上还有memoryview时close会抛BufferError，先释放
+            for item in (data, offsets, view):
+                if item is not None:
+                    item.release()
+            try:
+                mm.close()
+            except BufferError:
+                pass
+            return None
+
+    def save(self, file: str, source_file: str = None):
+        """写入编译后的字典，先写临时文件再替换"""
+        mtime, size = 0, 0
+        if source_file is not None:
+            stat = os.stat(source_file)
+            mtime, size = stat.st_mtime_ns, stat.st_size
+        typecode = self._offsets.format if isinstance(self._offsets, memoryview) else self._offsets.typecode
+        tmp_file = f"{file}.{os.getpid()}.tmp"
+        with open(tmp_file, 'wb') as f:
+            f.write(_WORDLIST_HEADER.pack(_WORDLIST_MAGIC, mtime, size, len(self), typecode.encode(), len(self._data)))
+            f.write(bytes(self._offsets) if isinstance(self._offsets, memoryview) else self._offsets.tobytes())
+            f.write(self._data)
+        os.replace(tmp_file, file)
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index: int) -> str:
+        return bytes(self._data[self._offsets[index]:self._offsets[index + 1]]).decode('utf-8')
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def fingerprint(self) -> str:
+        """内容摘要，用于判断恢复扫描时字典是否变化"""
+        if getattr(self, '_fingerprint', None) is None:
+            digest = hashlib.blake2b(digest_size=8)
+            digest.update(self._offsets)
+            digest.update(self._data)
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    def nbytes(self) -> int:
+        """数据和偏移数组占用的字节数"""
+        return len(self._data) + len(self._offsets) * (self._offsets.itemsize)
+
+    def index_of(self, path: str) -> int|None:
+        """路径的序号，不在字典中返回None；首次调用时建立按hash排序的索引，每条路径12字节"""
+        index = getattr(self, '_index', None)
+        if index is None:
+            keys = [hash(p) for p in self]
+            positions = array.array('I', sorted(range(len(keys)), key=keys.__getitem__))
+            index = self._index = (array.array('q', (keys[i] for i in positions)), positions)
+        hashes, positions = index
+        key = hash(path)
+        i = bisect.bisect_left(hashes, key)
+        while i < len(hashes) and hashes[i] == key:
+            if self[positions[i]] == path:
+                return positions[i]
+            i += 1
+        return None
+
+
+# 生成式字典: 插件目录下存在规则文件时代替DIR.txt
+# 候选路径按序号即时计算，不保存展开结果，内存和启动时间只与来源词数有关
+# 规则文件格式(每行一条):
+#   @source 文件     来源字典，可多个，相对规则文件所在目录，合并去重后作为{word}，未指定时使用DIR.txt
+#   @mutate 变形,... 对每个词追加变形后的词: lower/upper/capitalize
+#   模板            {word}为来源中的词，{a,b,c}展开为候选，如 {word}{.bak,.old,~}、{word}/{index.php,login}
+WORDLIST_RULES_FILE = "DIR.rules"
+# 单个模板展开的前后缀组合数上限
+TEMPLATE_MAX_COMBOS = 10000
+
+_MUTATIONS = {
+    "lower": str.lower,
+    "upper": str.upper,
+    "capitalize": str.capitalize,
+}
+_TEMPLATE_GROUP = re.compile(r'\{([^{}]*)\}')
+
+
+def _quote_path(path: str) -> str:
+    """与字典加载时的路径编码一致，只含安全字符的路径不编码"""
+    return path if _QUOTE_SAFE.fullmatch(path) else urllib.parse.quote(path)
+
+
+class PathTemplate:
+    """
+    路径模板，展开为(前缀, 后缀)组合，{word}最多出现一次
+    不含{word}的模板直接展开为固定路径
+    """
+    def __init__(self, text: str):
+        self.text = text.strip().lstrip('/')
+        parts = []
+        pos = 0
+        word_at = None
+        for m in _TEMPLATE_GROUP.finditer(self.text):
+            if m.start() > pos:
+                parts.append([_quote_path(self.text[pos:m.start()])])
+            if m.group(1) == "word":
+                if word_at is not None:
+                    raise ValueError(f"multiple {{word}} in template: {text}")
+                word_at = len(parts)
+            else:
+                parts.append([_quote_path(alt) for alt in m.group(1).split(',')])
+            pos = m.end()
+        if pos < len(self.text):
+            parts.append([_quote_path(self.text[pos:])])
+
+        self.has_word = word_at is not None
+        split = word_at if self.has_word else len(parts)
+        count = 1
+        for alts in parts:
+            count *= len(alts)
+        if count > TEMPLATE_MAX_COMBOS:
+            raise ValueError(f"too many combinations ({count}) in template: {text}")
+
+        prefixes = [''.join(c) for c in itertools.product(*parts[:split])]
+        suffixes = [''.join(c) for c in itertools.product(*parts[split:])]
+        self.combos = [(p, s) for p in prefixes for s in suffixes]
+        # 反查候选时先按前后缀过滤
+        self._prefixes = tuple(set(prefixes))
+        self._suffixes = tuple(set(suffixes))
+        if not self.has_word:
+            self._literals = {}
+            for i, (p, s) in enumerate(self.combos):
+                self._literals.setdefault(p + s, i)
+
+    def size(self, words: int) -> int:
+        return (words if self.has_word else 1) * len(self.combos)
+
+    def locate(self, path: str, word_index: Callable[[str], int|None]) -> int|None:
+        """path在本模板展开结果中的最小序号"""
+        if not self.has_word:
+            return self._literals.get(path)
+        if not path.startswith(self._prefixes) or not path.endswith(self._suffixes):
+            return None
+        best = None
+        count = len(self.combos)
+        for i, (p, s) in enumerate(self.combos):
+            if len(path) <= len(p) + len(s) or not path.startswith(p) or not path.endswith(s):
+                continue
+            k = word_index(path[len(p):len(path) - len(s)])
+            if k is not None and (best is None or k * count + i < best):
+                best = k * count + i
+        return best
+
+
+class GeneratedWordlist:
+    """
+    模板 x 变形后的词 展开的虚拟字典，接口与Wordlist一致
+    序号依次为: 模板 -> 词(每个来源词后跟它的变形) -> 前后缀组合
+    不同展开得到相同路径时只有序号最小的有效，其余由游标跳过，判断只依赖路径本身，与扫描顺序无关
+    """
+    has_duplicates = True
+
+    def __init__(self, words: Wordlist, templates: List[PathTemplate], mutations: Tuple[str, ...] = ()):
+        self.words = words
+        self.templates = templates
+        self.mutations = tuple(mutations)
+        self._funcs = (None,) + tuple(_MUTATIONS[name] for name in self.mutations)
+        self._word_count = len(words) * len(self._funcs)
+        self._offsets = [0]
+        for template in templates:
+            self._offsets.append(self._offsets[-1] + template.size(self._word_count))
+        # 变形后的词 -> 最小的词序号，只与来源词数有关
+        self._word_indices = {}
+        for b, word in enumerate(words):
+            for j, func in enumerate(self._funcs):
+                self._word_indices.setdefault(func(word) if func is not None else word, b * len(self._funcs) + j)
+        self._fingerprint = None
+
+    @staticmethod
+    def from_rules(rules_file: str, default_source: str, iter_source: Callable[[str], object]) -> 'GeneratedWordlist':
+        """
+        解析规则文件
+        :param iter_source: 读取来源文件，返回标准化后的路径迭代器
+        """
+        base_dir = os.path.dirname(os.path.abspath(rules_file))
+        sources, mutations, templates = [], [], []
+        with open(rules_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith(('#', ';', '//')):
+                    continue
+                if line.startswith('@source'):
+                    sources.append(os.path.join(base_dir, line[len('@source'):].strip()))
+                elif line.startswith('@mutate'):
+                    for name in line[len('@mutate'):].replace(',', ' ').split():
+                        if name not in _MUTATIONS:
+                            raise ValueError(f"unknown mutation: {name}")
+                        if name not in mutations:
+                            mutations.append(name)
+                else:
+                    templates.append(PathTemplate(line))
+
+        words = Wordlist.from_paths(path for source in (sources or [default_source]) for path in iter_source(source))
+        return GeneratedWordlist(words, templates or [PathTemplate("{word}")], tuple(mutations))
+
+    def __len__(self) -> int:
+        return self._offsets[-1]
+
+    def __getitem__(self, index: int) -> str:
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        t = bisect.bisect_right(self._offsets, index) - 1
+        template = self.templates[t]
+        local = index - self._offsets[t]
+        if not template.has_word:
+            p, s = template.combos[local]
+            return p + s
+        k, i = divmod(local, len(template.combos))
+        b, j = divmod(k, len(self._funcs))
+        word = self.words[b]
+        if self._funcs[j] is not None:
+            word = self._funcs[j](word)
+        p, s = template.combos[i]
+        return p + word + s
+
+    def __iter__(self):
+        """按序号生成去重后的路径"""
+        for index in range(len(self)):
+            path = self[index]
+            if self.index_of(path) == index:
+                yield path
+
+    def index_of(self, path: str) -> int|None:
+        """路径第一次出现的序号，不在字典中返回None"""
+        for t, template in enumerate(self.templates):
+            local = template.locate(path, self._word_indices.get)
+            if local is not None:
+                return self._offsets[t] + local
+        return None
+
+    def is_duplicate(self, index: int) -> bool:
+        return self.index_of(self[index]) != index
+
+    def fingerprint(self) -> str:
+        if self._fingerprint is None:
+            digest = hashlib.blake2b(digest_size=8)
+            digest.update(self.words.fingerprint().encode())
+            digest.update("\n".join(t.text for t in self.templates).encode('utf-8'))
+            digest.update(",".join(self.mutations).encode())
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    def nbytes(self) -> int:
+        """来源词占用的字节数，展开结果不占内存"""
+        return self.words.nbytes()
+
+
+class MergedWordlist:
+    """
+    采集路径 + 原字典: 采集到的路径排在前面，已在原字典中的路径不会加入
+    原字典不复制，与其他目标共用
+    """
+    def __init__(self, extras: Wordlist, base):
+        self.extras = extras
+        self.base = base
+        self.has_duplicates = base.has_duplicates
+        self._fingerprint = None
+
+    def __len__(self) -> int:
+        return len(self.extras) + len(self.base)
+
+    def __getitem__(self, index: int) -> str:
+        if index < len(self.extras):
+            return self.extras[index]
+        return self.base[index - len(self.extras)]
+
+    def __iter__(self):
+        yield from self.extras
+        yield from self.base
+
+    def index_of(self, path: str) -> int|None:
+        index = self.extras.index_of(path)
+        if index is not None:
+            return index
+        index = self.base.index_of(path)
+        return index + len(self.extras) if index is not None else None
+
+    def is_duplicate(self, index: int) -> bool:
+        return index >= len(self.extras) and self.base.is_duplicate(index - len(self.extras))
+
+    def fingerprint(self) -> str:
+        if self._fingerprint is None:
+            digest = hashlib.blake2b(digest_size=8)
+            digest.update(self.base.fingerprint().encode())
+            digest.update(self.extras.fingerprint().encode())
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    def nbytes(self) -> int:
+        """采集路径占用的字节数，原字典共用不计入"""
+        return self.extras.nbytes()
+
+
+class WordlistCursor:
+    """
+    单个目标在共享字典上的游标，接口与扫描器使用的queue.Queue子集一致
+    内存占用与字典大小无关
+    完成位置按水位记录: completed_until之前的路径都已完成，之后已完成的序号记录在done_ahead中(数量不超过并发数)
+    指定order时按order的顺序扫描，水位等序号均为扫描顺序中的位置
+    """
+    def __init__(self, wordlist: Wordlist, start: int = 0, stop: int = None, skip=(), order: 'PathOrder' = None):
+        """
+        :param start: 起始序号，恢复扫描时为上次的完成水位
+        :param stop: 结束序号，用于限制单目标请求数
+        :param skip: 水位之后已完成的序号
+        :param order: 扫描顺序，None为字典顺序
+        """
+        self.wordlist = wordlist
+        self.order = order
+        self.start = start
+        self.stop = len(wordlist) if stop is None else min(stop, len(wordlist))
+        self.position = min(start, self.stop)
+        self.completed_until = self.position
+        self._skip = {i for i in skip if self.position <= i < self.stop}
+        self._done_ahead = set(self._skip)
+        self._done = len(self._skip)
+        self._in_flight = {}
+        self._cond = threading.Condition()
+        self._advance()
+
+    def get_nowait(self) -> str:
+        while True:
+            with self._cond:
+                while self.position < self.stop and self.position in self._skip:
+                    self._skip.discard(self.position)
+                    self.position += 1
+                if self.position >= self.stop:
+                    raise queue.Empty
+                position = self.position
+                self.position += 1
+            index = self.order.index(position) if self.order is not None else position
+            if self.wordlist.has_duplicates and self.wordlist.is_duplicate(index):
+                # 生成式字典中重复的路径直接记为完成
+                with self._cond:
+                    self._done += 1
+                    self._done_ahead.add(position)
+                    self._advance()
+                    if self.unfinished_tasks <= 0:
+                        self._cond.notify_all()
+                continue
+            path = self.wordlist[index]
+            with self._cond:
+                self._in_flight[path] = position
+            return path
+
+    def get(self, block: bool = True, timeout: float = None) -> str:
+        return self.get_nowait()
+
+    def task_done(self, path: str = None):
+        """
+        :param path: 已完成的路径，不传表示取出后未处理(如扫描停止)，不推进完成水位
+        """
+        with self._cond:
+            self._done += 1
+            index = self._in_flight.pop(path, None) if path is not None else None
+            if index is not None:
+                self._done_ahead.add(index)
+                self._advance()
+            if self.unfinished_tasks <= 0:
+                self._cond.notify_all()
+
+    def _advance(self):
+        while self.completed_until in self._done_ahead:
+            self._done_ahead.discard(self.completed_until)
+            self.completed_until += 1
+
+    def checkpoint(self) -> Tuple[int, List[int]]:
+        """(完成水位, 水位之后已完成的序号)"""
+        with self._cond:
+            return self.completed_until, sorted(self._done_ahead)
+
+    @property
+    def in_flight(self) -> int:
+        """已取出未完成的路径数"""
+        return len(self._in_flight)
+
+    @property
+    def unfinished_tasks(self) -> int:
+        return (self.stop - self.start) - self._done
+
+    def join(self):
+        with self._cond:
+            while self.unfinished_tasks > 0:
+                self._cond.wait()
+
+    def empty(self) -> bool:
+        return self.position >= self.stop
+
+    def qsize(self) -> int:
+        return max(self.stop - self.position, 0)
+
+    def clear(self):
+        """丢弃剩余路径，进行中的请求仍需task_done"""
+        with self._cond:
+            self._done += self.stop - self.position - len(self._skip)
+            self._skip.clear()
+            self.position = self.stop
+            if self.unfinished_tasks <= 0:
+                self._cond.notify_all()
+
+
+# 命中排序: 按历史上命中过的目标数对路径排序，命中多的路径优先扫描
+RANKING_ENABLED = True
+# 累计新增命中达到该数量后，之后的目标使用重新计算的顺序
+RANKING_REFRESH_HITS = 50
+# 参与排序的路径数上限，其余路径按字典顺序排在后面
+RANKING_MAX_PATHS = 10000
+# 单个目标计入统计的命中数上限，超过的目标视为未识别的泛解析，不再计入
+RANKING_TARGET_HITS = 200
+
+# 单目标预算，0为不限制，配合命中排序可以用少量请求覆盖大部分结果
+# 最多请求数
+TARGET_REQUEST_BUDGET = 0
+# 最长扫描时间(秒)，只计算本次运行的时间
+TARGET_TIME_BUDGET = 0
+
+
+class PathOrder:
+    """
+    扫描顺序: 先按ranked中的序号扫描，再按字典顺序扫描其余路径
+    只保存排在前面的序号，不为整个字典生成排列
+    """
+    def __init__(self, ranked: array.array, total: int):
+        self.ranked = ranked
+        self.total = total
+        self._sorted = sorted(ranked)
+        self._fingerprint = hashlib.blake2b(ranked.tobytes(), digest_size=8).hexdigest()
+
+    @staticmethod
+    def from_bytes(data: bytes, total: int) -> 'PathOrder|None':
+        ranked = array.array('I')
+        ranked.frombytes(data)
+        if any(i >= total for i in ranked):
+            return None
+        return PathOrder(ranked, total)
+
+    def index(self, position: int) -> int:
+        """扫描位置对应的字典序号"""
+        if position < len(self.ranked):
+            return self.ranked[position]
+        # 剩余路径中的第n个: 求最小的i使 i == n + (ranked中<=i的个数)
+        n = position - len(self.ranked)
+        i = n
+        while True:
+            j = n + bisect.bisect_right(self._sorted, i)
+            if j == i:
+                return i
+            i = j
+
+    def fingerprint(self) -> str:
+        return self._fingerprint
+
+    def to_bytes(self) -> bytes:
+        return self.ranked.tobytes()
+
+
+class PathRanking:
+    """
+    路径命中统计，所有目标共享
+    命中次数按目标计: 同一目标的同一路径只会请求一次
+    """
+    def __init__(self, refresh_hits: int = RANKING_REFRESH_HITS, max_paths: int = RANKING_MAX_PATHS, target_hits: int = RANKING_TARGET_HITS):
+        self.refresh_hits = refresh_hits
+        self.max_paths = max_paths
+        self.target_hits = target_hits
+        self._lock = threading.Lock()
+        self._counts = {}
+        self._target_counts = {}
+        self._indices = {}
+        self._pending = 0
+        self._order: PathOrder|None = None
+        # _indices对应的字典
+        self._wordlist = None
+
+    def load(self, counts: dict):
+        """加载历史统计 {path: 命中目标数}"""
+        with self._lock:
+            for path, hits in counts.items():
+                self._counts[path] = self._counts.get(path, 0) + hits
+            self._pending += len(counts)
+
+    def record(self, target: str, path: str):
+        with self._lock:
+            hits = self._target_counts.get(target, 0) + 1
+            self._target_counts[target] = hits
+            if hits > self.target_hits:
+                return
+            self._counts[path] = self._counts.get(path, 0) + 1
+            self._pending += 1
+
+    def forget(self, target: str):
+        """目标扫描结束后释放计数"""
+        with self._lock:
+            self._target_counts.pop(target, None)
+
+    def order(self, wordlist: Wordlist) -> PathOrder|None:
+        """当前的扫描顺序，没有统计数据时返回None(字典顺序)"""
+        fingerprint = wordlist.fingerprint()
+        with self._lock:
+            if self._order is not None and self._wordlist == fingerprint and self._pending < self.refresh_hits:
+                return self._order
+            counts = dict(self._counts)
+            self._pending = 0
+            if self._wordlist != fingerprint:
+                # 字典合并了新的采集路径，序号需要重新计算
+                self._indices = {}
+                self._wordlist = fingerprint
+
+        # 命中路径在字典中的序号，新出现的路径需要遍历一次字典
+        missing = {path for path in counts if path not in self._indices}
+        index_of = getattr(wordlist, 'index_of', None)
+        if missing and index_of is not None:
+            # 字典可以直接反查，不需要遍历
+            for path in missing:
+                self._indices[path] = index_of(path)
+        elif missing:
+            for i, path in enumerate(wordlist):
+                if path in missing:
+                    self._indices[path] = i
+                    missing.discard(path)
+                    if not missing:
+                        break
+            for path in missing:
+                self._indices[path] = None
+
+        ranked = [(hits, self._indices[path]) for path, hits in counts.items() if self._indices[path] is not None]
+        ranked.sort(key=lambda item: (-item[0], item[1]))
+        order = PathOrder(array.array('I', (i for _, i in ranked[:self.max_paths])), len(wordlist)) if ranked else None
+        with self._lock:
+            self._order = order
+        if order is not None:
+            logger.info(f"[+]Update path ranking, ranked[{len(order.ranked)}]")
+        return order
+
+    def top(self, n: int = 20) -> List[Tuple[str, int]]:
+        with self._lock:
+            return sorted(self._counts.items(), key=lambda item: -item[1])[:n]
+
+
+# 路径采集: 从代理流量的请求路径中统计各级目录前缀出现过的站点数，常见路径合并到字典最前面
+HARVEST_ENABLED = True
+# 前缀树节点数上限，超过后淘汰出现站点数最少的叶子节点
+HARVEST_MAX_NODES = 50000
+# 只采集前几级目录，/api/v1/user/info 采集 api、api/v1、api/v1/user
+HARVEST_MAX_DEPTH = 3
+# 单级目录的最大长度，超过的视为动态内容
+HARVEST_MAX_SEGMENT = 64
+# 至少在多少个站点出现过才合并到字典
+HARVEST_MIN_SITES = 2
+# 合并到字典的路径数上限
+HARVEST_TOP = 1000
+# 合并后的字典最多每隔多少秒按最新统计重建一次，只影响之后开始的目标
+HARVEST_REFRESH_INTERVAL = 300
+# 记录(站点, 路径)是否已计数的容量，同一站点重复访问的路径只计一次
+HARVEST_SEEN_SIZE = 65536
+
+# 动态内容: 纯数字、长十六进制、UUID、长随机串，遇到后不再采集更深的目录
+_DYNAMIC_SEGMENT = re.compile(
+    r'\d+|[0-9a-fA-F]{12,}|[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}'
+    r'|(?=[^/]*\d)(?=[^/]*[A-Za-z])[A-Za-z0-9_\-=]{24,}'
+)
+
+
+class PathHarvester:
+    """
+    路径前缀树，每个节点记录出现过的站点数
+    节点数有上限，内存与流量总量无关
+    """
+    def __init__(self, max_nodes: int = HARVEST_MAX_NODES, max_depth: int = HARVEST_MAX_DEPTH, seen_size: int = HARVEST_SEEN_SIZE):
+        self.max_nodes = max_nodes
+        self.max_depth = max_depth
+        self.seen_size = seen_size
+        self._lock = threading.Lock()
+        # 节点: [站点数, {目录: 子节点}]
+        self._root = [0, {}]
+        self._nodes = 0
+        self._seen = OrderedDict()
+        # 统计信息
+        self.observed = 0
+        self.pruned = 0
+
+    @staticmethod
+    def segments(path: str, max_depth: int = HARVEST_MAX_DEPTH) -> List[str]:
+        """请求路径标准化为各级目录，编码方式与字典一致"""
+        path = path.split('?', 1)[0].split('#', 1)[0]
+        result = []
+        for segment in urllib.parse.unquote(path).split('/'):
+            if not segment or segment in ('.', '..'):
+                continue
+            if len(segment) > HARVEST_MAX_SEGMENT or _DYNAMIC_SEGMENT.fullmatch(segment):
+                break
+            result.append(_quote_path(segment))
+            if len(result) >= max_depth:
+                break
+        return result
+
+    def observe(self, host: str, path: str):
+        segments = self.segments(path, self.max_depth)
+        if not segments:
+            return
+        with self._lock:
+            self.observed += 1
+            node = self._root
+            prefix = ''
+            for segment in segments:
+                prefix = f"{prefix}/{segment}" if prefix else segment
+                child = node[1].get(segment)
+                if child is None:
+                    child = node[1][segment] = [0, {}]
+                    self._nodes += 1
+                key = (host, prefix)
+                if key in self._seen:
+                    self._seen.move_to_end(key)
+                else:
+                    self._seen[key] = None
+                    child[0] += 1
+                    if len(self._seen) > self.seen_size:
+                        self._seen.popitem(last=False)
+                node = child
+            if self._nodes > self.max_nodes:
+                self._prune(int(self.max_nodes * 0.9))
+
+    def _prune(self, target: int):
+        """淘汰站点数最少的叶子节点，直到节点数不超过target"""
+        while self._nodes > target:
+            leaves = []
+            stack = [self._root]
+            while stack:
+                node = stack.pop()
+                for segment, child in node[1].items():
+                    if child[1]:
+                        stack.append(child)
+                    else:
+                        leaves.append((child[0], node, segment))
+            if not leaves:
+                break
+            leaves.sort(key=lambda item: item[0])
+            for _, parent, segment in leaves[:self._nodes - target]:
+                del parent[1][segment]
+                self._nodes -= 1
+                self.pruned += 1
+
+    def load(self, counts: dict):
+        """加载保存的统计 {path: 站点数}"""
+        with self._lock:
+            for path, sites in counts.items():
+                node = self._root
+                for segment in path.split('/'):
+                    child = node[1].get(segment)
+                    if child is None:
+                        child = node[1][segment] = [0, {}]
+                        self._nodes += 1
+                    node = child
+                node[0] = max(node[0], sites)
+            if self._nodes > self.max_nodes:
+                self._prune(self.max_nodes)
+
+    def top(self, n: int = HARVEST_TOP, min_sites: int = HARVEST_MIN_SITES) -> List[Tuple[str, int]]:
+        """出现站点数最多的n个路径，站点数相同时按路径排序"""
+        items = []
+        with self._lock:
+            stack = [('', self._root)]
+            while stack:
+                prefix, node = stack.pop()
+                for segment, child in node[1].items():
+                    path = f"{prefix}/{segment}" if prefix else segment
+                    if child[0] >= min_sites:
+                        items.append((path, child[0]))
+                    stack.append((path, child))
+        return heapq.nsmallest(n, items, key=lambda item: (-item[1], item[0]))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"nodes": self._nodes, "observed": self.observed, "pruned": self.pruned, "seen": len(self._seen)}
+
+
+# 指标: 注册到plugin_metrics.REGISTRY，与其他插件共用
+METRICS_ENABLED = plugin_metrics is not None
+# 非0时在本地端口导出Prometheus文本格式(/metrics)和json快照(/snapshot)
+METRICS_PORT = 0
+
+# 运行中的扫描器，读取指标时按目标汇总在途请求数和队列深度
+_LIVE_SCANNERS = weakref.WeakSet()
+
+
+def _live_scanners() -> List['Scanner']:
+    return [scanner for scanner in list(_LIVE_SCANNERS) if scanner.is_running()]
+
+
+class ScannerMetrics:
+    """扫描器指标，按目标的指标只在读取时计算"""
+    def __init__(self, registry):
+        self.requests = registry.counter("scanner_requests_total", "Probe requests sent", rate=True)
+        self.responses = registry.counter("scanner_responses_total", "Probe responses by status code", ("code",))
+        self.errors = registry.counter("scanner_errors_total", "Probe request errors: network(-1), other(-2)", ("error",))
+        self.latency = registry.histogram("scanner_request_seconds", "Probe request latency")
+        self.results = registry.counter("scanner_results_total", "Scan results: hit, suppressed(wildcard)", ("result",))
+        self.callback = registry.histogram("scanner_callback_seconds", "Result callback latency per batch")
+        registry.gauge_func("scanner_in_flight", "Requests in flight per target", ("target",),
+                            lambda: {(s.target,): s.paths.in_flight for s in _live_scanners()})
+        registry.gauge_func("scanner_queue_depth", "Paths waiting per target", ("target",),
+                            lambda: {(s.target,): s.paths.qsize() for s in _live_scanners()})
+        registry.gauge_func("scanner_dns_cache", "DNS cache entries, hits and misses", ("state",),
+                            lambda: {(k,): v for k, v in DNS_CACHE.stats().items()} if DNS_CACHE is not None else {})
+        registry.gauge_func("scanner_concurrency", "Adaptive concurrency limit per target", ("target",),
+                            lambda: {(s.target,): s.limiter.limit for s in _live_scanners() if s.limiter is not None})
+
+    def observe(self, code: int, response, begin: float):
+        """记录一次探测请求，code与_make_request的返回值一致"""
+        self.requests.inc()
+        if code == -1:
+            self.errors.inc("network")
+        elif code < 0:
+            self.errors.inc("other")
+        else:
+            self.responses.inc(str(response.status if code == 0 else code))
+            self.latency.observe(time.monotonic() - begin)
+
+
+METRICS = ScannerMetrics(plugin_metrics.REGISTRY) if METRICS_ENABLED else None
+
+
+def dns_stats() -> dict|None:
+    """DNS缓存统计，未开启时返回None"""
+    return DNS_CACHE.stats() if DNS_CACHE is not None else None
+
+
+def metrics_snapshot() -> dict:
+    """扫描器指标快照"""
+    if METRICS is None:
+        return {}
+    return plugin_metrics.REGISTRY.snapshot("scanner_")
+
+
 # 扫描器
 class Scanner:
-    def __init__(self, target: str, unique_paths: set, new_data_handler: Callable[[list, Request, addinfourl], None] = None, thread_num: int = 10, timeout: int = 5):
+    def __init__(self, target: str, unique_paths: Wordlist|set, new_data_handler: Callable[[list, Request, addinfourl], None] = None, thread_num: int = 10, timeout: int = 5, probe_mode: str = PROBE_MODE,
+                 order: PathOrder = None, request_budget: int = TARGET_REQUEST_BUDGET, time_budget: float = TARGET_TIME_BUDGET):
         """
         初始化扫描器
 
         :param target: 目标URL（可包含非ASCII字符）
-        :param unique_paths: 字典文件路径
-        :param thread_num: 工作线程数
+        :param unique_paths: 字典，多个目标共享同一个Wordlist
+        :param thread_num: 工作线程数，开启自适应并发时为初始并发数
         :param timeout: 请求超时时间(秒)
+        :param probe_mode: 探测模式 get/head/range
+        :param order: 扫描顺序，None为字典顺序
+        :param request_budget: 最多请求的路径数，0为不限制
+        :param time_budget: 最长扫描时间(秒)，0为不限制
         """
         self.target = _normalize_and_encode_url(target)
         self.new_data_handler = new_data_handler
         self.thread_num = min(max(thread_num, 1), 50)  # 限制线程数在1-50之间
         self.timeout = timeout
+        self.probe_mode = probe_mode if probe_mode in _PROBE_UNSUPPORTED else "get"
+        self._host = urllib.parse.urlsplit(self.target).netloc
+        self.calibrator = WildcardCalibrator() if WILDCARD_CALIBRATION else None
+        self.limiter = AdaptiveLimiter(self.thread_num, ADAPTIVE_MAX_THREADS, max_rps=MAX_REQUESTS_PER_SECOND) if ADAPTIVE_CONCURRENCY else None
 
         # 存储扫描结果
         # self.results: []
 
         # 任务队列和线程控制
-        self.paths = queue.Queue()
-        for path in unique_paths:
-            self.paths.put(path)
-        self.total_paths = len(unique_paths)
+        # 字典只读共享，每个目标只保存游标
+        self.paths = WordlistCursor(Wordlist.from_paths(unique_paths), stop=request_budget or None, order=order)
+        self.total_paths = self.paths.stop
+        self.time_budget = time_budget
 
         self._lock = threading.Lock()
         self._running = False
@@ -122,6 +1607,9 @@ class Scanner:
         self.scanned_paths = 0
         self.successful_scans = 0
         self.failed_scans = 0
+        self.suppressed_scans = 0
+        # 恢复扫描时的初始统计
+        self._base_counts = (0, 0, 0, 0)
 
     def scan(self) -> bool:
         """启动扫描"""
@@ -129,41 +1617,100 @@ class Scanner:
             logger.warning("[-]Scanner already running")
             return False
 
+        self._begin()
+        with self._lock:
+            # 创建工作线程，自适应并发时按初始并发创建，limiter提升并发后再补充
+            self._spawn_workers(int(self.limiter.limit) if self.limiter is not None else self.thread_num)
+
+        logger.info(f"[+]Scanner Start[{self.target}], threads[{self.thread_num}]")
+        return True
+
+    def _begin(self):
+        """重置状态和统计"""
         with self._lock:
             self._running = True
             self._stop_event.clear()
             # self.results.clear()
             self.start_time = time.time()
-            self.scanned_paths = 0
-            self.successful_scans = 0
-            self.failed_scans = 0
-
-            # 创建工作线程
-            for i in range(self.thread_num):
-                t = threading.Thread(
-                    target=self._worker,
-                    name=f"ScannerWorker-{i}",
-                    daemon=True
-                )
-                t.start()
-                self._threads.append(t)
+            self.scanned_paths, self.successful_scans, self.failed_scans, self.suppressed_scans = self._base_counts
+        _LIVE_SCANNERS.add(self)
 
-        logger.info(f"[+]Scanner Start[{self.target}], threads[{self.thread_num}]")
+    def resume(self, position: int, done_ahead: List[int], counts: Tuple[int, int, int, int]):
+        """
+        从检查点恢复，需在扫描开始前调用
+        :param position: 完成水位
+        :param done_ahead: 水位之后已完成的序号
+        :param counts: (scanned, succeed, failed, suppressed)
+        """
+        self.paths = WordlistCursor(self.paths.wordlist, start=position, stop=self.paths.stop, skip=done_ahead, order=self.paths.order)
+        self._base_counts = tuple(counts)
+        logger.info(f"[+]Resume scan[{self.target}] from {position}/{self.total_paths}")
+
+    def checkpoint(self) -> dict:
+        """当前进度，写入检查点使用"""
+        position, done_ahead = self.paths.checkpoint()
+        return {
+            "position": position,
+            "done_ahead": done_ahead,
+            "scanned": self.scanned_paths,
+            "succeed": self.successful_scans,
+            "failed": self.failed_scans,
+            "suppressed": self.suppressed_scans,
+        }
+
+    def start_shared(self) -> bool:
+        """由ScanScheduler驱动扫描，不创建工作线程"""
+        if self._running:
+            return False
+        if self.limiter is None:
+            # 共享调度依赖limiter限制单个目标的并发，未开启自适应时使用固定并发
+            self.limiter = AdaptiveLimiter(self.thread_num, self.thread_num, min_limit=self.thread_num, max_rps=MAX_REQUESTS_PER_SECOND)
+        self._begin()
+        logger.info(f"[+]Scanner Start[{self.target}], shared")
         return True
 
-    def _make_request(self, url: str) -> Tuple[int, Request, addinfourl|None]:
+    def next_path(self) -> str|None:
+        """取下一个待扫描路径，共享调度时需先占用limiter名额"""
+        if self.time_budget and time.time() - self.start_time > self.time_budget and not self.paths.empty():
+            self.paths.clear()
+            logger.info(f"[+]Scan time budget exhausted[{self.target}], {self.time_budget}s")
+            return None
+        try:
+            return self.paths.get_nowait()
+        except queue.Empty:
+            return None
+
+    def has_pending(self) -> bool:
+        return self._running and not self.paths.empty()
+
+    def is_complete(self) -> bool:
+        """所有路径都已处理完成(包括进行中的请求)"""
+        return self.paths.unfinished_tasks == 0
+
+    def finish(self):
+        """扫描完成，记录结束时间并输出统计"""
+        with self._lock:
+            self._running = False
+            self._stop_event.set()
+            self.end_time = time.time()
+
+        self._print_stats()
+        logger.info(f"[+]Scanner is completed[{self.target}]")
+
+    def _make_request(self, url: str, method: str = 'GET', headers: dict = None) -> Tuple[int, Request, addinfourl|None]:
         """执行HTTP请求并返回状态码和响应大小"""
         req = urllib.request.Request(
             url,
             headers={
                 'User-Agent': 'Mozilla/5.0 (compatible; URLScanner/1.0)',
-                'Accept-Encoding': 'gzip, deflate'
+                'Accept-Encoding': 'gzip, deflate',
+                **(headers or {})
             },
-            method='GET'
+            method=method
         )
         try:
-            with urllib.request.urlopen(req, timeout=self.timeout) as response:
-                return 0, req, response
+            # 响应由_handle_result在回调后关闭
+            return 0, req, urllib.request.urlopen(req, timeout=self.timeout)
         except urllib.error.HTTPError as e:
             # HTTPError 本身就是响应对象，可以直接返回
             return e.code, req, e
@@ -174,44 +1721,238 @@ class Scanner:
             logger.warning(f"[-]Request unknown error: {url} - {str(e)}")
             return -2, req, None  # 使用-2表示其他错误
 
+    def _fetch_body(self, url: str) -> bytes:
+        """按需拉取完整body，最多读取PROBE_FETCH_MAX_BYTES字节"""
+        code, req, response = self._make_request(url)
+        if response is None:
+            raise ConnectionError(f"request failed: {code}")
+        try:
+            return response.read(PROBE_FETCH_MAX_BYTES or None)
+        finally:
+            response.close()
+
+    def _probe_request(self, url: str) -> Tuple[int, Request, addinfourl|ProbeResponse|None]:
+        """按探测模式请求，返回值与_make_request一致"""
+        mode = PROBE_HOSTS.mode_for(self._host, self.probe_mode)
+        if mode == "get":
+            return self._make_request(url)
+
+        code, req, response = self._make_request(url, *_probe_args(mode))
+        if code < 0:
+            return code, req, response
+
+        status = response.status if code == 0 else code
+        if status in _PROBE_UNSUPPORTED[mode]:
+            response.close()
+            PROBE_HOSTS.fallback(self._host, mode, f"status {status}")
+            return self._make_request(url)
+
+        try:
+            body = response.read(PROBE_RANGE_BYTES) if mode == "range" else b''
+        finally:
+            response.close()
+        probe = ProbeResponse(url, 200 if status == 206 else status, response.reason, response.headers, body)
+
+        if _need_fetch(probe, mode, len(body)):
+            if mode == "head" and PROBE_HOSTS.need_verify(self._host):
+                # 首个命中用GET校验，状态码不一致说明HEAD处理不可靠
+                full = self._make_request(url)
+                if full[0] >= 0:
+                    if full[0] != code:
+                        PROBE_HOSTS.fallback(self._host, mode, f"status {status} != {full[0] or full[2].status}")
+                    return full
+            probe._fetch = lambda: self._fetch_body(url)
+        return code, req, probe
+
+    def _spawn_workers(self, count: int):
+        """补充工作线程到count个，调用方需持有self._lock"""
+        while len(self._threads) < count:
+            t = threading.Thread(
+                target=self._worker,
+                name=f"ScannerWorker-{len(self._threads)}",
+                daemon=True
+            )
+            t.start()
+            self._threads.append(t)
+
     def _worker(self):
         """工作线程执行函数"""
         while not self._stop_event.is_set() and self._running:
-            try:
-                path = self.paths.get_nowait()
-                url = f"{self.target}/{path.lstrip('/')}"
-
-                code, req, response = self._make_request(url)
+            path = self.next_path()
+            if path is None:
+                break
+            if self.limiter is not None and not self.limiter.acquire(self._stop_event):
+                self.paths.task_done()
+                break
+            self.process_path(path)
 
+            if self.limiter is not None and int(self.limiter.limit) > len(self._threads):
                 with self._lock:
-                    if code >= 0:
-                        if code == 0:
-                            status = response.status
-                        else:
-                            status = code
-
-                        if status in [200, 403] or (300 <= status < 400):  # 只记录成功的HTTP请求
-                            self.new_data_handler([url, status], req, response)
-                            self.successful_scans += 1
-                        else:
-                            self.failed_scans += 1
-                    else:
-                        self.failed_scans += 1
+                    if self._running:
+                        self._spawn_workers(int(self.limiter.limit))
+        pass
 
-                    self.scanned_paths += 1
+    def process_path(self, path: str):
+        """
+        扫描单个路径，调用前需已占用limiter名额，返回前释放
+        独立运行的工作线程和共享调度共用
+        """
+        try:
+            url = f"{self.target}/{path.lstrip('/')}"
 
-                    # 每扫描100个路径打印一次进度
-                    if self.scanned_paths % 100 == 0:
-                        self._print_progress()
+            directory = self._calibrate(path)
+            begin = time.monotonic()
+            code, response = -2, None
+            try:
+                code, req, response = self._probe_request(url)
+            finally:
+                if METRICS is not None:
+                    METRICS.observe(code, response, begin)
+                if self.limiter is not None:
+                    self.limiter.release(*self._feedback(code, response, begin))
+            response, wildcard = self._check_wildcard(path, directory, code, response)
+            self._handle_result(url, code, req, response, wildcard)
+        except Exception as e:
+            logger.error(f"[-]Worker thread error: {(e)}")
+            traceback.print_exc()
+        finally:
+            self.paths.task_done(path)
 
-                self.paths.task_done()
-            except queue.Empty:
-                break
+    @staticmethod
+    def _feedback(code: int, response, begin: float) -> Tuple[float|None, bool, float|None]:
+        """
+        请求结果对应的自适应并发反馈
+        :return: (耗时, 是否过载, Retry-After)
+        """
+        if code < 0:
+            # 网络错误(含超时)视为过载
+            return None, True, None
+        latency = time.monotonic() - begin
+        status = response.status if code == 0 else code
+        if status in _CONGESTION_STATUS:
+            return latency, True, _parse_retry_after(response.headers.get('Retry-After'))
+        return latency, False, None
+
+    def stats(self) -> dict:
+        """扫描统计"""
+        with self._lock:
+            stats = {
+                "target": self.target,
+                "paths": self.total_paths,
+                "scanned": self.scanned_paths,
+                "succeed": self.successful_scans,
+                "failed": self.failed_scans,
+                "suppressed": self.suppressed_scans,
+            }
+        if self.limiter is not None:
+            stats.update(self.limiter.stats())
+        return stats
+
+    def _calibrate(self, path: str) -> str:
+        """校准路径所在目录，返回目录"""
+        directory = WildcardCalibrator.directory_of(path)
+        if self.calibrator is None or self.calibrator.is_calibrated(directory):
+            return directory
+
+        with self.calibrator.lock_for(directory):
+            if not self.calibrator.is_calibrated(directory):
+                fingerprints = []
+                for probe_path in WildcardCalibrator.random_paths(directory):
+                    code, req, response = self._probe_request(f"{self.target}/{probe_path}")
+                    fingerprint = self._fingerprint(probe_path, code, response)
+                    if fingerprint is not None:
+                        fingerprints.append(fingerprint)
+                self.calibrator.add(directory, fingerprints)
+        return directory
+
+    def root_fingerprint(self) -> ResponseFingerprint|None:
+        """根路径响应的指纹，用于识别指向同一站点的不同目标，响应中回显的主机名不参与计算"""
+        code, req, response = self._make_request(f"{self.target}/")
+        if code < 0:
+            return None
+        status = response.status if code == 0 else code
+        fingerprint = ResponseFingerprint.from_response(urllib.parse.urlsplit(self.target).hostname, status, self._buffer_response(response))
+        response.close()
+        return fingerprint
+
+    @staticmethod
+    def _buffer_response(response):
+        """把urllib响应读入内存，便于计算指纹后继续交给回调"""
+        if response is None or hasattr(response, 'peek'):
+            return response
+        try:
+            body = response.read()
+        finally:
+            response.close()
+        return ProbeResponse(response.url, response.status, response.reason, response.headers, body)
+
+    def _fingerprint(self, path: str, code: int, response) -> ResponseFingerprint|None:
+        """命中响应的指纹，非命中返回None"""
+        if code < 0:
+            return None
+        status = response.status if code == 0 else code
+        if not _is_hit(status):
+            if response is not None:
+                response.close()
+            return None
+        fingerprint = ResponseFingerprint.from_response(path, status, self._buffer_response(response))
+        response.close()
+        return fingerprint
+
+    def _check_wildcard(self, path: str, directory: str, code: int, response) -> Tuple[addinfourl|ProbeResponse|None, bool]:
+        """
+        判断命中是否与泛解析指纹一致
+        :return: (响应, 是否为泛解析结果)
+        """
+        if self.calibrator is None or code < 0:
+            return response, False
+        status = response.status if code == 0 else code
+        if not _is_hit(status):
+            return response, False
+
+        response = self._buffer_response(response)
+        return response, self.calibrator.match(directory, ResponseFingerprint.from_response(path, status, response))
+
+    def _handle_result(self, url: str, code: int, req: Request, response: addinfourl|None, wildcard: bool = False):
+        """处理单个请求结果，线程/异步引擎共用"""
+        hit = None
+        with self._lock:
+            if wildcard:
+                # 泛解析结果不进入回调，也不序列化
+                self.suppressed_scans += 1
+            elif code >= 0:
+                if code == 0:
+                    status = response.status
+                else:
+                    status = code
+
+                if status in [200, 403] or (300 <= status < 400):  # 只记录成功的HTTP请求
+                    hit = [url, status]
+                    self.successful_scans += 1
+                else:
+                    self.failed_scans += 1
+            else:
+                self.failed_scans += 1
+
+            self.scanned_paths += 1
+
+            # 每扫描100个路径打印一次进度
+            if self.scanned_paths % 100 == 0:
+                self._print_progress()
+
+        if METRICS is not None:
+            if wildcard:
+                METRICS.results.inc("suppressed")
+            elif hit is not None:
+                METRICS.results.inc("hit")
+        # 回调在锁外执行，读取body、序列化不阻塞其他请求的统计
+        if hit is not None and self.new_data_handler is not None:
+            try:
+                self.new_data_handler(hit, req, response)
             except Exception as e:
-                logger.error(f"[-]Worker thread error: {(e)}")
-                traceback.print_exc()
-            pass
-        pass
+                logger.error(f"[-]New data handler error: {str(e)}")
+        if response is not None:
+            response.close()
 
     def _print_progress(self):
         """打印扫描进度"""
@@ -220,19 +1961,13 @@ class Scanner:
             logger.info(
                 f"[{self.target}] "
                 f"progress: {self.scanned_paths}/{self.total_paths} ({percent:.1f}%) "
-                f"succeed: {self.successful_scans}, failed: {self.failed_scans}"
+                f"succeed: {self.successful_scans}, failed: {self.failed_scans}, suppressed: {self.suppressed_scans}"
+                + (f", concurrency: {int(self.limiter.limit)}" if self.limiter is not None else "")
             )
 
     def wait_for_completion(self):
         self.paths.join()
-
-        with self._lock:
-            self._running = False
-            self._stop_event.set()
-            self.end_time = time.time()
-
-        self._print_stats()
-        logger.info(f"[+]Scanner is completed[{self.target}]")
+        self.finish()
 
     def cancel(self):
         """停止扫描"""
@@ -245,9 +1980,7 @@ class Scanner:
             self.end_time = time.time()
 
             # 清空队列以快速停止线程
-            while not self.paths.empty():
-                self.paths.get()
-                self.paths.task_done()
+            self.paths.clear()
 
         # 等待线程结束
         for t in self._threads:
@@ -269,7 +2002,9 @@ class Scanner:
                         f", scanned: {self.scanned_paths} ({self.scanned_paths / self.total_paths * 100:.1f}%)"
                         f", rate: {req_per_sec:.2f}"
                         f", succeed: {self.successful_scans}"
-                        f", failed: {self.failed_scans}")
+                        f", failed: {self.failed_scans}"
+                        f", suppressed: {self.suppressed_scans}"
+                        + (f", concurrency: {int(self.limiter.limit)}" if self.limiter is not None else ""))
 
             pass
         pass
@@ -294,42 +2029,1284 @@ class Scanner:
     pass
 
 
-# 定义扫描管理器，存储扫描结果
-class ScannerManager:
-    def __init__(self, dict_file: str, max_concurrent: int = 10, on_data_handler: Callable[[list], None] = None):
-        self.dict_file = dict_file
-        # absolute_path = Path(dict_file).resolve()
-        # print(f'absolute_path:{absolute_path}')
+# 扫描引擎: thread 每个worker一个线程，使用urllib阻塞请求
+#          async 单个事件循环驱动所有请求，按主机复用keep-alive连接
+SCAN_ENGINE = "thread"
+# 异步引擎单个目标的并发请求数，开启自适应并发时为上限
+ASYNC_CONCURRENCY = 256
+# 开启自适应并发时的初始并发数
+ASYNC_INITIAL_CONCURRENCY = 16
+ASYNC_MAX_CONCURRENCY = 5000
+# 每个主机(scheme, host, port)的最大连接数，所有目标共享
+ASYNC_HOST_CONNECTIONS = 128
+# 响应头行数上限，防止异常响应占用内存
+ASYNC_MAX_HEADERS = 200
+# 与urllib的异常分类保持一致: -1 网络错误
+_ASYNC_NETWORK_ERRORS = (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, http.client.HTTPException, ValueError)
 
-        self.unique_paths = set()
-        self.max_concurrent = max_concurrent
 
-        self._buffer_lock = threading.Lock()
+class AsyncResponse:
+    """异步引擎的响应对象，接口与urllib的addinfourl一致，body已完整读入内存"""
+    def __init__(self, url: str, status: int, reason: str, headers: http.client.HTTPMessage, body: bytes):
+        self.url = url
+        self.status = status
+        self.code = status
+        self.reason = reason
+        self.headers = headers
+        self.msg = reason
+        self._fp = io.BytesIO(body)
 
-        # 任务管理
-        self.processed_targets = set()
-        self.target_queue = Queue()
-        self.running_scanners: List[Scanner] = []
-        self.worker_threads: List[threading.Thread] = []
-        self.is_running = False
+    def getheader(self, name: str, default=None):
+        return self.headers.get(name, default)
 
-        self.on_data_handler = on_data_handler
-        pass
+    def getcode(self) -> int:
+        return self.status
 
-    def start(self) -> bool:
-        """启动扫描服务"""
+    def geturl(self) -> str:
+        return self.url
+
+    def info(self) -> http.client.HTTPMessage:
+        return self.headers
+
+    def read(self, amt: int = None) -> bytes:
+        return self._fp.read(amt)
+
+    def peek(self) -> bytes:
+        return self._fp.getvalue()
+
+    def close(self):
+        self._fp.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class _Connection:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.requests = 0
+
+    def close(self):
+        try:
+            self.writer.close()
+        except Exception:
+            pass
+
+
+class AsyncHttpClient:
+    """
+    基于asyncio streams的HTTP/1.1客户端
+    按(scheme, host, port)维护空闲连接池，请求完成后连接放回复用，避免每个路径重新握手TLS
+    与urllib一样不处理重定向，不解压body
+    """
+    def __init__(self, timeout: int = 5, max_per_host: int = ASYNC_HOST_CONNECTIONS):
+        self.timeout = timeout
+        self.max_per_host = max_per_host
+        self._idle = {}
+        self._limits = {}
+        self._ssl = ssl.create_default_context()
+
+        # 统计信息
+        self.connections_opened = 0
+        self.connections_reused = 0
+
+    async def _connect(self, scheme: str, host: str, port: int) -> _Connection:
+        ssl_ctx = self._ssl if scheme == 'https' else None
+        addresses = [host]
+        if DNS_CACHE is not None:
+            infos = await asyncio.wait_for(DNS_CACHE.resolve_async(host, port), timeout=self.timeout)
+            addresses = [sockaddr[0] for _, _, _, _, sockaddr in infos] or addresses
+        error = None
+        for address in addresses:
+            try:
+                reader, writer = await asyncio.wait_for(
+                    asyncio.open_connection(address, port, ssl=ssl_ctx, server_hostname=host if ssl_ctx else None),
+                    timeout=self.timeout
+                )
+            except OSError as e:
+                error = e
+                continue
+            self.connections_opened += 1
+            return _Connection(reader, writer)
+        raise error
+
+    async def _read_response(self, conn: _Connection, method: str, max_body: int = None):
+        """
+        读取一个响应，返回(status, reason, headers, body, keep_alive)
+        body超过max_body时只读取前缀，连接不再复用
+        """
+        reader = conn.reader
+        line = await reader.readline()
+        if not line:
+            # 服务端已关闭空闲连接
+            raise ConnectionResetError("connection closed by server")
+
+        version, status, reason = (line.decode('latin-1').rstrip('\r\n').split(' ', 2) + [''])[:3]
+        if not version.startswith('HTTP/'):
+            raise http.client.BadStatusLine(line)
+        status = int(status)
+
+        lines = []
+        while True:
+            header = await reader.readline()
+            if header in (b'\r\n', b'\n', b''):
+                break
+            lines.append(header)
+            if len(lines) > ASYNC_MAX_HEADERS:
+                raise http.client.HTTPException("got more than %d headers" % ASYNC_MAX_HEADERS)
+        headers = http.client.parse_headers(io.BytesIO(b''.join(lines) + b'\r\n'))
+
+        keep_alive = version == 'HTTP/1.1' and 'close' not in headers.get('Connection', '').lower()
+        if method == 'HEAD' or status in (204, 304) or 100 <= status < 200:
+            body = b''
+        elif 'chunked' in headers.get('Transfer-Encoding', '').lower():
+            chunks = []
+            total = 0
+            while True:
+                size = int((await reader.readline()).split(b';', 1)[0].strip(), 16)
+                if size == 0:
+                    # 跳过trailer
+                    while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                        pass
+                    break
+                if max_body is not None and total + size > max_body:
+                    chunks.append(await reader.readexactly(max_body - total))
+                    keep_alive = False
+                    break
+                chunks.append(await reader.readexactly(size))
+                total += size
+                await reader.readexactly(2)
+            body = b''.join(chunks)
+        elif headers.get('Content-Length') is not None:
+            length = int(headers.get('Content-Length'))
+            if max_body is not None and length > max_body:
+                length = max_body
+                keep_alive = False
+            body = await reader.readexactly(length)
+        else:
+            # 没有长度信息，读到连接关闭
+            body = await (reader.read() if max_body is None else reader.read(max_body))
+            keep_alive = False
+
+        return status, reason, headers, body, keep_alive
+
+    async def request(self, req: Request, max_body: int = None) -> AsyncResponse:
+        parts = urllib.parse.urlsplit(req.full_url)
+        scheme = parts.scheme
+        host = parts.hostname
+        port = parts.port or (443 if scheme == 'https' else 80)
+        key = (scheme, host, port)
+        method = req.get_method()
+
+        lines = [f"{method} {req.selector or '/'} HTTP/1.1", f"Host: {req.host}"]
+        for name, value in req.header_items():
+            if name.lower() not in ('host', 'connection'):
+                lines.append(f"{name}: {value}")
+        lines.append("Connection: keep-alive")
+        data = ("\r\n".join(lines) + "\r\n\r\n").encode('latin-1')
+
+        limit = self._limits.get(key)
+        if limit is None:
+            limit = self._limits[key] = asyncio.Semaphore(self.max_per_host)
+
+        async with limit:
+            idle = self._idle.setdefault(key, deque())
+            while True:
+                reused = bool(idle)
+                conn = idle.pop() if reused else await self._connect(scheme, host, port)
+                try:
+                    conn.writer.write(data)
+                    await conn.writer.drain()
+                    status, reason, headers, body, keep_alive = await asyncio.wait_for(
+                        self._read_response(conn, method, max_body), timeout=self.timeout
+                    )
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    conn.close()
+                    # 复用的连接可能已被服务端关闭，换新连接重试
+                    if reused:
+                        continue
+                    raise
+                except BaseException:
+                    conn.close()
+                    raise
+                break
+
+            if reused:
+                self.connections_reused += 1
+            conn.requests += 1
+            if keep_alive:
+                idle.append(conn)
+            else:
+                conn.close()
+
+        return AsyncResponse(req.full_url, status, reason, headers, body)
+
+    async def close(self):
+        for idle in self._idle.values():
+            while idle:
+                idle.pop().close()
+        self._idle.clear()
+
+
+class _AsyncRuntime:
+    """所有异步扫描器共享的事件循环线程和HTTP客户端"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.loop: asyncio.AbstractEventLoop|None = None
+        self._thread: threading.Thread|None = None
+        self._clients = {}
+
+    def get_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self.loop is None or self.loop.is_closed():
+                self.loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self.loop.run_forever, name="ScannerEventLoop", daemon=True)
+                self._thread.start()
+            return self.loop
+
+    def loop_thread(self) -> threading.Thread|None:
+        return self._thread
+
+    def get_client(self, timeout: int) -> AsyncHttpClient:
+        """按超时时间共享客户端，只能在事件循环线程中调用"""
+        client = self._clients.get(timeout)
+        if client is None:
+            client = self._clients[timeout] = AsyncHttpClient(timeout=timeout)
+        return client
+
+    def stop(self):
+        with self._lock:
+            loop = self.loop
+            if loop is None:
+                return
+            clients = list(self._clients.values())
+            self._clients.clear()
+
+            async def _close():
+                for client in clients:
+                    await client.close()
+
+            try:
+                asyncio.run_coroutine_threadsafe(_close(), loop).result(timeout=5)
+            except Exception:
+                pass
+            loop.call_soon_threadsafe(loop.stop)
+            self._thread.join(timeout=5)
+            loop.close()
+            self.loop = None
+            self._thread = None
+
+
+ASYNC_RUNTIME = _AsyncRuntime()
+
+
+# 异步扫描器，接口与Scanner一致
+class AsyncScanner(Scanner):
+    def __init__(self, target: str, unique_paths: Wordlist|set, new_data_handler: Callable[[list, Request, addinfourl], None] = None, concurrency: int = ASYNC_CONCURRENCY, timeout: int = 5, probe_mode: str = PROBE_MODE,
+                 order: PathOrder = None, request_budget: int = TARGET_REQUEST_BUDGET, time_budget: float = TARGET_TIME_BUDGET):
+        """
+        初始化异步扫描器
+
+        :param target: 目标URL（可包含非ASCII字符）
+        :param unique_paths: 字典，多个目标共享同一个Wordlist
+        :param concurrency: 并发请求数
+        :param timeout: 请求超时时间(秒)
+        :param probe_mode: 探测模式 get/head/range
+        :param order: 扫描顺序，None为字典顺序
+        :param request_budget: 最多请求的路径数，0为不限制
+        :param time_budget: 最长扫描时间(秒)，0为不限制
+        """
+        super().__init__(target, unique_paths, new_data_handler, timeout=timeout, probe_mode=probe_mode,
+                         order=order, request_budget=request_budget, time_budget=time_budget)
+        self.concurrency = min(max(concurrency, 1), ASYNC_MAX_CONCURRENCY)
+        # 并发上限为concurrency，从ASYNC_INITIAL_CONCURRENCY开始自适应调整
+        self.limiter = AdaptiveLimiter(min(ASYNC_INITIAL_CONCURRENCY, self.concurrency), self.concurrency, max_rps=MAX_REQUESTS_PER_SECOND) if ADAPTIVE_CONCURRENCY else None
+        self._slot_event: asyncio.Event|None = None
+        self._future: concurrent.futures.Future|None = None
+        self._calibrate_locks = {}
+
+    def scan(self) -> bool:
+        """启动扫描"""
+        if self._running:
+            logger.warning("[-]Scanner already running")
+            return False
+
+        self._begin()
+        with self._lock:
+            self._future = asyncio.run_coroutine_threadsafe(self._run(), ASYNC_RUNTIME.get_loop())
+
+        logger.info(f"[+]Async scanner Start[{self.target}], concurrency[{int(self.limiter.limit) if self.limiter else self.concurrency}/{self.concurrency}]")
+        return True
+
+    async def _run(self):
+        client = ASYNC_RUNTIME.get_client(self.timeout)
+        self._slot_event = asyncio.Event()
+        workers = min(self.concurrency, max(self.total_paths, 1))
+        await asyncio.gather(*[self._async_worker(client) for _ in range(workers)])
+
+    async def _make_request_async(self, client: AsyncHttpClient, url: str, method: str = 'GET', headers: dict = None, max_body: int = None) -> Tuple[int, Request, AsyncResponse|None]:
+        """执行HTTP请求，返回值与Scanner._make_request一致"""
+        req = urllib.request.Request(
+            url,
+            headers={
+                'User-Agent': 'Mozilla/5.0 (compatible; URLScanner/1.0)',
+                'Accept-Encoding': 'gzip, deflate',
+                **(headers or {})
+            },
+            method=method
+        )
+        try:
+            response = await client.request(req, max_body)
+            # urllib在非2xx(含禁用的重定向)时抛出HTTPError，返回状态码
+            return (0 if 200 <= response.status < 300 else response.status), req, response
+        except _ASYNC_NETWORK_ERRORS as e:
+            logger.warning(f"[-]Request error: {url} - {str(e) or type(e).__name__}")
+            return -1, req, None
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"[-]Request unknown error: {url} - {str(e)}")
+            return -2, req, None
+
+    async def _probe_request_async(self, client: AsyncHttpClient, url: str) -> Tuple[int, Request, AsyncResponse|ProbeResponse|None]:
+        """
+        按探测模式请求，返回值与Scanner._probe_request一致
+        事件循环中不能阻塞读取，需要完整body的命中标记为deferred，由_fetch_async补发GET
+        """
+        mode = PROBE_HOSTS.mode_for(self._host, self.probe_mode)
+        if mode == "get":
+            return await self._make_request_async(client, url)
+
+        method, headers = _probe_args(mode)
+        code, req, response = await self._make_request_async(client, url, method, headers, PROBE_RANGE_BYTES)
+        if code < 0:
+            return code, req, response
+
+        if response.status in _PROBE_UNSUPPORTED[mode]:
+            PROBE_HOSTS.fallback(self._host, mode, f"status {response.status}")
+            return await self._make_request_async(client, url)
+
+        body = response.read()
+        probe = ProbeResponse(url, 200 if response.status == 206 else response.status, response.reason, response.headers, body)
+        probe.deferred = _need_fetch(probe, mode, len(body))
+        return code, req, probe
+
+    async def _fetch_async(self, client: AsyncHttpClient, url: str, code: int, req: Request, response: ProbeResponse):
+        """补发GET拉取完整body(最多PROBE_FETCH_MAX_BYTES字节)，HEAD模式下顺带校验状态码"""
+        full = await self._make_request_async(client, url, max_body=PROBE_FETCH_MAX_BYTES or None)
+        if full[0] < 0:
+            return code, req, response
+        PROBE_HOSTS.count_fetch()
+        if self.probe_mode == "head" and PROBE_HOSTS.need_verify(self._host) and full[0] != code:
+            PROBE_HOSTS.fallback(self._host, self.probe_mode, f"status {response.status} != {full[2].status}")
+        fetched = full[2]
+        # body可能被截断，长度以响应头为准
+        return full[0], full[1], ProbeResponse(url, fetched.status, fetched.reason, fetched.headers, fetched.peek())
+
+    async def _calibrate_async(self, client: AsyncHttpClient, path: str) -> str:
+        """校准路径所在目录，返回目录"""
+        directory = WildcardCalibrator.directory_of(path)
+        if self.calibrator is None or self.calibrator.is_calibrated(directory):
+            return directory
+
+        lock = self._calibrate_locks.get(directory)
+        if lock is None:
+            lock = self._calibrate_locks[directory] = asyncio.Lock()
+        async with lock:
+            if not self.calibrator.is_calibrated(directory):
+                fingerprints = []
+                for probe_path in WildcardCalibrator.random_paths(directory):
+                    code, req, response = await self._probe_request_async(client, f"{self.target}/{probe_path}")
+                    fingerprint = self._fingerprint(probe_path, code, response)
+                    if fingerprint is not None:
+                        fingerprints.append(fingerprint)
+                self.calibrator.add(directory, fingerprints)
+        self._calibrate_locks.pop(directory, None)
+        return directory
+
+    async def _acquire_async(self) -> bool:
+        """等待并发名额，扫描停止时返回False"""
+        while not self._stop_event.is_set():
+            wait = self.limiter.try_acquire()
+            if wait == 0:
+                return True
+            self._slot_event.clear()
+            try:
+                await asyncio.wait_for(self._slot_event.wait(), timeout=min(wait, 1.0))
+            except asyncio.TimeoutError:
+                pass
+        return False
+
+    async def _async_worker(self, client: AsyncHttpClient):
+        """协程执行函数"""
+        while not self._stop_event.is_set() and self._running:
+            path = self.next_path()
+            if path is None:
+                break
+            if self.limiter is not None and not await self._acquire_async():
+                self.paths.task_done()
+                break
+            await self.process_path_async(client, path)
+
+    async def process_path_async(self, client: AsyncHttpClient, path: str):
+        """扫描单个路径，调用前需已占用limiter名额，返回前释放"""
+        try:
+            url = f"{self.target}/{path.lstrip('/')}"
+            directory = await self._calibrate_async(client, path)
+            begin = time.monotonic()
+            code, response = -2, None
+            try:
+                code, req, response = await self._probe_request_async(client, url)
+            finally:
+                if METRICS is not None:
+                    METRICS.observe(code, response, begin)
+                if self.limiter is not None:
+                    self.limiter.release(*self._feedback(code, response, begin))
+                    if self._slot_event is not None:
+                        self._slot_event.set()
+            response, wildcard = self._check_wildcard(path, directory, code, response)
+            if not wildcard and getattr(response, 'deferred', False):
+                code, req, response = await self._fetch_async(client, url, code, req, response)
+            self._handle_result(url, code, req, response, wildcard)
+        except asyncio.CancelledError:
+            self.paths.task_done()
+            raise
+        except Exception as e:
+            logger.error(f"[-]Async worker error: {(e)}")
+            traceback.print_exc()
+            self.paths.task_done(path)
+        else:
+            self.paths.task_done(path)
+
+    def wait_for_completion(self):
+        super().wait_for_completion()
+        if self._future is not None:
+            try:
+                self._future.result(timeout=self.timeout)
+            except Exception:
+                pass
+
+    def cancel(self):
+        """停止扫描"""
+        if self._future is not None:
+            self._future.cancel()
+        return super().cancel()
+
+    pass
+
+
+# 共享调度: 所有目标共用固定数量的请求槽位，按加权轮询交替扫描，
+# 单个目标的并发仍由各自的limiter限制
+SCHEDULER_THREADS = 50
+SCHEDULER_ASYNC_SLOTS = 1024
+# 同时参与调度的目标数，超过后排队
+SCHEDULER_MAX_TARGETS = 64
+# 停止时等待在途请求完成的最长时间(秒)，完成的请求会计入断点
+SCHEDULER_DRAIN_TIMEOUT = 10
+
+
+class ScanScheduler:
+    """线程版共享调度器，线程数固定，不随目标数增长"""
+    def __init__(self, slots: int = SCHEDULER_THREADS, on_complete: Callable[[Scanner], None] = None):
+        self.slots = max(slots, 1)
+        self.on_complete = on_complete
+
+        self._cond = threading.Condition()
+        self._scanners = deque()
+        self._credits = {}
+        self._running = False
+        self._threads: List[threading.Thread] = []
+
+    def start(self) -> bool:
+        if self._running:
+            return False
+        self._running = True
+        for i in range(self.slots):
+            t = threading.Thread(target=self._slot, name=f"ScanSlot-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        logger.info(f"[+]Scan scheduler start, slots[{self.slots}]")
+        return True
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            scanners = list(self._scanners)
+            self._scanners.clear()
+            self._credits.clear()
+            self._cond.notify_all()
+
+        for scanner in scanners:
+            scanner.cancel()
+        deadline = time.time() + SCHEDULER_DRAIN_TIMEOUT
+        for t in self._threads:
+            t.join(timeout=max(deadline - time.time(), 0))
+        self._threads.clear()
+
+    def add(self, scanner: Scanner, weight: int = 1):
+        """
+        加入调度
+        :param weight: 权重，每轮连续调度的路径数
+        """
+        scanner.start_shared()
+        if scanner.is_complete():
+            self._complete(scanner)
+            return
+        with self._cond:
+            self._scanners.append(scanner)
+            self._credits[scanner] = max(weight, 1)
+            scanner.weight = max(weight, 1)
+            self._notify()
+
+    def scanners(self) -> List[Scanner]:
+        with self._cond:
+            return list(self._scanners)
+
+    def _notify(self):
+        self._cond.notify_all()
+
+    def _pick(self) -> Tuple[Scanner, str]|float:
+        """
+        加权轮询选择一个有待扫描路径且有并发名额的目标
+        :return: (扫描器, 路径)，都不可用时返回建议的等待时间(秒)
+        """
+        picked = None
+        finished = []
+        with self._cond:
+            wait = 1.0
+            for _ in range(len(self._scanners)):
+                scanner = self._scanners[0]
+                hint = scanner.limiter.try_acquire() if scanner.has_pending() else 1.0
+                if hint == 0:
+                    path = scanner.next_path()
+                    if path is not None:
+                        self._credits[scanner] -= 1
+                        if self._credits[scanner] <= 0:
+                            self._credits[scanner] = scanner.weight
+                            self._scanners.rotate(-1)
+                        picked = scanner, path
+                        break
+                    scanner.limiter.cancel()
+                    hint = 1.0
+                if not scanner.has_pending() and scanner.is_complete():
+                    # 时间预算耗尽或剩余路径都是重复路径时，没有进行中的请求，不会再由_after完成
+                    self._scanners.popleft()
+                    self._credits.pop(scanner, None)
+                    finished.append(scanner)
+                    continue
+                wait = min(wait, hint)
+                self._scanners.rotate(-1)
+
+        for scanner in finished:
+            if scanner.is_running():
+                self._complete(scanner)
+        return picked if picked is not None else wait
+
+    def _after(self, scanner: Scanner):
+        """一个路径处理完成，检查目标是否扫描结束"""
+        with self._cond:
+            done = scanner.is_complete() and scanner in self._credits
+            if done:
+                self._scanners.remove(scanner)
+                self._credits.pop(scanner, None)
+            self._notify()
+        if done and scanner.is_running():
+            self._complete(scanner)
+
+    def _complete(self, scanner: Scanner):
+        scanner.finish()
+        if self.on_complete is not None:
+            try:
+                self.on_complete(scanner)
+            except Exception as e:
+                logger.error(f"[-]Scan complete handler error: {e}")
+
+    def _slot(self):
+        """槽位线程"""
+        while self._running:
+            picked = self._pick()
+            if not isinstance(picked, tuple):
+                with self._cond:
+                    if self._running:
+                        self._cond.wait(timeout=picked)
+                continue
+
+            scanner, path = picked
+            scanner.process_path(path)
+            self._after(scanner)
+
+
+class AsyncScanScheduler(ScanScheduler):
+    """异步版共享调度器，在共享事件循环中按槽位数限制总的在途请求"""
+    def __init__(self, slots: int = SCHEDULER_ASYNC_SLOTS, on_complete: Callable[[Scanner], None] = None):
+        super().__init__(slots, on_complete)
+        self._loop: asyncio.AbstractEventLoop|None = None
+        self._event: asyncio.Event|None = None
+        self._future: concurrent.futures.Future|None = None
+        self._tasks = set()
+
+    def start(self) -> bool:
+        if self._running:
+            return False
+        self._running = True
+        self._loop = ASYNC_RUNTIME.get_loop()
+        self._future = asyncio.run_coroutine_threadsafe(self._run(), self._loop)
+        logger.info(f"[+]Async scan scheduler start, slots[{self.slots}]")
+        return True
+
+    def stop(self):
+        super().stop()
+        with self._cond:
+            self._notify()
+        if self._future is not None:
+            # 等待调度协程排空在途请求，超时后由协程自行取消剩余任务
+            try:
+                self._future.result(timeout=SCHEDULER_DRAIN_TIMEOUT + 5)
+            except Exception:
+                self._future.cancel()
+            self._future = None
+
+    def _notify(self):
+        super()._notify()
+        if self._event is not None and self._loop is not None:
+            if threading.current_thread() is ASYNC_RUNTIME.loop_thread():
+                self._event.set()
+            else:
+                self._loop.call_soon_threadsafe(self._event.set)
+
+    async def _run(self):
+        """调度协程: 有空闲槽位时选择路径并创建请求任务"""
+        self._event = asyncio.Event()
+        slots = asyncio.Semaphore(self.slots)
+        try:
+            while self._running:
+                await slots.acquire()
+                self._event.clear()
+                picked = self._pick()
+                if not isinstance(picked, tuple):
+                    slots.release()
+                    try:
+                        await asyncio.wait_for(self._event.wait(), timeout=picked)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                task = asyncio.ensure_future(self._execute(*picked, slots))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+        finally:
+            tasks = list(self._tasks)
+            if tasks:
+                _, pending = await asyncio.wait(tasks, timeout=SCHEDULER_DRAIN_TIMEOUT)
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _execute(self, scanner: AsyncScanner, path: str, slots: asyncio.Semaphore):
+        try:
+            await scanner.process_path_async(ASYNC_RUNTIME.get_client(scanner.timeout), path)
+        finally:
+            slots.release()
+            self._after(scanner)
+
+
+# 扫描状态持久化到本地SQLite，重启后继续未完成的扫描
+STATE_ENABLED = True
+STATE_DB_FILE = "scan-state.db"
+# 批量写入: 攒够STATE_BATCH_SIZE条或每STATE_FLUSH_INTERVAL秒提交一次
+STATE_BATCH_SIZE = 500
+STATE_FLUSH_INTERVAL = 1.0
+# bodies表的保留策略，打开状态库时清理: 超过保留时间(秒)的body删除，总大小超过上限时从最旧的开始删除，0表示不限制
+STATE_BODY_RETENTION = 7 * 24 * 3600
+STATE_BODY_MAX_TOTAL = 256 * 1024 * 1024
+# 超过该大小的body只保留在内存缓存中，不写入状态库
+STATE_BODY_MAX_BYTES = 1024 * 1024
+# 不再扫描的目标状态: 已完成/别名
+_FINISHED_STATUS = ("done", "alias")
+
+_STATE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS targets (
+    target TEXT PRIMARY KEY,
+    status TEXT NOT NULL DEFAULT 'pending',
+    wordlist TEXT,
+    ordering TEXT,
+    position INTEGER NOT NULL DEFAULT 0,
+    done_ahead TEXT NOT NULL DEFAULT '[]',
+    scanned INTEGER NOT NULL DEFAULT 0,
+    succeed INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    suppressed INTEGER NOT NULL DEFAULT 0,
+    created REAL,
+    updated REAL
+);
+CREATE TABLE IF NOT EXISTS hits (
+    url TEXT PRIMARY KEY,
+    target TEXT NOT NULL,
+    status INTEGER,
+    length INTEGER,
+    hash TEXT,
+    created REAL
+);
+CREATE INDEX IF NOT EXISTS hits_target ON hits(target);
+CREATE TABLE IF NOT EXISTS bodies (
+    hash TEXT PRIMARY KEY,
+    data BLOB NOT NULL,
+    created REAL
+);
+CREATE TABLE IF NOT EXISTS orders (
+    fingerprint TEXT PRIMARY KEY,
+    ranked BLOB NOT NULL,
+    created REAL
+);
+CREATE TABLE IF NOT EXISTS wordlists (
+    fingerprint TEXT PRIMARY KEY,
+    paths BLOB NOT NULL,
+    created REAL
+);
+CREATE TABLE IF NOT EXISTS harvest (
+    path TEXT PRIMARY KEY,
+    sites INTEGER NOT NULL
+);
+"""
+# 旧版本状态库缺少的列
+_STATE_MIGRATIONS = (
+    "ALTER TABLE targets ADD COLUMN ordering TEXT",
+    "ALTER TABLE hits ADD COLUMN hash TEXT",
+)
+
+
+def _target_key(target: str) -> int:
+    """目标的64位摘要，百万级目标时比保存完整URL省内存"""
+    return int.from_bytes(hashlib.blake2b(target.encode('utf-8', 'surrogatepass'), digest_size=8).digest(), 'little')
+
+
+class ScanStore:
+    """
+    扫描状态存储，所有写入由后台线程批量提交，扫描线程只做入队
+    运行中目标的进度由写线程定时从扫描器读取，不占用扫描热路径
+    """
+    def __init__(self, db_file: str):
+        self.db_file = db_file
+        self._conn: sqlite3.Connection|None = None
+        self._ops = Queue()
+        self._tracked = {}
+        # 所有目标的(状态, 更新时间)，按目标摘要索引，查询时不访问数据库
+        self._states = {}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: threading.Thread|None = None
+
+    def open(self) -> dict:
+        """
+        打开数据库并启动写线程
+        :return: {target: 状态行dict}
+        """
+        self._conn = sqlite3.connect(self.db_file, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_STATE_SCHEMA)
+        for migration in _STATE_MIGRATIONS:
+            try:
+                self._conn.execute(migration)
+            except sqlite3.OperationalError:
+                pass
+        with self._conn:
+            # 只保留未完成目标使用的扫描顺序
+            self._conn.execute("DELETE FROM orders WHERE fingerprint NOT IN "
+                               "(SELECT ordering FROM targets WHERE status != 'done' AND ordering IS NOT NULL)")
+            # 合并了采集路径的字典同样只保留未完成目标使用的
+            self._conn.execute("DELETE FROM wordlists WHERE fingerprint NOT IN "
+                               "(SELECT wordlist FROM targets WHERE status != 'done' AND wordlist IS NOT NULL)")
+            self._prune_bodies()
+        states = {row["target"]: dict(row) for row in self._conn.execute("SELECT * FROM targets")}
+        with self._lock:
+            self._states = {_target_key(target): (state["status"], state["updated"] or 0.0) for target, state in states.items()}
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._writer, name="ScanStateWriter", daemon=True)
+        self._thread.start()
+        return states
+
+    def _prune_bodies(self):
+        """按保留时间和总大小清理bodies表，保留最新的body"""
+        if STATE_BODY_RETENTION > 0:
+            self._conn.execute("DELETE FROM bodies WHERE created < ?", (time.time() - STATE_BODY_RETENTION,))
+        if STATE_BODY_MAX_TOTAL > 0:
+            self._conn.execute("DELETE FROM bodies WHERE hash IN (SELECT hash FROM "
+                               "(SELECT hash, SUM(length(data)) OVER (ORDER BY created DESC, hash) AS total FROM bodies) "
+                               "WHERE total > ?)", (STATE_BODY_MAX_TOTAL,))
+
+    def close(self):
+        """写入剩余数据和运行中目标的最新进度"""
+        if self._thread is None:
+            return
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+        self._conn.close()
+        self._conn = None
+
+    def add_target(self, target: str):
+        now = time.time()
+        with self._lock:
+            self._states.setdefault(_target_key(target), ("pending", now))
+        self._ops.put(("target", (target, now, now)))
+
+    def set_status(self, target: str, status: str):
+        now = time.time()
+        with self._lock:
+            self._states[_target_key(target)] = (status, now)
+        self._ops.put(("status", (status, now, target)))
+
+    def target_state(self, target: str) -> Tuple[str, float]|None:
+        """查询目标的(状态, 更新时间)，用于内存中已淘汰的目标，只查内存不访问数据库"""
+        with self._lock:
+            return self._states.get(_target_key(target))
+
+    def record_hit(self, target: str, url: str, status: int, length: int, body_hash: str = None):
+        self._ops.put(("hit", (url, target, status, length, body_hash, time.time())))
+
+    def put_body(self, body_hash: str, data: bytes):
+        """保存完整body，按摘要去重，超过STATE_BODY_MAX_BYTES的不保存"""
+        if STATE_BODY_MAX_BYTES > 0 and len(data) > STATE_BODY_MAX_BYTES:
+            return
+        self._ops.put(("body", (body_hash, data, time.time())))
+
+    def save_wordlist(self, wordlist: MergedWordlist):
+        """保存合并到字典的采集路径，恢复扫描时重建相同的字典"""
+        data = "\n".join(wordlist.extras).encode('utf-8')
+        self._ops.put(("wordlist", (wordlist.fingerprint(), data, time.time())))
+
+    def save_harvest(self, counts: List[Tuple[str, int]]):
+        """替换保存的路径采集统计"""
+        self._ops.put(("harvest", counts))
+
+    def track(self, target: str, scanner: Scanner):
+        """登记运行中的扫描器，写线程定时保存其进度"""
+        order = scanner.paths.order
+        if order is not None:
+            # 恢复时需要相同的扫描顺序
+            self._ops.put(("order", (order.fingerprint(), order.to_bytes(), time.time())))
+        with self._lock:
+            self._tracked[target] = (scanner, scanner.paths.wordlist.fingerprint())
+
+    def finish(self, target: str, scanner: Scanner):
+        with self._lock:
+            self._tracked.pop(target, None)
+            self._states[_target_key(target)] = ("done", time.time())
+        self._ops.put(("progress", self._progress_row(target, scanner, scanner.paths.wordlist.fingerprint(), "done")))
+
+    @staticmethod
+    def _progress_row(target: str, scanner: Scanner, wordlist: str, status: str) -> tuple:
+        state = scanner.checkpoint()
+        order = scanner.paths.order
+        return (status, wordlist, order.fingerprint() if order is not None else None, state["position"],
+                json.dumps(state["done_ahead"]), state["scanned"], state["succeed"], state["failed"],
+                state["suppressed"], time.time(), target)
+
+    def _writer(self):
+        """写线程: 批量提交"""
+        while True:
+            stopping = self._stop_event.is_set()
+            batch = []
+            deadline = time.monotonic() + STATE_FLUSH_INTERVAL
+            while len(batch) < STATE_BATCH_SIZE:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0 or stopping:
+                    try:
+                        batch.append(self._ops.get_nowait())
+                        continue
+                    except Empty:
+                        break
+                try:
+                    batch.append(self._ops.get(timeout=timeout))
+                except Empty:
+                    break
+                if self._stop_event.is_set():
+                    stopping = True
+
+            with self._lock:
+                tracked = list(self._tracked.items())
+            progress = [self._progress_row(target, scanner, wordlist, "running") for target, (scanner, wordlist) in tracked]
+
+            try:
+                self._flush(batch, progress)
+            except sqlite3.Error as e:
+                logger.error(f"[-]Save scan state failed: {e}")
+
+            if stopping and self._ops.empty():
+                break
+
+    def _flush(self, batch: list, progress: list):
+        targets = [args for op, args in batch if op == "target"]
+        hits = [args for op, args in batch if op == "hit"]
+        orders = [args for op, args in batch if op == "order"]
+        bodies = [args for op, args in batch if op == "body"]
+        statuses = [args for op, args in batch if op == "status"]
+        wordlists = [args for op, args in batch if op == "wordlist"]
+        # 采集统计每次都是全量，只写最后一次
+        harvest = [args for op, args in batch if op == "harvest"][-1:]
+        # 已完成的状态在运行中进度之后写入，避免被覆盖
+        progress = progress + [args for op, args in batch if op == "progress"]
+        if not (targets or hits or orders or bodies or statuses or wordlists or harvest or progress):
+            return
+        with self._conn:
+            if wordlists:
+                self._conn.executemany("INSERT OR IGNORE INTO wordlists(fingerprint, paths, created) VALUES (?, ?, ?)", wordlists)
+            if harvest:
+                self._conn.execute("DELETE FROM harvest")
+                self._conn.executemany("INSERT INTO harvest(path, sites) VALUES (?, ?)", harvest[0])
+            if bodies:
+                self._conn.executemany("INSERT OR IGNORE INTO bodies(hash, data, created) VALUES (?, ?, ?)", bodies)
+            if orders:
+                self._conn.executemany("INSERT OR IGNORE INTO orders(fingerprint, ranked, created) VALUES (?, ?, ?)", orders)
+            if targets:
+                self._conn.executemany("INSERT OR IGNORE INTO targets(target, created, updated) VALUES (?, ?, ?)", targets)
+            if statuses:
+                self._conn.executemany("UPDATE targets SET status = ?, updated = ? WHERE target = ?", statuses)
+            if hits:
+                self._conn.executemany("INSERT OR REPLACE INTO hits(url, target, status, length, hash, created) VALUES (?, ?, ?, ?, ?, ?)", hits)
+            if progress:
+                self._conn.executemany(
+                    "UPDATE targets SET status = ?, wordlist = ?, ordering = ?, position = ?, done_ahead = ?, scanned = ?, "
+                    "succeed = ?, failed = ?, suppressed = ?, updated = ? WHERE target = ?",
+                    progress
+                )
+
+    def hits(self, target: str) -> List[dict]:
+        """查询目标已记录的命中"""
+        conn = sqlite3.connect(self.db_file)
+        conn.row_factory = sqlite3.Row
+        try:
+            return [dict(row) for row in conn.execute("SELECT * FROM hits WHERE target = ? ORDER BY created", (target,))]
+        finally:
+            conn.close()
+
+    def body(self, body_hash: str) -> bytes|None:
+        """按摘要读取完整body"""
+        conn = sqlite3.connect(self.db_file)
+        try:
+            row = conn.execute("SELECT data FROM bodies WHERE hash = ?", (body_hash,)).fetchone()
+        finally:
+            conn.close()
+        return bytes(row[0]) if row is not None else None
+
+    def path_hits(self, target_hits: int = RANKING_TARGET_HITS) -> dict:
+        """
+        各路径命中过的目标数，用于命中排序
+        :param target_hits: 命中数超过该值的目标不计入
+        """
+        conn = sqlite3.connect(self.db_file)
+        try:
+            return dict(conn.execute(
+                "SELECT substr(url, length(target) + 2) AS path, COUNT(*) FROM hits WHERE target IN "
+                "(SELECT target FROM hits GROUP BY target HAVING COUNT(*) <= ?) GROUP BY path",
+                (target_hits,)
+            ))
+        finally:
+            conn.close()
+
+    def load_wordlist(self, fingerprint: str) -> List[str]|None:
+        """读取保存的采集路径"""
+        conn = sqlite3.connect(self.db_file)
+        try:
+            row = conn.execute("SELECT paths FROM wordlists WHERE fingerprint = ?", (fingerprint,)).fetchone()
+        finally:
+            conn.close()
+        return bytes(row[0]).decode('utf-8').split("\n") if row is not None else None
+
+    def load_harvest(self) -> dict:
+        conn = sqlite3.connect(self.db_file)
+        try:
+            return dict(conn.execute("SELECT path, sites FROM harvest"))
+        finally:
+            conn.close()
+
+    def load_order(self, fingerprint: str, total: int) -> PathOrder|None:
+        """读取保存的扫描顺序"""
+        conn = sqlite3.connect(self.db_file)
+        try:
+            row = conn.execute("SELECT ranked FROM orders WHERE fingerprint = ?", (fingerprint,)).fetchone()
+        finally:
+            conn.close()
+        return PathOrder.from_bytes(row[0], total) if row is not None else None
+
+
+# 结果上报: 命中结果先入队，由上报线程攒够RESULT_BATCH_SIZE条或每RESULT_FLUSH_INTERVAL秒回调一次
+RESULT_BATCH_SIZE = 100
+RESULT_FLUSH_INTERVAL = 0.5
+# 结果只带body前RESULT_PREVIEW_BYTES字节的预览，完整body按摘要通过fetch_body获取
+RESULT_PREVIEW_BYTES = 512
+# 内存中保留的完整body总大小，开启状态库时同时写入bodies表
+RESULT_BODY_CACHE_BYTES = 64 * 1024 * 1024
+
+
+def _body_hash(body: bytes) -> str:
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+def _preview(body: bytes, limit: int = RESULT_PREVIEW_BYTES) -> dict:
+    """body前缀，格式与HttpBody一致: 0无内容 1文本 2二进制"""
+    prefix = body[:limit]
+    if not prefix:
+        return {"type": 0, "payload": None}
+    try:
+        return {"type": 1, "payload": prefix.decode('utf-8')}
+    except UnicodeDecodeError as e:
+        # 截断位置落在多字节字符中间时丢弃残缺的字符
+        if len(prefix) < len(body) and e.start >= len(prefix) - 3 and e.reason == "unexpected end of data":
+            return {"type": 1, "payload": prefix[:e.start].decode('utf-8')}
+        return {"type": 2, "payload": prefix}
+
+
+class BodyCache:
+    """按总字节数限制的LRU body缓存"""
+    def __init__(self, max_bytes: int = RESULT_BODY_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._bodies = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, body_hash: str, body: bytes) -> bool:
+        """:return: 是否为新body"""
+        with self._lock:
+            if body_hash in self._bodies:
+                self._bodies.move_to_end(body_hash)
+                return False
+            if len(body) > self.max_bytes:
+                return True
+            self._bodies[body_hash] = body
+            self.nbytes += len(body)
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._bodies.popitem(last=False)
+                self.nbytes -= len(evicted)
+            return True
+
+    def get(self, body_hash: str) -> bytes|None:
+        with self._lock:
+            body = self._bodies.get(body_hash)
+            if body is not None:
+                self._bodies.move_to_end(body_hash)
+            return body
+
+
+class ResultBatcher:
+    """
+    结果批量上报，回调在独立线程执行，不占用扫描线程和扫描器的锁
+    回调阻塞时结果在队列中累积，不丢弃
+    """
+    def __init__(self, handler: Callable[[list], None], batch_size: int = RESULT_BATCH_SIZE, interval: float = RESULT_FLUSH_INTERVAL):
+        self.handler = handler
+        self.batch_size = max(batch_size, 1)
+        self.interval = interval
+        self._queue = Queue()
+        self._stop_event = threading.Event()
+        self._thread: threading.Thread|None = None
+
+        self.delivered = 0
+        self.batches = 0
+        self.errors = 0
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="ResultDelivery", daemon=True)
+        self._thread.start()
+        if METRICS is not None:
+            plugin_metrics.REGISTRY.gauge_func("scanner_result_queue", "Results waiting for delivery", (),
+                                               lambda: {(): self._queue.qsize()})
+
+    def stop(self):
+        """上报剩余结果后退出"""
+        if self._thread is None:
+            return
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+
+    def put(self, row: dict):
+        self._queue.put(row)
+
+    def _run(self):
+        while True:
+            stopping = self._stop_event.is_set()
+            batch = []
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                try:
+                    if timeout <= 0 or stopping:
+                        batch.append(self._queue.get_nowait())
+                    else:
+                        batch.append(self._queue.get(timeout=min(timeout, 0.1)))
+                except Empty:
+                    if timeout <= 0 or stopping or self._stop_event.is_set():
+                        break
+                    if not batch:
+                        deadline = time.monotonic() + self.interval
+
+            if batch:
+                begin = time.monotonic()
+                try:
+                    self.handler(batch)
+                except Exception as e:
+                    self.errors += 1
+                    logger.error(f"[-]On data handler error: {str(e)}")
+                if METRICS is not None:
+                    METRICS.callback.observe(time.monotonic() - begin)
+                self.delivered += len(batch)
+                self.batches += 1
+
+            if (stopping or self._stop_event.is_set()) and self._queue.empty():
+                break
+
+    def stats(self) -> dict:
+        return {
+            "pending": self._queue.qsize(),
+            "delivered": self.delivered,
+            "batches": self.batches,
+            "errors": self.errors,
+        }
+
+
+# 已处理目标集合的上限，超过后淘汰最久未出现的目标
+# 开启状态库时被淘汰的目标仍可从库中查到，不会重复扫描
+PROCESSED_TARGETS_MAX = 65536
+# 已处理目标的有效期(秒)，过期后再次出现会重新扫描，0为不过期
+PROCESSED_TARGETS_TTL = 0
+# 解析到同一IP:端口且根路径响应指纹一致的目标视为别名，只扫描第一个
+TARGET_ENDPOINT_DEDUP = False
+
+
+class TargetSet:
+    """有容量上限和有效期的目标集合，接口与set的add/in/discard一致"""
+    def __init__(self, max_size: int = PROCESSED_TARGETS_MAX, ttl: float = PROCESSED_TARGETS_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._items = OrderedDict()
+
+    def add(self, target: str, seen: float = None):
+        """:param seen: 记录时间(time.time())，默认当前时间"""
+        with self._lock:
+            self._items[target] = time.time() if seen is None else seen
+            self._items.move_to_end(target)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def __contains__(self, target: str) -> bool:
+        with self._lock:
+            seen = self._items.get(target)
+            if seen is None:
+                return False
+            if self.expired(seen):
+                del self._items[target]
+                return False
+            self._items.move_to_end(target)
+            return True
+
+    def expired(self, seen: float) -> bool:
+        return self.ttl > 0 and time.time() - seen > self.ttl
+
+    def discard(self, target: str):
+        with self._lock:
+            self._items.pop(target, None)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+# 定义扫描管理器，存储扫描结果
+class ScannerManager:
+    def __init__(self, dict_file: str, max_concurrent: int = SCHEDULER_MAX_TARGETS, on_data_handler: Callable[[list], None] = None, engine: str = SCAN_ENGINE, probe_mode: str = PROBE_MODE,
+                 request_budget: int = TARGET_REQUEST_BUDGET, time_budget: float = TARGET_TIME_BUDGET):
+        self.dict_file = dict_file
+        self.engine = engine
+        self.probe_mode = probe_mode
+        # 单目标预算
+        self.request_budget = request_budget
+        self.time_budget = time_budget
+        # absolute_path = Path(dict_file).resolve()
+        # print(f'absolute_path:{absolute_path}')
+
+        self.unique_paths = Wordlist.from_paths(())
+        # 同时参与调度的目标数
+        self.max_concurrent = max_concurrent
+
+        self._buffer_lock = threading.Lock()
+        self._active_targets = threading.Semaphore(max(max_concurrent, 1))
+        self.scheduler: ScanScheduler|None = None
+        # 扫描状态存储，字典文件同目录
+        self.store: ScanStore|None = None
+        self._targets_by_scanner = {}
+        self._resume_states = {}
+        # 路径命中统计，决定新目标的扫描顺序
+        self.ranking = PathRanking() if RANKING_ENABLED else None
+        # 代理流量中采集的路径，定期合并到字典
+        self.harvester = PathHarvester() if HARVEST_ENABLED else None
+        self.base_paths = self.unique_paths
+        self._harvest_merged = 0.0
+        # 恢复中的目标使用的合并字典 {fingerprint: wordlist}
+        self._wordlists = {}
+        # 结果批量上报，完整body按摘要缓存
+        self.results: ResultBatcher|None = None
+        self.bodies = BodyCache()
+
+        # 任务管理
+        self.processed_targets = TargetSet()
+        # 按IP:端口分组的已扫描目标及根路径指纹，用于识别别名
+        self._endpoints = OrderedDict()
+        self.alias_targets = 0
+        self.target_queue = Queue()
+        self.running_scanners: List[Scanner] = []
+        self.worker_threads: List[threading.Thread] = []
+        self.is_running = False
+
+        self.on_data_handler = on_data_handler
+        pass
+
+    def start(self) -> bool:
+        """启动扫描服务"""
         if self.is_running:
             return False
 
         if self._load_dict() is False:
             return False
+        self.base_paths = self.unique_paths
+        self._wordlists.clear()
 
+        # 上次停止时未完成的扫描器不会再回调完成，重新创建调度名额
+        with self._buffer_lock:
+            self._active_targets = threading.Semaphore(max(self.max_concurrent, 1))
+            self.running_scanners.clear()
+            self._targets_by_scanner.clear()
+
+        if STATE_ENABLED:
+            self._open_store()
+        self._merge_harvest(force=True)
+
+        self.results = ResultBatcher(self.on_data_handler)
+        self.results.start()
+
+        if METRICS is not None and METRICS_PORT:
+            plugin_metrics.start_exporter(METRICS_PORT)
+
+        scheduler_class = AsyncScanScheduler if self.engine == "async" else ScanScheduler
+        self.scheduler = scheduler_class(on_complete=self._on_scanner_complete)
+        self.scheduler.start()
+
+        # 只需一个分发线程，请求由调度器的共享槽位执行
         self.is_running = True
-        for _ in range(self.max_concurrent):
-            thread = threading.Thread(target=self._worker)
-            thread.daemon = True
-            thread.start()
-            self.worker_threads.append(thread)
+        thread = threading.Thread(target=self._worker, name="ScanDispatcher")
+        thread.daemon = True
+        thread.start()
+        self.worker_threads.append(thread)
 
         logger.info(f"[+]Start scan manager")
 
@@ -342,36 +3319,148 @@ class ScannerManager:
 
         with self._buffer_lock:
             self.is_running = False
-            for scanner in self.running_scanners:
-                scanner.cancel()
             self.running_scanners.clear()
+            interrupted = list(self._targets_by_scanner.values())
 
         for thread in self.worker_threads:
             thread.join()
         self.worker_threads.clear()
+        if self.scheduler is not None:
+            self.scheduler.stop()
+            self.scheduler = None
+        ASYNC_RUNTIME.stop()
+        if self.results is not None:
+            self.results.stop()
+            self.results = None
+        if METRICS is not None and METRICS_PORT:
+            plugin_metrics.stop_exporter(METRICS_PORT)
+        if self.store is not None:
+            if self.harvester is not None:
+                self.store.save_harvest(self.harvester.top(HARVEST_MAX_NODES, 1))
+            # 未完成的目标保存为running，下次启动时继续
+            self.store.close()
+            self.store = None
+        # 中断的目标不算已处理，重新启动时从状态库恢复，未开启状态库时可以被重新添加
+        for target in interrupted:
+            self.processed_targets.discard(target)
 
         logger.info(f"[+]Stopped scan manager")
 
         return True
 
+    def _open_store(self):
+        """打开状态库，已完成的目标不再扫描，未完成的目标重新排队"""
+        db_file = os.path.join(os.path.dirname(os.path.abspath(self.dict_file)), STATE_DB_FILE)
+        try:
+            self.store = ScanStore(db_file)
+            states = self.store.open()
+        except sqlite3.Error as e:
+            logger.error(f"[-]Open scan state failed: {e}")
+            self.store = None
+            return
+
+        resumed = 0
+        # 按更新时间加载，超过容量时保留最近的目标
+        for target, state in sorted(states.items(), key=lambda item: item[1]["updated"] or 0.0):
+            if target in self.processed_targets:
+                continue
+            if state["status"] in _FINISHED_STATUS:
+                if not self.processed_targets.expired(state["updated"] or 0.0):
+                    self.processed_targets.add(target, state["updated"])
+                continue
+            self.processed_targets.add(target)
+            self._resume_states[target] = state
+            self.target_queue.put(target)
+            resumed += 1
+        logger.info(f"[+]Load scan state: targets[{len(states)}], resume[{resumed}]")
+
+        if self.ranking is not None:
+            try:
+                self.ranking.load(self.store.path_hits())
+            except sqlite3.Error as e:
+                logger.error(f"[-]Load path ranking failed: {e}")
+        if self.harvester is not None:
+            try:
+                self.harvester.load(self.store.load_harvest())
+            except sqlite3.Error as e:
+                logger.error(f"[-]Load harvested paths failed: {e}")
+
+    def _merge_harvest(self, force: bool = False):
+        """采集到的常见路径合并到字典最前面，之后开始的目标使用新字典"""
+        if self.harvester is None:
+            return
+        now = time.monotonic()
+        if not force and now - self._harvest_merged < HARVEST_REFRESH_INTERVAL:
+            return
+        self._harvest_merged = now
+
+        base = self.base_paths
+        extras = [path for path, _ in self.harvester.top(HARVEST_TOP) if base.index_of(path) is None]
+        current = self.unique_paths.extras if isinstance(self.unique_paths, MergedWordlist) else None
+        if (list(current) if current is not None else []) == extras:
+            return
+        self.unique_paths = MergedWordlist(Wordlist.from_paths(extras), base) if extras else base
+        if self.store is not None:
+            if extras:
+                self.store.save_wordlist(self.unique_paths)
+            self.store.save_harvest(self.harvester.top(HARVEST_MAX_NODES, 1))
+        logger.info(f"[+]Merge harvested paths into dicts [{len(extras)}]")
+
+    def _wordlist_for(self, state: dict|None):
+        """恢复的目标使用检查点中的字典，无法重建时使用当前字典"""
+        if state is None or not state["wordlist"] or state["wordlist"] == self.unique_paths.fingerprint():
+            return self.unique_paths
+        if state["wordlist"] == self.base_paths.fingerprint():
+            return self.base_paths
+        wordlist = self._wordlists.get(state["wordlist"])
+        if wordlist is None and self.store is not None:
+            try:
+                extras = self.store.load_wordlist(state["wordlist"])
+            except sqlite3.Error as e:
+                logger.error(f"[-]Load harvested dicts failed: {e}")
+                extras = None
+            if extras is not None:
+                wordlist = MergedWordlist(Wordlist.from_paths(extras), self.base_paths)
+                if wordlist.fingerprint() != state["wordlist"]:
+                    wordlist = None
+                else:
+                    self._wordlists[state["wordlist"]] = wordlist
+        return wordlist if wordlist is not None else self.unique_paths
+
     def _load_dict(self) -> bool:
         """安全加载字典文件"""
+        rules_file = os.path.join(os.path.dirname(os.path.abspath(self.dict_file)), WORDLIST_RULES_FILE)
+        if os.path.exists(rules_file):
+            try:
+                self.unique_paths = GeneratedWordlist.from_rules(rules_file, self.dict_file, self._read_dict_file)
+            except (OSError, ValueError) as e:
+                logger.error(f"[-]Load generated dicts failed: {e}")
+                return False
+            wordlist = self.unique_paths
+            logger.info(f"[+]Load generated dicts [{len(wordlist)}](words: {len(wordlist.words)}, templates: {len(wordlist.templates)})")
+            return len(wordlist) > 0
+
+        cache_file = self.dict_file + WORDLIST_CACHE_SUFFIX
+        if WORDLIST_MMAP:
+            wordlist = Wordlist.load(cache_file, self.dict_file)
+            if wordlist is not None and len(wordlist) > 0:
+                self.unique_paths = wordlist
+                logger.info(f"[+]Load path from compiled dicts [{len(wordlist)}]")
+                return True
+
         encodings = ['utf-8', 'gb18030', 'latin-1']
 
         for enc in encodings:
             try:
                 with open(self.dict_file, 'r', encoding=enc) as f:
-                    for line in f:
-                        path = line.strip()
-                        if path and not path.startswith(('#', ';', '//')):
-                            try:
-                                # 标准化路径
-                                path = path.lstrip('/')
-                                safe_path = urllib.parse.quote(path)
-                                self.unique_paths.add(safe_path)
-                            except Exception as e:
-                                logger.warning(f"[-]Parsed url error: {path} - {e}")
-                                continue
+                    self.unique_paths = Wordlist.from_paths(self._iter_dict(f))
+
+                if WORDLIST_MMAP and len(self.unique_paths) > 0:
+                    try:
+                        self.unique_paths.save(cache_file, self.dict_file)
+                        self.unique_paths = Wordlist.load(cache_file, self.dict_file) or self.unique_paths
+                    except OSError as e:
+                        logger.warning(f"[-]Save compiled dicts failed: {e}")
 
                 total_paths = len(self.unique_paths)
                 logger.info(f"[+]Load path from dicts [{total_paths}](encoding: {enc})")
@@ -387,6 +3476,31 @@ class ScannerManager:
         logger.error(f"[-]Load path from dicts failed")
         return False
 
+    @staticmethod
+    def _read_dict_file(file: str) -> List[str]:
+        """按编码依次尝试读取字典文件"""
+        for enc in ('utf-8', 'gb18030', 'latin-1'):
+            try:
+                with open(file, 'r', encoding=enc) as f:
+                    return list(ScannerManager._iter_dict(f))
+            except UnicodeDecodeError:
+                continue
+        return []
+
+    @staticmethod
+    def _iter_dict(f):
+        """逐行读取字典，返回标准化后的路径"""
+        for line in f:
+            path = line.strip()
+            if path and not path.startswith(('#', ';', '//')):
+                try:
+                    # 标准化路径，只含安全字符的路径quote后不变，跳过编码
+                    path = path.lstrip('/')
+                    yield path if _QUOTE_SAFE.fullmatch(path) else urllib.parse.quote(path)
+                except Exception as e:
+                    logger.warning(f"[-]Parsed url error: {path} - {e}")
+                    continue
+
     def add_target(self, context: Context, request: HttpRequest) -> bool:
         if context.port in [80, 443]:
             target = f'{context.scheme}://{context.host}'
@@ -394,67 +3508,241 @@ class ScannerManager:
             target = f'{context.scheme}://{context.host}:{context.port}'
 
         """添加扫描目标, 已添加过的目标会忽略"""
+        if self.harvester is not None and request is not None and request.path:
+            self.harvester.observe(context.host, request.path)
         if target in self.processed_targets:
             # logger.info(f"[+]Target already exists: [{target}]")
             return False
+        if self._known_target(target):
+            return False
 
         self.processed_targets.add(target)
         self.target_queue.put(target)
+        if self.store is not None:
+            self.store.add_target(target)
 
         logger.info(f"[+]Add target: [{target}]")
 
         return True
 
+    def _known_target(self, target: str) -> bool:
+        """内存中已淘汰但状态库中仍有效的目标"""
+        if self.store is None:
+            return False
+        state = self.store.target_state(target)
+        if state is None:
+            return False
+        status, updated = state
+        if status in _FINISHED_STATUS and self.processed_targets.expired(updated):
+            return False
+        self.processed_targets.add(target, updated if status in _FINISHED_STATUS else None)
+        return True
+
     def _worker(self):
-        """工作线程核心逻辑"""
+        """分发线程: 控制同时调度的目标数，把新目标交给调度器"""
         while self.is_running:
+            if not self._active_targets.acquire(timeout=1):
+                continue
             try:
                 target = self.target_queue.get(timeout=1)
+            except Empty:
+                self._active_targets.release()
+                continue
 
+            try:
                 # 创建带回调的Scanner
-                scanner = Scanner(
-                    target=target,
-                    unique_paths=self.unique_paths,
-                    new_data_handler=self._handle_new_results  # 绑定回调
-                )
+                state = self._resume_states.pop(target, None)
+                if state is None:
+                    self._merge_harvest()
+                wordlist = self._wordlist_for(state)
+                scanner = self._create_scanner(target, self._order_for(target, state, wordlist), wordlist)
+                alias = self._find_alias(target, scanner) if TARGET_ENDPOINT_DEDUP and state is None else None
+                if alias is not None:
+                    logger.info(f"[+]Skip alias target[{target}] of [{alias}]")
+                    self.alias_targets += 1
+                    if self.store is not None:
+                        self.store.set_status(target, "alias")
+                    self._active_targets.release()
+                    self.target_queue.task_done()
+                    continue
+                self._restore(target, scanner, state)
 
                 with self._buffer_lock:
                     self.running_scanners.append(scanner)
+                    self._targets_by_scanner[scanner] = target
+                if self.store is not None:
+                    self.store.track(target, scanner)
 
-                scanner.scan()
-                scanner.wait_for_completion()
-
-                with self._buffer_lock:
-                    if scanner in self.running_scanners:
-                        self.running_scanners.remove(scanner)
-
-                self.target_queue.task_done()
-            except Empty:
-                continue
+                self.scheduler.add(scanner)
             except Exception as e:
                 print(f"[-]Scan manager worker error: {str(e)}")
+                self._active_targets.release()
+                self.target_queue.task_done()
+
+    def _find_alias(self, target: str, scanner: Scanner) -> str|None:
+        """
+        同一IP:端口上根路径响应指纹一致的已扫描目标
+        :return: 别名对应的目标，不是别名时返回None
+        """
+        parts = urllib.parse.urlsplit(scanner.target)
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+        try:
+            infos = DNS_CACHE.resolve(parts.hostname, port) if DNS_CACHE is not None else socket.getaddrinfo(parts.hostname, port, type=socket.SOCK_STREAM)
+        except OSError:
+            return None
+        if not infos:
+            return None
+        endpoint = (parts.scheme, min(sockaddr[0] for _, _, _, _, sockaddr in infos), port)
+        fingerprint = scanner.root_fingerprint()
+        if fingerprint is None:
+            return None
+
+        with self._buffer_lock:
+            members = self._endpoints.get(endpoint)
+            if members is None:
+                members = self._endpoints[endpoint] = []
+                while len(self._endpoints) > PROCESSED_TARGETS_MAX:
+                    self._endpoints.popitem(last=False)
+            for other, other_fingerprint in members:
+                if fingerprint.matches(other_fingerprint):
+                    return other
+            # 同一IP上的不同站点数有限，只保留最近的
+            members.append((target, fingerprint))
+            del members[:-64]
+        return None
+
+    def _order_for(self, target: str, state: dict|None, wordlist) -> PathOrder|None:
+        """恢复的目标沿用检查点中的扫描顺序，新目标使用当前的命中排序"""
+        if state is not None and (state["position"] or state["done_ahead"] != "[]"):
+            if not state["ordering"]:
+                return None
+            try:
+                order = self.store.load_order(state["ordering"], len(wordlist))
+            except sqlite3.Error as e:
+                logger.error(f"[-]Load scan order failed: {e}")
+                order = None
+            if order is not None:
+                return order
+            logger.warning(f"[-]Scan order lost, restart scan[{target}]")
+            state["position"], state["done_ahead"] = 0, "[]"
+
+        if self.ranking is None:
+            return None
+        return self.ranking.order(wordlist)
+
+    def _restore(self, target: str, scanner: Scanner, state: dict|None):
+        """按检查点恢复扫描进度，字典变化时从头开始"""
+        if state is None or not state["position"] and state["done_ahead"] == "[]":
+            return
+        if state["wordlist"] != scanner.paths.wordlist.fingerprint():
+            logger.warning(f"[-]Dicts changed, restart scan[{target}]")
+            return
+        scanner.resume(state["position"], json.loads(state["done_ahead"]),
+                       (state["scanned"], state["succeed"], state["failed"], state["suppressed"]))
+
+    def _on_scanner_complete(self, scanner: Scanner):
+        """目标扫描完成，释放调度名额"""
+        with self._buffer_lock:
+            if scanner in self.running_scanners:
+                self.running_scanners.remove(scanner)
+            target = self._targets_by_scanner.pop(scanner, None)
+        if self.store is not None and target is not None:
+            self.store.finish(target, scanner)
+        if self.ranking is not None and target is not None:
+            self.ranking.forget(target)
+        self._active_targets.release()
+        self.target_queue.task_done()
+
+    def _create_scanner(self, target: str, order: PathOrder = None, wordlist=None) -> Scanner:
+        """按配置的引擎创建扫描器"""
+        scanner_class = AsyncScanner if self.engine == "async" else Scanner
+        return scanner_class(
+            target=target,
+            unique_paths=wordlist if wordlist is not None else self.unique_paths,
+            new_data_handler=self._handle_new_results,  # 绑定回调
+            probe_mode=self.probe_mode,
+            order=order,
+            request_budget=self.request_budget,
+            time_budget=self.time_budget
+        )
 
     def _handle_new_results(self, result: list, req: Request, response: addinfourl):
-        httpRequest = HttpRequest.from_urllib_request(req)
-        httpResp = HttpResponse.from_urllib_response(response)
-        if httpResp.body.isText and httpResp.body.payload and isinstance(httpResp.body.payload, str):
-            result.append(len(httpResp.body.payload))
+        """
+        生成精简结果: [URL, 状态码, 长度, body摘要]，响应只带body预览
+        完整body按摘要保存，通过fetch_body获取
+        """
+        body = response.read() or b''
+        if isinstance(response, ProbeResponse):
+            # 探测模式未拉取body时使用响应头中的长度
+            length = response.content_length
         else:
-            result.append(0)
-
-        self.on_data_handler([
-            {
-                "data": result,
-                "request": httpRequest.serialize(),
-                "response": httpResp.serialize(),
-            }
-        ])
+            length = len(body)
+        body_hash = _body_hash(body) if body else None
+        result += [length, body_hash]
+
+        if body_hash is not None and self.bodies.put(body_hash, body) and self.store is not None:
+            self.store.put_body(body_hash, body)
+
+        target = urllib.parse.urlsplit(result[0])._replace(path='', query='', fragment='').geturl()
+        if self.store is not None:
+            self.store.record_hit(target, result[0], result[1], length, body_hash)
+        if self.ranking is not None:
+            self.ranking.record(target, result[0][len(target) + 1:])
+
+        httpResp = HttpResponse({
+            "code": str(result[1]),
+            "message": getattr(response, 'reason', '') or '',
+            "headers": [f"{k}: {v}" for k, v in response.headers.items()],
+            "body": _preview(body),
+        })
+        results = self.results
+        if results is None:
+            return
+        results.put({
+            "data": result,
+            "request": HttpRequest.from_urllib_request(req).serialize(),
+            "response": httpResp.serialize(),
+        })
+
+    def fetch_body(self, body_hash: str) -> bytes|None:
+        """按摘要获取完整body"""
+        body = self.bodies.get(body_hash)
+        if body is None and self.store is not None:
+            try:
+                body = self.store.body(body_hash)
+            except sqlite3.Error as e:
+                logger.error(f"[-]Load body failed: {e}")
+        return body
 
     pass
 
 
 manager:ScannerManager = None
 
+
+def harvest_stats() -> dict|None:
+    """路径采集统计和当前合并到字典的路径，未开启时返回None"""
+    global manager
+    if manager is None or manager.harvester is None:
+        return None
+    stats = manager.harvester.stats()
+    wordlist = manager.unique_paths
+    stats["merged"] = len(wordlist.extras) if isinstance(wordlist, MergedWordlist) else 0
+    stats["top"] = manager.harvester.top(20)
+    return stats
+
+
+def fetch_body(body_hash: str) -> bytes|None:
+    """
+    获取结果的完整body
+    :param body_hash: 结果data中的body摘要
+    :return:
+    """
+    global manager
+    if manager is None:
+        return None
+    return manager.fetch_body(body_hash)
+
 """
 # 必须实现以下方法
 """
@@ -499,8 +3787,12 @@ def initialize(on_data_handler: Callable[[list], None]):
 
     manager = ScannerManager(
         dict_file=dict_file,
-        max_concurrent=1,
-        on_data_handler=on_data_handler
+        max_concurrent=SCHEDULER_MAX_TARGETS,
+        on_data_handler=on_data_handler,
+        engine=SCAN_ENGINE,
+        probe_mode=PROBE_MODE,
+        request_budget=TARGET_REQUEST_BUDGET,
+        time_budget=TARGET_TIME_BUDGET
     )
 
 def start() -> bool:
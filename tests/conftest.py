@@ -0,0 +1,13 @@
+# -*- encoding: utf-8 -*-
+import sys
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+PLUGIN_DIR = ROOT_DIR / "plugin"
+
+# 插件按文件加载，测试时把插件目录加入sys.path；没有安装宿主的chui_http时使用tools中的替身
+sys.path.insert(0, str(PLUGIN_DIR))
+try:
+    import chui_http
+except ImportError:
+    sys.path.insert(0, str(ROOT_DIR / "tools" / "stub"))
@@ -0,0 +1,24 @@
+# -*- encoding: utf-8 -*-
+"""跨flow结果去重和命中次数"""
+from respbody_filter import FindingIndex
+
+
+def test_repeated_hits_report_doubling_counts():
+    index = FindingIndex(lru_size=16, bloom_bits=1024)
+    reported = [index.observe("key", "value") for _ in range(10)]
+    assert reported == [1, 2, 0, 4, 0, 0, 0, 8, 0, 0]
+    assert index.counts() == [("key", "value", None, 10)]
+
+
+def test_report_counts_disabled_reports_first_hit_only():
+    index = FindingIndex(lru_size=16, bloom_bits=1024, report_counts=False)
+    assert [index.observe("key", "value") for _ in range(4)] == [1, 0, 0, 0]
+
+
+def test_evicted_finding_is_not_reported_again():
+    index = FindingIndex(lru_size=1, bloom_bits=1024)
+    assert index.observe("key", "a") == 1
+    assert index.observe("key", "b") == 1
+    # a已从LRU淘汰，由布隆过滤器记住，重新计数从2开始
+    assert index.observe("key", "a") == 0
+    assert index.stats() == {"unique": 2, "duplicates": 1, "recent": 1}
@@ -0,0 +1,92 @@
+# -*- encoding: utf-8 -*-
+"""探测模式只对文本类、大小不超过上限的命中拉取完整body"""
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import scanner
+
+PAGES = {
+    "/page": ("text/html; charset=utf-8", b"<html>" + b"a" * 5000),
+    "/big": ("text/plain", b"b" * (2 * 1024 * 1024)),
+    "/image": ("image/png", b"\x89PNG" + b"c" * 50000),
+}
+
+
+@pytest.fixture(scope="module")
+def server():
+    sent = {}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def do_HEAD(self):
+            self.do_GET(head=True)
+
+        def do_GET(self, head=False):
+            content_type, body = PAGES.get(self.path, ("text/plain", None))
+            if body is None:
+                self.send_response(404)
+                self.send_header('Content-Length', '2')
+                self.end_headers()
+                if not head:
+                    self.wfile.write(b'nf')
+                return
+            rng = self.headers.get('Range')
+            status, part = 200, body
+            if rng:
+                part = body[:scanner.PROBE_RANGE_BYTES]
+                status = 206
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(part)))
+            if rng:
+                self.send_header('Content-Range', f'bytes 0-{len(part) - 1}/{len(body)}')
+            self.end_headers()
+            if not head:
+                with lock:
+                    sent[self.path] = sent.get(self.path, 0) + len(part)
+                try:
+                    self.wfile.write(part)
+                except OSError:
+                    pass
+
+    srv = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield srv, sent
+    srv.shutdown()
+    srv.server_close()
+
+
+@pytest.mark.parametrize("scanner_class", [scanner.Scanner, scanner.AsyncScanner])
+@pytest.mark.parametrize("mode", ["head", "range"])
+def test_probe_skips_large_and_binary_bodies(server, monkeypatch, scanner_class, mode):
+    srv, sent = server
+    sent.clear()
+    monkeypatch.setattr(scanner, "PROBE_HOSTS", scanner.HostProbeModes())
+    monkeypatch.setattr(scanner, "WILDCARD_CALIBRATION", False)
+    results = {}
+
+    def handler(result, req, response):
+        body = response.read()
+        # HEAD模式下每个主机的首个命中用GET校验，返回的是普通响应
+        results[result[0].rsplit('/', 1)[1]] = (body, getattr(response, 'content_length', len(body)))
+
+    scan = scanner_class(f"http://127.0.0.1:{srv.server_port}", ["page", "big", "image", "missing"], handler, probe_mode=mode)
+    scan.scan()
+    scan.wait_for_completion()
+
+    # 文本小页面拉取完整body
+    assert results["page"] == (PAGES["/page"][1], len(PAGES["/page"][1]))
+    # 超过上限和二进制类型的命中只保留响应头中的长度和探测时的前缀
+    for name in ("big", "image"):
+        body, length = results[name]
+        assert length == len(PAGES[f"/{name}"][1])
+        assert len(body) <= scanner.PROBE_RANGE_BYTES
+        assert sent.get(f"/{name}", 0) <= scanner.PROBE_RANGE_BYTES
+    assert scanner.probe_stats()["skipped_fetches"] == 2
@@ -0,0 +1,107 @@
+# -*- encoding: utf-8 -*-
+"""RegexMatcher/scan_stream 与逐条规则`findall`的结果一致性"""
+import json
+import random
+import re
+import string
+
+import pytest
+
+import respbody_filter
+from respbody_filter import RegexMatcher, scan_stream, _compile_rules, _iter_chunks
+
+# 规则中出现的字面量片段，拼接进随机语料以覆盖锚点、断言和边界
+FRAGMENTS = [
+    "AKID", "APID", "LTAI", "Hk7h", "JDC_", "AKLT", "AKTP", "AKIA", "A3TX", "AIza", "IBM", "LTC", "wx", "ww", "gh_",
+    "GOOG", "AZ", "UC", "QY", "YD", "YY", "CTC",
+    "bucket-", "-1250000000", ".cos.ap-guangzhou.myqcloud.com", ".cos.", "myqcloud.com",
+    "https://oapi.dingtalk.com/robot/send?access_token=", "https://open.feishu.cn/open-apis/bot/v2/hook/",
+    "https://qyapi.weixin.qq.com/cgi-bin/webhook/send?key=", "https://new-api.meiqia.com/sdk/statistics?ent_id=",
+    "https://tb.53kf.com/code/client/", "/1?device=",
+]
+ALPHABET = string.ascii_letters + string.digits + "\"'-_.:/=?() ;,\n"
+
+
+def _corpus(rnd: random.Random, size: int) -> str:
+    parts = []
+    length = 0
+    while length < size:
+        if rnd.random() < 0.05:
+            part = f"https://b{rnd.randint(0, 9)}-{rnd.randint(0, 10 ** 10)}.cos.ap-guangzhou.myqcloud.com/a.png"
+        elif rnd.random() < 0.25:
+            # 字面量后面接一段规则字符集内的字符，凑出完整命中
+            chars = rnd.choice((string.ascii_uppercase + string.digits, string.ascii_lowercase + string.digits, string.digits))
+            part = rnd.choice(FRAGMENTS) + ''.join(rnd.choice(chars) for _ in range(rnd.randint(8, 70))) + rnd.choice("\"' ;")
+        else:
+            chars = rnd.choice((string.ascii_uppercase + string.digits, string.ascii_lowercase + string.digits, ALPHABET))
+            part = ''.join(rnd.choice(chars) for _ in range(rnd.randint(1, 48)))
+        parts.append(part)
+        length += len(part)
+    return ''.join(parts)
+
+
+def _baseline(regexs: dict, data: str) -> set:
+    return {(key, value) for key, reg in regexs.items() for value in reg.findall(data)}
+
+
+@pytest.fixture(scope="module")
+def rule_regexs() -> dict:
+    with open(respbody_filter.RULES_FILE, 'rb') as file:
+        rules, _ = _compile_rules(json.loads(file.read().decode('utf8')))
+    return {key: rule['reg'] for key, rule in rules.items()}
+
+
+SYNTHETIC = {
+    # 反向引用不能参与合并正则
+    "backref_letter": re.compile(r"([a-z])\1x"),
+    "backref_digit": re.compile(r"([0-9])\1y"),
+    "backref_named": re.compile(r"(?P<q>['\"])[a-z]{3}(?P=q)"),
+    # 未参与匹配的分组与findall一致返回''
+    "optional_group": re.compile(r"k(a)?(b)"),
+    # 无锚点、带前后断言的规则
+    "digits_z": re.compile(r"(?<=-)[0-9]{3,8}(?=z)"),
+    "empty_ok": re.compile(r"q?"),
+    # 锚点互为前缀
+    "prefix_short": re.compile(r"\bAK[A-Z]{4}\b"),
+    "prefix_long": re.compile(r"\bAKID[0-9]{4}"),
+}
+
+
+@pytest.mark.parametrize("seed", range(150))
+def test_rules_file_matches_findall(rule_regexs, seed):
+    rnd = random.Random(seed)
+    data = _corpus(rnd, rnd.randint(0, 3000))
+    matcher = RegexMatcher(rule_regexs)
+    expected = _baseline(rule_regexs, data)
+
+    assert matcher.findall(data) == expected
+    assert matcher.to_binary().findall(data.encode()) == {(k, v.encode() if isinstance(v, str) else tuple(x.encode() for x in v)) for k, v in expected}
+
+
+@pytest.mark.parametrize("seed", range(150))
+def test_synthetic_rules_match_findall(seed):
+    rnd = random.Random(seed)
+    data = ''.join(rnd.choice("abkqxyz-0123 '\"AKID") for _ in range(rnd.randint(0, 600)))
+    assert RegexMatcher(SYNTHETIC).findall(data) == _baseline(SYNTHETIC, data)
+
+
+@pytest.mark.parametrize("seed", range(60))
+def test_scan_stream_matches_findall(rule_regexs, seed):
+    rnd = random.Random(1000 + seed)
+    data = _corpus(rnd, rnd.randint(0, 3000))
+    matcher = RegexMatcher(rule_regexs)
+    expected = _baseline(rule_regexs, data)
+
+    chunk_size = rnd.choice((7, 64, 1024))
+    assert scan_stream(_iter_chunks(data, chunk_size), matcher) == expected
+    assert scan_stream(_iter_chunks(data.encode(), chunk_size), matcher) == expected
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_windowed_fallback_matches_findall(monkeypatch, rule_regexs, seed):
+    # 无锚点规则分窗口扫描时，窗口边界不影响结果
+    monkeypatch.setattr(respbody_filter, "RULE_SCAN_WINDOW", 97)
+    rnd = random.Random(2000 + seed)
+    data = _corpus(rnd, rnd.randint(0, 3000))
+    regexs = dict(rule_regexs, **{k: v for k, v in SYNTHETIC.items() if k.startswith(("digits", "empty", "backref"))})
+    assert RegexMatcher(regexs).findall(data) == _baseline(regexs, data)
@@ -0,0 +1,45 @@
+# -*- encoding: utf-8 -*-
+"""规则时间预算和自动禁用"""
+import re
+
+import respbody_filter
+from respbody_filter import RegexMatcher, RuleProfiler
+
+
+def _profiler(**kwargs) -> RuleProfiler:
+    profiler = RuleProfiler(**kwargs)
+    profiler.sync({"rule": {"reg": re.compile("x")}})
+    return profiler
+
+
+def test_budget_scales_with_body_size():
+    profiler = _profiler(budget=0.5)
+    assert profiler.budget_for(100) == 0.5
+    assert profiler.budget_for(20 * respbody_filter.RULE_BUDGET_BYTES) == 10.0
+    assert _profiler(budget=0).budget_for(100) == 0
+
+
+def test_large_body_overrun_does_not_disable():
+    profiler = _profiler(budget=0.5, max_overruns=1)
+    profiler.record_call(respbody_filter.RULE_DISABLE_MAX_BYTES + 1, {"rule": 9.0}, {}, {"rule"}, 0.0)
+    assert "rule" not in profiler.disabled
+    assert profiler.stats()["rule"]["overruns"] == 0
+
+    profiler.record_call(1024, {"rule": 9.0}, {}, {"rule"}, 0.0)
+    assert "rule" in profiler.disabled
+
+
+def test_consumer_time_is_not_charged(monkeypatch):
+    # 调用方处理命中的耗时不计入规则耗时
+    clock = [0.0]
+    monkeypatch.setattr(respbody_filter.time, "perf_counter", lambda: clock[0])
+    regexs = {"rule": re.compile(r"[a-c]{3}"), "other": re.compile(r"z{2,}")}
+    profiler = RuleProfiler(budget=0.5, max_overruns=1)
+    profiler.sync({k: {"reg": v} for k, v in regexs.items()})
+
+    found = 0
+    for _ in RegexMatcher(regexs, profiler=profiler).iter_matches("abc " * 50):
+        clock[0] += 1.0
+        found += 1
+    assert found == 50
+    assert not profiler.disabled
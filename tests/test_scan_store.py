@@ -0,0 +1,90 @@
+# -*- encoding: utf-8 -*-
+"""状态库bodies表的保留策略"""
+import sqlite3
+import time
+
+import pytest
+
+import scanner
+from scanner import ScanStore
+
+
+@pytest.fixture
+def db_file(tmp_path):
+    return str(tmp_path / scanner.STATE_DB_FILE)
+
+
+def _insert_bodies(db_file: str, bodies):
+    store = ScanStore(db_file)
+    store.open()
+    store.close()
+    conn = sqlite3.connect(db_file)
+    with conn:
+        conn.executemany("INSERT INTO bodies(hash, data, created) VALUES (?, ?, ?)", bodies)
+    conn.close()
+
+
+def _hashes(db_file: str) -> set:
+    conn = sqlite3.connect(db_file)
+    try:
+        return {row[0] for row in conn.execute("SELECT hash FROM bodies")}
+    finally:
+        conn.close()
+
+
+def test_open_prunes_expired_bodies(db_file, monkeypatch):
+    monkeypatch.setattr(scanner, "STATE_BODY_RETENTION", 3600)
+    now = time.time()
+    _insert_bodies(db_file, [("old", b"x", now - 7200), ("new", b"y", now - 60)])
+
+    store = ScanStore(db_file)
+    store.open()
+    store.close()
+    assert _hashes(db_file) == {"new"}
+
+
+def test_open_prunes_oldest_bodies_over_total(db_file, monkeypatch):
+    monkeypatch.setattr(scanner, "STATE_BODY_RETENTION", 0)
+    monkeypatch.setattr(scanner, "STATE_BODY_MAX_TOTAL", 250)
+    now = time.time()
+    _insert_bodies(db_file, [(f"b{i}", b"x" * 100, now - 100 + i) for i in range(5)])
+
+    store = ScanStore(db_file)
+    store.open()
+    store.close()
+    assert _hashes(db_file) == {"b3", "b4"}
+
+
+def test_put_body_skips_large_bodies(db_file, monkeypatch):
+    monkeypatch.setattr(scanner, "STATE_BODY_MAX_BYTES", 10)
+    store = ScanStore(db_file)
+    store.open()
+    store.put_body("small", b"x" * 10)
+    store.put_body("large", b"x" * 11)
+    store.close()
+    assert store.body("small") == b"x" * 10
+    assert store.body("large") is None
+
+
+def test_target_state_is_served_from_memory(db_file, monkeypatch):
+    store = ScanStore(db_file)
+    store.open()
+    store.add_target("http://a")
+    store.add_target("http://b")
+    store.set_status("http://b", "alias")
+    store.close()
+
+    store = ScanStore(db_file)
+    store.open()
+    store.add_target("http://c")
+
+    def connect(*args, **kwargs):
+        raise AssertionError("target_state must not open the database")
+
+    monkeypatch.setattr(sqlite3, "connect", connect)
+    assert store.target_state("http://a")[0] == "pending"
+    assert store.target_state("http://b")[0] == "alias"
+    assert store.target_state("http://c")[0] == "pending"
+    assert store.target_state("http://d") is None
+    monkeypatch.undo()
+    store.close()
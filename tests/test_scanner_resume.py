@@ -0,0 +1,98 @@
+# -*- encoding: utf-8 -*-
+"""stop()后重新start()或重启后，未完成的目标从中断处继续扫描"""
+import collections
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import scanner
+from chui_http import Context, HttpRequest
+
+PATH_COUNT = 3000
+
+
+@pytest.fixture
+def server():
+    requests = collections.Counter()
+    lock = threading.Lock()
+    # 中断前响应放慢，保证stop()时目标还没有扫完
+    delay = [0.05]
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            with lock:
+                requests[self.path] += 1
+            time.sleep(delay[0])
+            self.send_response(404)
+            self.send_header('Content-Length', '2')
+            self.end_headers()
+            self.wfile.write(b'nf')
+
+    class Server(ThreadingHTTPServer):
+        # 异步引擎并发较高，默认的监听队列会导致连接超时
+        request_queue_size = 1024
+
+    srv = Server(('127.0.0.1', 0), Handler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield srv, requests, delay
+    srv.shutdown()
+    srv.server_close()
+
+
+@pytest.fixture
+def dict_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(scanner, "STATE_ENABLED", True)
+    logging.getLogger('URLScanner').setLevel(logging.WARNING)
+    file = tmp_path / "DIR.txt"
+    file.write_text("\n".join(f"p{i}" for i in range(PATH_COUNT)), encoding="utf-8")
+    return str(file)
+
+
+def _wait_idle(manager, timeout: float = 60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        time.sleep(0.2)
+        if not manager.running_scanners and manager.target_queue.empty():
+            return
+    raise AssertionError("scan did not finish")
+
+
+def _scanned(requests) -> list:
+    return [path for path in requests if path.startswith('/p')]
+
+
+@pytest.mark.parametrize("engine", ["thread", "async"])
+@pytest.mark.parametrize("restart", [False, True])
+def test_resume_after_stop(server, dict_file, engine, restart):
+    srv, requests, delay = server
+    context = Context({'scheme': 'http', 'host': '127.0.0.1', 'port': srv.server_port})
+
+    manager = scanner.ScannerManager(dict_file, engine=engine)
+    assert manager.start()
+    manager.add_target(context, HttpRequest({'path': '/'}))
+    deadline = time.time() + 30
+    while len(_scanned(requests)) < 50 and time.time() < deadline:
+        time.sleep(0.05)
+    manager.stop()
+    interrupted = len(_scanned(requests))
+    assert 0 < interrupted < PATH_COUNT
+
+    delay[0] = 0.001
+    if restart:
+        # 模拟重启: 新的管理器从状态库恢复
+        manager = scanner.ScannerManager(dict_file, engine=engine)
+    assert manager.start()
+    _wait_idle(manager)
+    manager.stop()
+
+    paths = _scanned(requests)
+    assert len(paths) == PATH_COUNT
+    assert [path for path in paths if requests[path] > 1] == []
@@ -0,0 +1,91 @@
+# -*- encoding: utf-8 -*-
+"""编译字典缓存的加载和损坏处理"""
+import os
+
+import pytest
+
+import scanner
+from scanner import ScannerManager, Wordlist
+
+PATHS = ["/admin", "/login.php", "/api/v1/users", "/静态/文件", "/.git/config"]
+
+
+@pytest.fixture
+def dict_file(tmp_path):
+    file = tmp_path / "dict.txt"
+    file.write_text("\n".join(PATHS) + "\n", encoding="utf-8")
+    return str(file)
+
+
+def _save(dict_file: str) -> str:
+    cache_file = dict_file + scanner.WORDLIST_CACHE_SUFFIX
+    Wordlist.from_paths(PATHS).save(cache_file, dict_file)
+    return cache_file
+
+
+def test_load_round_trip(dict_file):
+    cache_file = _save(dict_file)
+    wordlist = Wordlist.load(cache_file, dict_file)
+    assert list(wordlist) == PATHS
+    assert wordlist.fingerprint() == Wordlist.from_paths(PATHS).fingerprint()
+
+
+def test_load_stale_cache(dict_file):
+    cache_file = _save(dict_file)
+    with open(dict_file, "a", encoding="utf-8") as f:
+        f.write("/new\n")
+    assert Wordlist.load(cache_file, dict_file) is None
+
+
+def test_load_missing_or_empty(dict_file, tmp_path):
+    assert Wordlist.load(str(tmp_path / "missing.wordlist")) is None
+    empty = tmp_path / "empty.wordlist"
+    empty.write_bytes(b"")
+    assert Wordlist.load(str(empty)) is None
+
+
+def test_load_truncated(dict_file):
+    cache_file = _save(dict_file)
+    with open(cache_file, "rb") as f:
+        content = f.read()
+    # 截断到任意位置都应返回None，不能抛异常
+    for length in range(len(content)):
+        with open(cache_file, "wb") as f:
+            f.write(content[:length])
+        assert Wordlist.load(cache_file) is None, length
+
+
+def test_load_corrupt_header(dict_file):
+    cache_file = _save(dict_file)
+    with open(cache_file, "rb") as f:
+        content = bytearray(f.read())
+    header = scanner._WORDLIST_HEADER
+    magic, mtime, size, count, typecode, data_len = header.unpack_from(content, 0)
+    corrupt = [
+        (b"XXXX\x01", mtime, size, count, typecode, data_len),
+        (magic, mtime, size, count + 1, typecode, data_len),
+        (magic, mtime, size, 2 ** 62, typecode, data_len),
+        (magic, mtime, size, count, b"?", data_len),
+        (magic, mtime, size, count, b"\xff", data_len),
+        (magic, mtime, size, count, typecode, data_len + 1),
+    ]
+    for fields in corrupt:
+        content[:header.size] = header.pack(*fields)
+        with open(cache_file, "wb") as f:
+            f.write(content)
+        assert Wordlist.load(cache_file) is None, fields
+
+
+def test_corrupt_cache_is_rebuilt(dict_file):
+    cache_file = _save(dict_file)
+    with open(cache_file, "r+b") as f:
+        f.truncate(os.path.getsize(cache_file) - 3)
+
+    manager = ScannerManager(dict_file)
+    assert manager._load_dict()
+    with open(dict_file, encoding="utf-8") as f:
+        expected = list(manager._iter_dict(f))
+    assert len(expected) == len(PATHS)
+    assert list(manager.unique_paths) == expected
+    # 缓存已经按源文件重新生成
+    assert list(Wordlist.load(cache_file, dict_file)) == expected
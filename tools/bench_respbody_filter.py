@@ -0,0 +1,326 @@
+# -*- encoding: utf-8 -*-
+"""
+respbody_filter 吞吐基准测试
+
+离线生成压缩后的JS语料(100KB~50MB)，在已知位置埋入密钥，并构造对抗性输入，
+分别测试`extract_kv_with_regex`和`on_response`，输出MB/s、单个body耗时分位数和峰值内存
+
+    python tools/bench_respbody_filter.py
+    python tools/bench_respbody_filter.py --sizes 100K,1M,10M,50M --output bench.json
+    python tools/bench_respbody_filter.py --output new.json --compare bench.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import string
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+TOOLS_DIR = Path(__file__).resolve().parent
+PLUGIN_DIR = TOOLS_DIR.parent / "plugin"
+
+
+def _setup_path():
+    """优先使用真实的chui_http，没有安装时使用本地替身"""
+    sys.path.insert(0, str(PLUGIN_DIR))
+    try:
+        import chui_http
+    except ImportError:
+        sys.path.insert(0, str(TOOLS_DIR / "stub"))
+
+
+_ALNUM = string.ascii_letters + string.digits
+_UPPER_DIGITS = string.ascii_uppercase + string.digits
+_LOWER_DIGITS = string.ascii_lowercase + string.digits
+
+
+def _rand(rnd: random.Random, chars: str, n: int) -> str:
+    return ''.join(rnd.choice(chars) for _ in range(n))
+
+
+# 埋入的密钥 (规则key, 生成函数)，生成函数返回 (写入body的文本, 期望提取到的值)
+def _planted_generators():
+    def plain(key, prefix, chars, n):
+        def gen(rnd):
+            value = prefix + _rand(rnd, chars, n)
+            return f'"{value}"', (key, value)
+        return gen
+
+    def url(key, prefix, chars, n, suffix=""):
+        def gen(rnd):
+            value = _rand(rnd, chars, n)
+            return f'"{prefix}{value}{suffix}"', (key, value)
+        return gen
+
+    def cos(rnd):
+        value = _rand(rnd, string.digits, 10)
+        return f'"https://bucket-{value}.cos.ap-guangzhou.myqcloud.com/a.png"', ("qcloud_app_id", value)
+
+    return [
+        plain("qcloud_ak_id", "AKID", _ALNUM, 32),
+        plain("qcloud_api_gateway_appkey", "APID", _ALNUM, 36),
+        plain("aliyun_ak_id", "LTAI", _ALNUM, 20),
+        plain("jdcloud_ak_id", "JDC_", _UPPER_DIGITS, 30),
+        plain("gcp_ak_id", "AIza", _ALNUM, 35),
+        plain("wechat_appid", "wx", _LOWER_DIGITS, 16),
+        plain("wechat_id", "gh_", _LOWER_DIGITS, 12),
+        url("url_dingtalk", "https://oapi.dingtalk.com/robot/send?access_token=", _LOWER_DIGITS, 64),
+        url("url_feishu", "https://open.feishu.cn/open-apis/bot/v2/hook/", _LOWER_DIGITS, 36),
+        cos,
+    ]
+
+
+def _js_fragment(rnd: random.Random) -> str:
+    """一段压缩后风格的JS"""
+    name = _rand(rnd, string.ascii_letters, rnd.randint(1, 3))
+    kind = rnd.randint(0, 5)
+    if kind == 0:
+        return f'function {name}(e,t){{return e.{_rand(rnd, string.ascii_lowercase, 5)}(t,"{_rand(rnd, _ALNUM, rnd.randint(3, 24))}")}}'
+    if kind == 1:
+        return f'var {name}={rnd.randint(0, 1 << 30)},{name}_={{a:"{_rand(rnd, string.ascii_lowercase, 8)}",b:!0}};'
+    if kind == 2:
+        return f'{name}.prototype.{_rand(rnd, string.ascii_lowercase, 6)}=function(){{this.x&&this.x.call(this,"{_rand(rnd, _ALNUM, 12)}")}};'
+    if kind == 3:
+        return f'"https://cdn.{_rand(rnd, string.ascii_lowercase, 6)}.com/static/js/{_rand(rnd, _LOWER_DIGITS, 8)}.chunk.js",'
+    if kind == 4:
+        return f'case {rnd.randint(0, 999)}:return n.{_rand(rnd, string.ascii_lowercase, 4)}?"{_rand(rnd, string.ascii_letters, 10)}":void 0;'
+    return f'{name}=[{",".join(str(rnd.randint(0, 9999)) for _ in range(rnd.randint(2, 12)))}];'
+
+
+def make_bundle(size: int, seed: int = 1, planted: int = 20):
+    """
+    生成指定大小的JS语料，在均匀分布的位置埋入密钥
+    :return: (body, {(规则key, 值)})
+    """
+    rnd = random.Random(seed)
+    generators = _planted_generators()
+
+    # 先生成一段基础语料再重复，保证大语料也能快速生成
+    base_parts = []
+    base_size = 0
+    while base_size < min(size, 1024 * 1024):
+        part = _js_fragment(rnd)
+        base_parts.append(part)
+        base_size += len(part)
+    base = ''.join(base_parts)
+
+    body = (base * (size // len(base) + 1))[:size]
+    expected = set()
+    step = max(size // (planted + 1), 1)
+    pieces = []
+    last = 0
+    for i in range(1, planted + 1):
+        pos = i * step
+        # 对齐到片段边界(分号)，避免把密钥插进标识符内部
+        boundary = body.find(';', pos, pos + 4096)
+        if boundary < 0:
+            continue
+        text, kv = generators[(i - 1) % len(generators)](rnd)
+        pieces.append(body[last:boundary + 1])
+        pieces.append(f'var s{i}={text};')
+        last = boundary + 1
+        expected.add(kv)
+    pieces.append(body[last:])
+    return ''.join(pieces), expected
+
+
+def make_adversarial(name: str, size: int, seed: int = 1) -> str:
+    """对抗性输入"""
+    rnd = random.Random(seed)
+    if name == "anchor_flood":
+        # 大量锚点但都不构成完整密钥
+        return ''.join(rnd.choice(["AKID", "LTAI", "AKLT", "JDC_", "wx", "gh_", "APID"]) + _rand(rnd, _ALNUM, rnd.randint(0, 8)) + ' '
+                       for _ in range(size // 8))[:size]
+    if name == "near_miss":
+        # 长度差一位的密钥
+        return ''.join(f'"AKID{_rand(rnd, _ALNUM, 12)}","LTAI{_rand(rnd, _ALNUM, 11)}",' for _ in range(size // 40))[:size]
+    if name == "long_tokens":
+        # 超长的字母数字串，内部包含锚点，`\b`无法成立
+        token = _rand(rnd, _ALNUM, 64 * 1024)
+        token = token[:1000] + "AKID" + token[1000:30000] + "LTAI" + token[30000:]
+        return (token + " ") * (size // len(token) + 1)
+    if name == "digit_runs":
+        # 长数字串后跟`.cos.`但没有myqcloud域名，考验无锚点规则的回溯
+        return ''.join(f'a-{_rand(rnd, string.digits, 200)}.cos.{_rand(rnd, string.ascii_lowercase, 200)} ' for _ in range(size // 410))[:size]
+    if name == "url_flood":
+        return ''.join(f'"https://oapi.dingtalk.com/robot/send?access_token={_rand(rnd, _LOWER_DIGITS, 10)}",' for _ in range(size // 72))[:size]
+    raise ValueError(f"Unknown adversarial case: {name}")
+
+
+ADVERSARIAL_CASES = ["anchor_flood", "near_miss", "long_tokens", "digit_runs", "url_flood"]
+
+
+def _percentile(values: list, q: float) -> float:
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(int(q * (len(values) - 1) + 0.5), len(values) - 1)]
+
+
+def _peak_rss_kb() -> int:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS单位为字节，Linux为KB
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+def run_case(case: str, size: int, repeat: int, seed: int) -> dict:
+    """在当前进程执行一个用例"""
+    _setup_path()
+    import logging
+    logging.disable(logging.INFO)
+
+    import respbody_filter as rf
+    from chui_http import Context, HttpResponse
+
+    rf.RULES_WATCH_INTERVAL = 0
+    rf.initialize(lambda data: None)
+    # 测试扫描本身，关闭跨flow去重
+    rf.FINDING_INDEX = None
+
+    if case == "bundle":
+        body, expected = make_bundle(size, seed)
+    else:
+        body, expected = make_adversarial(case, size, seed), set()
+    rss_corpus = _peak_rss_kb()
+
+    extract_latency = []
+    found = set()
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        found = rf.extract_kv_with_regex(body)
+        extract_latency.append(time.perf_counter() - begin)
+
+    context = Context({"id": "1", "url": "https://bench.local/static/js/main.js", "scheme": "https", "host": "bench.local", "port": 443})
+    response = HttpResponse({
+        "code": "200",
+        "headers": ["Content-Type: application/javascript"],
+        "body": {"type": 1, "payload": body},
+    })
+    response_latency = []
+    for _ in range(repeat):
+        rf.RESULT_CACHE.clear()
+        begin = time.perf_counter()
+        rf.on_response(context, response)
+        response_latency.append(time.perf_counter() - begin)
+
+    # 缓存命中
+    begin = time.perf_counter()
+    rf.on_response(context, response)
+    cache_hit = time.perf_counter() - begin
+
+    median = _percentile(extract_latency, 0.5)
+    return {
+        "case": case,
+        "size": len(body),
+        "repeat": repeat,
+        "mb_s": len(body) / median / 1024 / 1024 if median > 0 else 0.0,
+        "extract_p50_ms": median * 1000,
+        "extract_p90_ms": _percentile(extract_latency, 0.9) * 1000,
+        "extract_p99_ms": _percentile(extract_latency, 0.99) * 1000,
+        "on_response_p50_ms": _percentile(response_latency, 0.5) * 1000,
+        "on_response_p99_ms": _percentile(response_latency, 0.99) * 1000,
+        "cache_hit_ms": cache_hit * 1000,
+        "findings": len(found),
+        "planted": len(expected),
+        "planted_found": len(expected & found),
+        "corpus_rss_kb": rss_corpus,
+        "peak_rss_kb": _peak_rss_kb(),
+    }
+
+
+def _parse_size(text: str) -> int:
+    text = text.strip().upper()
+    units = {"K": 1024, "M": 1024 * 1024, "G": 1024 * 1024 * 1024}
+    if text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+def _repeat_for(size: int, repeat: int) -> int:
+    """小语料多跑几次，保证分位数有意义"""
+    if repeat > 0:
+        return repeat
+    return max(3, min(50, (20 * 1024 * 1024) // max(size, 1)))
+
+
+def compare(results: list, baseline_file: str):
+    """与上一次的结果对比吞吐"""
+    with open(baseline_file, 'r', encoding='utf8') as f:
+        baseline = {(r["case"], r["size"]): r for r in json.load(f)["results"]}
+
+    print(f"{'case':<14}{'size':>12}{'base MB/s':>12}{'MB/s':>10}{'ratio':>8}{'base p99':>12}{'p99':>10}")
+    for r in results:
+        old = baseline.get((r["case"], r["size"]))
+        if old is None:
+            continue
+        ratio = r["mb_s"] / old["mb_s"] if old["mb_s"] > 0 else 0.0
+        print(f"{r['case']:<14}{r['size']:>12}{old['mb_s']:>12.1f}{r['mb_s']:>10.1f}{ratio:>8.2f}"
+              f"{old['extract_p99_ms']:>12.1f}{r['extract_p99_ms']:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="respbody_filter throughput benchmark")
+    parser.add_argument("--sizes", default="100K,1M,10M,50M", help="JS语料大小，逗号分隔")
+    parser.add_argument("--adversarial-size", default="1M", help="对抗性输入大小")
+    parser.add_argument("--no-adversarial", action="store_true", help="不测试对抗性输入")
+    parser.add_argument("--repeat", type=int, default=0, help="每个用例的执行次数，0表示按大小自动选择")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--no-isolate", action="store_true", help="所有用例在同一进程执行(峰值内存不再独立)")
+    parser.add_argument("--output", help="结果写入json文件")
+    parser.add_argument("--compare", help="与之前输出的json结果对比")
+    args = parser.parse_args()
+
+    cases = [("bundle", _parse_size(s)) for s in args.sizes.split(",") if s.strip()]
+    if not args.no_adversarial:
+        adversarial_size = _parse_size(args.adversarial_size)
+        cases += [(name, adversarial_size) for name in ADVERSARIAL_CASES]
+
+    results = []
+    for case, size in cases:
+        repeat = _repeat_for(size, args.repeat)
+        if args.no_isolate:
+            result = run_case(case, size, repeat, args.seed)
+        else:
+            # 每个用例单独一个进程，峰值内存互不影响
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+                result = pool.submit(run_case, case, size, repeat, args.seed).result()
+        results.append(result)
+        print(f"[{result['case']:<12}] size: {result['size']}"
+              f", rate: {result['mb_s']:.1f}MB/s"
+              f", p50: {result['extract_p50_ms']:.1f}ms"
+              f", p99: {result['extract_p99_ms']:.1f}ms"
+              f", on_response p50: {result['on_response_p50_ms']:.1f}ms"
+              f", cache hit: {result['cache_hit_ms']:.3f}ms"
+              f", planted: {result['planted_found']}/{result['planted']}"
+              f", peak rss: {result['peak_rss_kb'] / 1024:.1f}MB", flush=True)
+
+    output = {
+        "meta": {
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf8') as f:
+            json.dump(output, f, indent=2)
+
+    if args.compare:
+        compare(results, args.compare)
+
+    # 埋入的密钥没有全部找到时返回非0，可用于CI
+    missed = sum(r["planted"] - r["planted_found"] for r in results)
+    return 1 if missed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,470 @@
+# -*- encoding: utf-8 -*-
+"""
+scanner 负载基准测试
+
+在本机启动HTTP/HTTPS替身服务(可配置延迟、错误率、断连率、泛解析200、keep-alive、body大小)，
+用ScannerManager扫描N个目标、M条路径的字典，输出请求速率、延迟分位数、峰值内存和峰值线程数
+替身服务与扫描器分别运行在独立进程中，扫描进程的内存、线程统计不受服务端影响，完全离线
+
+    python tools/bench_scanner.py
+    python tools/bench_scanner.py --targets 8 --paths 20000 --latency 20 --jitter 10 --engines thread,async
+    python tools/bench_scanner.py --https --wildcard --error-rate 0.05 --output bench.json
+    python tools/bench_scanner.py --output new.json --compare bench.json --tolerance 0.2
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import shutil
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+TOOLS_DIR = Path(__file__).resolve().parent
+PLUGIN_DIR = TOOLS_DIR.parent / "plugin"
+
+# 字典中的路径为 PATH_PREFIX + 序号，序号能被hit_every整除的路径存在
+PATH_PREFIX = "bench"
+
+
+def _setup_path():
+    """优先使用真实的chui_http，没有安装时使用本地替身"""
+    sys.path.insert(0, str(PLUGIN_DIR))
+    try:
+        import chui_http
+    except ImportError:
+        sys.path.insert(0, str(TOOLS_DIR / "stub"))
+
+
+def _filler(rnd: random.Random, size: int) -> bytes:
+    """填充body的文本，不同种子的内容互不相似"""
+    words = []
+    length = 0
+    while length < size:
+        word = ''.join(rnd.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rnd.randint(3, 9)))
+        words.append(word)
+        length += len(word) + 1
+    return ' '.join(words).encode()[:size]
+
+
+class StandInServer:
+    """
+    替身服务，同一个事件循环监听所有目标端口
+    路径规则:
+        /                       200 首页
+        /bench<n>, n % hit_every == 0   200 内容各不相同
+        其他路径                 404，wildcard时返回200和只有路径不同的页面(软404)
+    错误和断连只作用于不存在的路径，扫描结果的期望值保持确定
+    """
+    def __init__(self, config: dict):
+        self.config = config
+        # 错误、延迟的随机数每个服务进程不同，页面内容所有进程一致
+        self.rnd = random.Random(config["seed"] * 1000 + config["worker"])
+        self.requests = 0
+        self.connections = 0
+        self.errors = 0
+        self.resets = 0
+        self._miss_filler = _filler(random.Random(f"miss-{config['seed']}"), config["body_size"])
+        self._hit_bodies = {}
+
+    def _hit_body(self, n: int) -> bytes:
+        body = self._hit_bodies.get(n)
+        if body is None:
+            head = f"<html><title>page {n}</title>".encode()
+            body = head + _filler(random.Random(f"hit-{n}"), max(self.config["body_size"] - len(head), 0))
+            self._hit_bodies[n] = body
+        return body
+
+    def _route(self, path: str):
+        """:return: (状态码, body)，状态码为None表示断开连接"""
+        path = path.split('?', 1)[0]
+        if path == "/":
+            return 200, b"<html><title>index</title></html>"
+        name = path[1:]
+        if name.startswith(PATH_PREFIX) and name[len(PATH_PREFIX):].isdigit():
+            n = int(name[len(PATH_PREFIX):])
+            if n % self.config["hit_every"] == 0:
+                return 200, self._hit_body(n)
+        if self.config["reset_rate"] and self.rnd.random() < self.config["reset_rate"]:
+            self.resets += 1
+            return None, b""
+        if self.config["error_rate"] and self.rnd.random() < self.config["error_rate"]:
+            self.errors += 1
+            return 500, b"internal error"
+        body = b"<html><title>not found</title>" + path.encode() + b"<br>" + self._miss_filler
+        return (200 if self.config["wildcard"] else 404), body
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    return
+                lines = head.decode('latin-1').split("\r\n")
+                try:
+                    method, path, version = lines[0].split(" ", 2)
+                except ValueError:
+                    return
+                headers = {}
+                for line in lines[1:]:
+                    if ":" in line:
+                        key, value = line.split(":", 1)
+                        headers[key.strip().lower()] = value.strip()
+                length = int(headers.get("content-length") or 0)
+                if length:
+                    await reader.readexactly(length)
+                self.requests += 1
+
+                delay = self.config["latency"] + (self.rnd.uniform(0, self.config["jitter"]) if self.config["jitter"] else 0)
+                if delay > 0:
+                    await asyncio.sleep(delay / 1000)
+
+                code, body = self._route(path)
+                if code is None:
+                    return
+                keep_alive = (self.config["keepalive"] and version == "HTTP/1.1"
+                              and headers.get("connection", "").lower() != "close")
+                reason = {200: "OK", 404: "Not Found", 500: "Internal Server Error"}[code]
+                writer.write((f"HTTP/1.1 {code} {reason}\r\n"
+                              f"Content-Type: text/html\r\n"
+                              f"Content-Length: {len(body)}\r\n"
+                              f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n").encode())
+                if method != "HEAD":
+                    writer.write(body)
+                await writer.drain()
+                if not keep_alive:
+                    return
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, ports: list, ready, stop_conn):
+        ssl_ctx = None
+        if self.config["certfile"]:
+            ssl_ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            ssl_ctx.load_cert_chain(self.config["certfile"], self.config["keyfile"])
+        servers = []
+        for port in ports:
+            server = await asyncio.start_server(self._handle, "127.0.0.1", port, ssl=ssl_ctx,
+                                                reuse_port=True, backlog=4096, limit=64 * 1024)
+            servers.append(server)
+        ready.send([s.sockets[0].getsockname()[1] for s in servers])
+        # 等待主进程的停止信号
+        await asyncio.get_running_loop().run_in_executor(None, stop_conn.recv)
+        for server in servers:
+            server.close()
+        ready.send({"requests": self.requests, "connections": self.connections, "errors": self.errors, "resets": self.resets})
+
+
+def _serve(config: dict, ports: list, ready, stop_conn):
+    """替身服务进程入口"""
+    asyncio.run(StandInServer(config).serve(ports, ready, stop_conn))
+
+
+class StandInCluster:
+    """
+    多个替身服务进程通过SO_REUSEPORT共享端口，避免服务端成为瓶颈
+    第一个进程随机分配端口，其余进程绑定相同的端口
+    """
+    def __init__(self, config: dict, targets: int, processes: int = 1):
+        self.config = config
+        self.targets = targets
+        self.processes = max(processes, 1)
+        self.ports = []
+        self._workers = []
+
+    def start(self) -> list:
+        ctx = multiprocessing.get_context("spawn")
+        ports = [0] * self.targets
+        for i in range(self.processes):
+            parent_ready, child_ready = ctx.Pipe()
+            parent_stop, child_stop = ctx.Pipe()
+            config = dict(self.config, worker=i)
+            process = ctx.Process(target=_serve, args=(config, ports, child_ready, child_stop), daemon=True)
+            process.start()
+            ports = parent_ready.recv()
+            self._workers.append((process, parent_ready, parent_stop))
+        self.ports = ports
+        return ports
+
+    def stop(self) -> dict:
+        stats = {"requests": 0, "connections": 0, "errors": 0, "resets": 0}
+        for process, ready, stop in self._workers:
+            stop.send(None)
+        for process, ready, stop in self._workers:
+            if ready.poll(10):
+                for key, value in ready.recv().items():
+                    stats[key] += value
+            process.join(5)
+            if process.is_alive():
+                process.terminate()
+        self._workers.clear()
+        return stats
+
+
+def make_certificate(directory: str) -> tuple:
+    """用openssl生成自签名证书，返回(证书, 私钥)"""
+    openssl = shutil.which("openssl")
+    if openssl is None:
+        raise RuntimeError("openssl not found, pass --certfile/--keyfile instead")
+    certfile = os.path.join(directory, "cert.pem")
+    keyfile = os.path.join(directory, "key.pem")
+    subprocess.run([openssl, "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+                    "-keyout", keyfile, "-out", certfile, "-subj", "/CN=127.0.0.1",
+                    "-addext", "subjectAltName=IP:127.0.0.1,DNS:localhost"],
+                   check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return certfile, keyfile
+
+
+def _peak_rss_kb() -> int:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS单位为字节，Linux为KB
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+def _thread_count() -> int:
+    """进程的系统线程数，包含非threading创建的线程"""
+    try:
+        with open("/proc/self/status", 'r') as f:
+            for line in f:
+                if line.startswith("Threads:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return threading.active_count()
+
+
+class _Sampler(threading.Thread):
+    """定时采样线程数"""
+    def __init__(self, interval: float = 0.1):
+        super().__init__(name="BenchSampler", daemon=True)
+        self.interval = interval
+        self.peak_threads = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self.peak_threads = max(self.peak_threads, _thread_count())
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        self.peak_threads = max(self.peak_threads, _thread_count())
+
+
+def run_case(engine: str, scheme: str, ports: list, paths: int, hit_every: int, certfile: str|None,
+             probe_mode: str, state: bool, timeout: float) -> dict:
+    """在当前进程扫描所有目标"""
+    if certfile:
+        # urllib与异步引擎都使用默认证书库，信任替身服务的自签名证书
+        os.environ["SSL_CERT_FILE"] = certfile
+    _setup_path()
+    import logging
+    # 注入的错误会产生大量请求失败日志
+    logging.disable(logging.WARNING)
+
+    import scanner
+    from chui_http import Context, HttpRequest
+
+    scanner.STATE_ENABLED = state
+    scanner.RANKING_ENABLED = False
+    rss_base = _peak_rss_kb()
+
+    work_dir = tempfile.mkdtemp(prefix="bench-scanner-")
+    dict_file = os.path.join(work_dir, "DIR.txt")
+    with open(dict_file, 'w', encoding='utf8') as f:
+        f.write("\n".join(f"{PATH_PREFIX}{i}" for i in range(paths)))
+
+    found = set()
+    lock = threading.Lock()
+
+    def on_data(rows):
+        with lock:
+            found.update(row["data"][0] for row in rows)
+
+    sampler = _Sampler()
+    sampler.start()
+    manager = scanner.ScannerManager(dict_file, on_data_handler=on_data, engine=engine, probe_mode=probe_mode)
+    begin = time.perf_counter()
+    try:
+        if not manager.start():
+            raise RuntimeError("scanner manager start failed")
+        for port in ports:
+            manager.add_target(Context({"scheme": scheme, "host": "127.0.0.1", "port": port}), HttpRequest({}))
+        deadline = time.monotonic() + timeout
+        while manager.running_scanners or manager.target_queue.unfinished_tasks:
+            if time.monotonic() > deadline:
+                break
+            time.sleep(0.05)
+        elapsed = time.perf_counter() - begin
+        timed_out = bool(manager.running_scanners or manager.target_queue.unfinished_tasks)
+    finally:
+        # 停止时会投递剩余结果
+        manager.stop()
+        sampler.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    metrics = scanner.metrics_snapshot() or {}
+
+    def total(name):
+        return sum(v["value"] for v in metrics.get(name, {}).get("values", []))
+
+    latency = (metrics.get("scanner_request_seconds", {}).get("values") or [{"value": {}}])[0]["value"]
+    requests = total("scanner_requests_total")
+    expected = {f"{scheme}://127.0.0.1:{port}/{PATH_PREFIX}{i}" for port in ports for i in range(0, paths, hit_every)}
+    return {
+        "engine": engine,
+        "scheme": scheme,
+        "targets": len(ports),
+        "paths": paths,
+        "elapsed_s": elapsed,
+        "timed_out": timed_out,
+        "requests": requests,
+        "rps": requests / elapsed if elapsed > 0 else 0.0,
+        "errors": total("scanner_errors_total"),
+        # 直方图分桶插值得到的近似值
+        "latency_p50_ms": (latency.get("p50") or 0) * 1000,
+        "latency_p95_ms": (latency.get("p95") or 0) * 1000,
+        "latency_p99_ms": (latency.get("p99") or 0) * 1000,
+        "expected_hits": len(expected),
+        "found_hits": len(expected & found),
+        "unexpected_hits": len(found - expected),
+        "base_rss_kb": rss_base,
+        "peak_rss_kb": _peak_rss_kb(),
+        "peak_threads": sampler.peak_threads,
+    }
+
+
+def compare(results: list, baseline_file: str, tolerance: float) -> bool:
+    """与上一次的结果对比请求速率，返回是否有用例低于容差"""
+    with open(baseline_file, 'r', encoding='utf8') as f:
+        baseline = {(r["engine"], r["scheme"], r["targets"], r["paths"]): r for r in json.load(f)["results"]}
+
+    regressed = False
+    print(f"{'engine':<8}{'base rps':>12}{'rps':>10}{'ratio':>8}{'base p99':>10}{'p99':>8}{'base rss':>10}{'rss':>8}")
+    for r in results:
+        old = baseline.get((r["engine"], r["scheme"], r["targets"], r["paths"]))
+        if old is None:
+            continue
+        ratio = r["rps"] / old["rps"] if old["rps"] > 0 else 0.0
+        if ratio < 1 - tolerance:
+            regressed = True
+        print(f"{r['engine']:<8}{old['rps']:>12.0f}{r['rps']:>10.0f}{ratio:>8.2f}"
+              f"{old['latency_p99_ms']:>10.1f}{r['latency_p99_ms']:>8.1f}"
+              f"{old['peak_rss_kb'] / 1024:>10.1f}{r['peak_rss_kb'] / 1024:>8.1f}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="scanner load benchmark against a local stand-in server")
+    parser.add_argument("--targets", type=int, default=4, help="目标数，每个目标一个端口")
+    parser.add_argument("--paths", type=int, default=5000, help="字典路径数")
+    parser.add_argument("--hit-every", type=int, default=50, help="每隔多少条路径存在一个")
+    parser.add_argument("--engines", default="thread,async", help="扫描引擎，逗号分隔")
+    parser.add_argument("--probe-mode", default="get", help="探测模式: get/head/range")
+    parser.add_argument("--latency", type=float, default=5, help="服务端固定延迟(ms)")
+    parser.add_argument("--jitter", type=float, default=0, help="服务端随机附加延迟上限(ms)")
+    parser.add_argument("--error-rate", type=float, default=0, help="不存在的路径返回500的比例")
+    parser.add_argument("--reset-rate", type=float, default=0, help="不存在的路径直接断开连接的比例")
+    parser.add_argument("--wildcard", action="store_true", help="不存在的路径返回200软404页面")
+    parser.add_argument("--no-keepalive", action="store_true", help="每个响应后关闭连接")
+    parser.add_argument("--body-size", type=int, default=1024, help="响应body大小(字节)")
+    parser.add_argument("--https", action="store_true", help="使用HTTPS，默认用openssl生成自签名证书")
+    parser.add_argument("--certfile", help="HTTPS证书")
+    parser.add_argument("--keyfile", help="HTTPS私钥")
+    parser.add_argument("--server-procs", type=int, default=1, help="替身服务进程数")
+    parser.add_argument("--state", action="store_true", help="开启扫描状态库")
+    parser.add_argument("--timeout", type=float, default=600, help="单个引擎的最长扫描时间(秒)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="结果写入json文件")
+    parser.add_argument("--compare", help="与之前输出的json结果对比")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="对比时允许的请求速率下降比例")
+    args = parser.parse_args()
+
+    cert_dir = None
+    certfile, keyfile = args.certfile, args.keyfile
+    if args.https and not certfile:
+        cert_dir = tempfile.mkdtemp(prefix="bench-cert-")
+        certfile, keyfile = make_certificate(cert_dir)
+    scheme = "https" if args.https else "http"
+
+    config = {
+        "seed": args.seed,
+        "hit_every": max(args.hit_every, 1),
+        "latency": args.latency,
+        "jitter": args.jitter,
+        "error_rate": args.error_rate,
+        "reset_rate": args.reset_rate,
+        "wildcard": args.wildcard,
+        "keepalive": not args.no_keepalive,
+        "body_size": args.body_size,
+        "certfile": certfile if args.https else None,
+        "keyfile": keyfile if args.https else None,
+    }
+
+    results = []
+    try:
+        for engine in [e.strip() for e in args.engines.split(",") if e.strip()]:
+            # 每个引擎使用新的服务进程和扫描进程，连接数、内存互不影响
+            cluster = StandInCluster(config, args.targets, args.server_procs)
+            ports = cluster.start()
+            try:
+                with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+                    result = pool.submit(run_case, engine, scheme, ports, args.paths, config["hit_every"],
+                                         config["certfile"], args.probe_mode, args.state, args.timeout).result()
+            finally:
+                result_server = cluster.stop()
+            result["server"] = result_server
+            results.append(result)
+            print(f"[{result['engine']:<6}] targets: {result['targets']}, paths: {result['paths']}"
+                  f", time: {result['elapsed_s']:.2f}s{' (timeout)' if result['timed_out'] else ''}"
+                  f", rate: {result['rps']:.0f}req/s"
+                  f", p50: {result['latency_p50_ms']:.1f}ms"
+                  f", p95: {result['latency_p95_ms']:.1f}ms"
+                  f", p99: {result['latency_p99_ms']:.1f}ms"
+                  f", errors: {result['errors']}"
+                  f", hits: {result['found_hits']}/{result['expected_hits']}"
+                  f", connections: {result_server['connections']}"
+                  f", peak rss: {result['peak_rss_kb'] / 1024:.1f}MB"
+                  f", peak threads: {result['peak_threads']}", flush=True)
+    finally:
+        if cert_dir is not None:
+            shutil.rmtree(cert_dir, ignore_errors=True)
+
+    output = {
+        "meta": {
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "config": dict(config, targets=args.targets, paths=args.paths, probe_mode=args.probe_mode,
+                           server_procs=args.server_procs, state=args.state),
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf8') as f:
+            json.dump(output, f, indent=2)
+
+    regressed = compare(results, args.compare, args.tolerance) if args.compare else False
+
+    # 漏报、误报、超时或速率下降超过容差时返回非0，可用于CI
+    failed = any(r["timed_out"] or r["found_hits"] != r["expected_hits"] or r["unexpected_hits"] for r in results)
+    return 1 if failed or regressed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,484 @@
+# -*- encoding: utf-8 -*-
+"""
+离线流量回放
+
+把录制的流量(HAR文件，或插件`__main__`示例使用的json流格式，每行一个)流式送入任意插件的
+`initialize`/`start`/`on_request`/`on_response`，输出吞吐和结果，用于在历史流量上验证新规则
+文件逐条解析，内存占用只与单条流量大小有关；--workers 大于0时按进程池并行回放
+
+json流格式(.jsonl，每行一个):
+    {"context": {...}, "request": {...}, "response": {...}}   request/response可以只有一个
+
+    python tools/replay_traffic.py respbody_filter capture.har
+    python tools/replay_traffic.py respbody_filter flows/*.jsonl.gz --workers 4 --output findings.jsonl
+    python tools/replay_traffic.py plugin/respbody_filter.py capture.har --set RULES_WATCH_INTERVAL=0 --set WORKER_MODE=false
+
+注意: 插件按description()声明的request/response接收数据，scanner等会主动发起网络请求的插件回放时同样会发起请求
+进程池模式下每个工作进程各自加载插件，插件内的跨流量去重、缓存只在单个进程内生效，结果数可能多于单进程回放
+"""
+import argparse
+import base64
+import gzip
+import importlib.util
+import json
+import multiprocessing
+import queue
+import re
+import resource
+import sys
+import threading
+import time
+import urllib.parse
+from pathlib import Path
+
+TOOLS_DIR = Path(__file__).resolve().parent
+PLUGIN_DIR = TOOLS_DIR.parent / "plugin"
+
+# 每次读取的字符数
+READ_CHUNK = 1024 * 1024
+# 进程池模式下每批的流量数
+BATCH_SIZE = 64
+# 插件停止后，结果回调静默多久认为已经处理完(秒)
+SETTLE_SECONDS = 0.5
+# 单个钩子异常只打印前几次
+MAX_ERROR_LOGS = 10
+
+_HAR_ENTRIES = re.compile(r'"entries"\s*:\s*\[')
+_HAR_SNIFF = re.compile(r'^\s*\{\s*"log"\s*:')
+
+
+def _setup_path():
+    """优先使用真实的chui_http，没有安装时使用本地替身"""
+    sys.path.insert(0, str(PLUGIN_DIR))
+    try:
+        import chui_http
+    except ImportError:
+        sys.path.insert(0, str(TOOLS_DIR / "stub"))
+
+
+def _open_text(file: str):
+    if file.endswith(".gz"):
+        return gzip.open(file, 'rt', encoding='utf-8', errors='replace')
+    return open(file, 'r', encoding='utf-8', errors='replace')
+
+
+def iter_har_entries(f, chunk_size: int = READ_CHUNK):
+    """
+    逐个解析HAR中log.entries数组的元素，不加载整个文件
+    缓冲区只保留当前未解析完的一条，单条不完整时按已缓冲长度倍增读取
+    """
+    decoder = json.JSONDecoder()
+    buf = ""
+    # 定位entries数组
+    while True:
+        data = f.read(chunk_size)
+        buf += data
+        m = _HAR_ENTRIES.search(buf)
+        if m is not None:
+            buf = buf[m.end():]
+            break
+        if not data:
+            return
+        # 保留末尾，防止键名被分块截断
+        buf = buf[-64:]
+
+    pos = 0
+    eof = False
+    while True:
+        while pos < len(buf) and buf[pos] in " \t\r\n,":
+            pos += 1
+        if pos >= len(buf):
+            if eof:
+                raise ValueError("Unexpected end of HAR entries")
+            buf, pos = "", 0
+            data = f.read(chunk_size)
+            eof = not data
+            buf = data
+            continue
+        if buf[pos] == "]":
+            return
+        try:
+            entry, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            buf = buf[pos:]
+            pos = 0
+            data = f.read(max(chunk_size, len(buf)))
+            eof = not data
+            buf += data
+            continue
+        yield entry
+        pos = end
+
+
+def _har_headers(items) -> list:
+    return [f"{h.get('name', '')}: {h.get('value', '')}" for h in items or []]
+
+
+def _har_body(text, encoding: str = None) -> dict:
+    if text is None or text == "":
+        return {"type": 0, "payload": None}
+    if encoding == "base64":
+        try:
+            data = base64.b64decode(text)
+        except ValueError:
+            return {"type": 1, "payload": text}
+        try:
+            return {"type": 1, "payload": data.decode('utf-8')}
+        except UnicodeDecodeError:
+            return {"type": 2, "payload": data}
+    return {"type": 1, "payload": text}
+
+
+def har_to_flow(entry: dict, index: int) -> dict:
+    """HAR条目转换为json流格式"""
+    request = entry.get("request") or {}
+    response = entry.get("response") or {}
+    url = request.get("url", "")
+    parts = urllib.parse.urlsplit(url)
+    scheme = parts.scheme or "http"
+    try:
+        port = parts.port or (443 if scheme == "https" else 80)
+    except ValueError:
+        port = 443 if scheme == "https" else 80
+    path = parts.path or "/"
+    if parts.query:
+        path += "?" + parts.query
+
+    ctime = None
+    started = entry.get("startedDateTime")
+    if started:
+        try:
+            from datetime import datetime
+            ctime = int(datetime.fromisoformat(started.replace("Z", "+00:00")).timestamp() * 1000)
+        except ValueError:
+            pass
+
+    flow = {
+        "context": {"id": str(index), "url": url, "scheme": scheme, "host": parts.hostname or "", "port": port, "ctime": ctime},
+        "request": {
+            "method": request.get("method", "GET"),
+            "path": path,
+            "protocol": request.get("httpVersion") or "HTTP/1.1",
+            "headers": _har_headers(request.get("headers")),
+            "body": _har_body((request.get("postData") or {}).get("text")),
+        },
+    }
+    if response and response.get("status", 0) > 0:
+        content = response.get("content") or {}
+        flow["response"] = {
+            "code": str(response.get("status")),
+            "message": response.get("statusText", ""),
+            "protocol": response.get("httpVersion") or "HTTP/1.1",
+            "headers": _har_headers(response.get("headers")),
+            "body": _har_body(content.get("text"), content.get("encoding")),
+        }
+    return flow
+
+
+def iter_flows(file: str, stats: dict = None):
+    """按文件格式逐条读取流量，返回json流格式的dict"""
+    with _open_text(file) as f:
+        head = f.read(4096)
+        f.seek(0)
+        if file.endswith((".har", ".har.gz")) or _HAR_SNIFF.match(head):
+            for i, entry in enumerate(iter_har_entries(f)):
+                yield har_to_flow(entry, i)
+            return
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                flow = json.loads(line)
+            except json.JSONDecodeError as e:
+                if stats is not None:
+                    stats["bad_lines"] += 1
+                if stats is None or stats["bad_lines"] <= MAX_ERROR_LOGS:
+                    print(f"[-]Bad flow: {file}:{line_no} - {e}", file=sys.stderr)
+                continue
+            if isinstance(flow, dict) and "context" in flow:
+                yield flow
+
+
+def load_plugin(name: str):
+    """按插件名或文件路径加载插件模块"""
+    _setup_path()
+    file = Path(name)
+    if not file.suffix:
+        file = PLUGIN_DIR / f"{name}.py"
+    file = file.resolve()
+    sys.path.insert(0, str(file.parent))
+    spec = importlib.util.spec_from_file_location(file.stem, file)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[file.stem] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def _parse_value(text: str):
+    """--set的值按json解析，失败时作为字符串"""
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return text
+
+
+def _body_size(data: dict|None) -> int:
+    payload = ((data or {}).get("body") or {}).get("payload")
+    return len(payload) if payload else 0
+
+
+class Replayer:
+    """在当前进程中把流量送入插件，统计吞吐，收集插件返回和回调的结果"""
+    def __init__(self, plugin_name: str, settings: dict, on_rows=None):
+        self.plugin = load_plugin(plugin_name)
+        for key, value in settings.items():
+            if not hasattr(self.plugin, key):
+                raise AttributeError(f"Plugin has no setting: {key}")
+            setattr(self.plugin, key, value)
+
+        from chui_http import Context, HttpRequest, HttpResponse
+        self._types = (Context, HttpRequest, HttpResponse)
+        info = self.plugin.description()
+        self.want_request = bool(info.get("request"))
+        self.want_response = bool(info.get("response"))
+        self.on_rows = on_rows
+        self.stats = {"flows": 0, "requests": 0, "responses": 0, "bytes": 0, "rows": 0, "errors": 0, "hook_seconds": 0.0}
+        self._lock = threading.Lock()
+        self._last_result = time.monotonic()
+
+        self.plugin.initialize(self._on_data)
+        start = getattr(self.plugin, "start", None)
+        if info.get("typ") == 1 and start is not None:
+            start()
+
+    def _on_data(self, rows):
+        self._emit(rows)
+
+    def _emit(self, rows):
+        if not rows:
+            return
+        with self._lock:
+            self.stats["rows"] += len(rows)
+            self._last_result = time.monotonic()
+        if self.on_rows is not None:
+            self.on_rows(rows)
+
+    def _call(self, hook, *args):
+        begin = time.perf_counter()
+        try:
+            rows = hook(*args)
+        except Exception as e:
+            self.stats["errors"] += 1
+            if self.stats["errors"] <= MAX_ERROR_LOGS:
+                print(f"[-]{hook.__name__} error: {args[0].url} - {e}", file=sys.stderr)
+            return
+        finally:
+            self.stats["hook_seconds"] += time.perf_counter() - begin
+        # 同步返回的结果与回调结果一样处理
+        if isinstance(rows, list):
+            self._emit(rows)
+
+    def replay(self, flow: dict):
+        Context, HttpRequest, HttpResponse = self._types
+        context = Context(flow["context"])
+        self.stats["flows"] += 1
+        request, response = flow.get("request"), flow.get("response")
+        if self.want_request and request is not None:
+            self.stats["requests"] += 1
+            self.stats["bytes"] += _body_size(request)
+            self._call(self.plugin.on_request, context, HttpRequest(request))
+        if self.want_response and response is not None:
+            self.stats["responses"] += 1
+            self.stats["bytes"] += _body_size(response)
+            self._call(self.plugin.on_response, context, HttpResponse(response))
+
+    def finish(self, settle: float = SETTLE_SECONDS) -> dict:
+        """停止插件，等待异步结果回调静默settle秒"""
+        stop = getattr(self.plugin, "stop", None)
+        if stop is not None:
+            stop()
+        while True:
+            with self._lock:
+                quiet = time.monotonic() - self._last_result
+            if quiet >= settle:
+                break
+            time.sleep(settle - quiet)
+        return dict(self.stats)
+
+
+def _worker(plugin_name: str, settings: dict, settle: float, tasks, results):
+    """进程池工作进程: 批量取流量回放，结果和最终统计通过results返回"""
+    def on_rows(rows):
+        results.put(("rows", rows))
+
+    try:
+        replayer = Replayer(plugin_name, settings, on_rows)
+    except Exception as e:
+        results.put(("failed", f"{type(e).__name__}: {e}"))
+        return
+    while True:
+        batch = tasks.get()
+        if batch is None:
+            break
+        for flow in batch:
+            replayer.replay(flow)
+    stats = replayer.finish(settle)
+    stats["peak_rss_kb"] = _peak_rss_kb()
+    results.put(("done", stats))
+
+
+def _peak_rss_kb(who=resource.RUSAGE_SELF) -> int:
+    rss = resource.getrusage(who).ru_maxrss
+    # macOS单位为字节，Linux为KB
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+class _Output:
+    """结果写入jsonl文件，每行一条插件结果"""
+    def __init__(self, file: str|None):
+        self._file = open(file, 'w', encoding='utf-8') if file else None
+        self._lock = threading.Lock()
+
+    def write(self, rows):
+        if self._file is None:
+            return
+        with self._lock:
+            for row in rows:
+                self._file.write(json.dumps(row, ensure_ascii=False, default=repr) + "\n")
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+def _iter_all(files: list, limit: int, stats: dict):
+    count = 0
+    for file in files:
+        for flow in iter_flows(file, stats):
+            if limit and count >= limit:
+                return
+            count += 1
+            yield flow
+
+
+def run_inline(args, settings: dict, output: _Output, read_stats: dict) -> dict:
+    replayer = Replayer(args.plugin, settings, output.write)
+    for flow in _iter_all(args.files, args.limit, read_stats):
+        replayer.replay(flow)
+    stats = replayer.finish(args.settle)
+    stats["peak_rss_kb"] = _peak_rss_kb()
+    return stats
+
+
+def run_pool(args, settings: dict, output: _Output, read_stats: dict) -> dict:
+    """主进程只负责读取和分批，队列有界，读取速度受工作进程限制"""
+    ctx = multiprocessing.get_context("spawn")
+    tasks = ctx.Queue(maxsize=args.workers * 2)
+    results = ctx.Queue()
+    workers = [ctx.Process(target=_worker, args=(args.plugin, settings, args.settle, tasks, results), daemon=True)
+               for _ in range(args.workers)]
+    for process in workers:
+        process.start()
+
+    totals = {}
+    finished = []
+    failed = []
+
+    def collect():
+        while len(finished) + len(failed) < len(workers):
+            kind, data = results.get()
+            if kind == "rows":
+                output.write(data)
+            elif kind == "done":
+                finished.append(data)
+            else:
+                failed.append(data)
+
+    collector = threading.Thread(target=collect, name="ReplayCollector", daemon=True)
+    collector.start()
+
+    batch = []
+    for flow in _iter_all(args.files, args.limit, read_stats):
+        batch.append(flow)
+        if len(batch) >= args.batch_size:
+            while not failed:
+                try:
+                    tasks.put(batch, timeout=1)
+                    break
+                except queue.Full:
+                    continue
+            if failed:
+                break
+            batch = []
+    if batch and not failed:
+        tasks.put(batch)
+    for _ in workers:
+        tasks.put(None)
+    collector.join()
+    for process in workers:
+        process.join()
+    if failed:
+        raise RuntimeError(f"Replay worker failed: {failed[0]}")
+
+    for stats in finished:
+        for key, value in stats.items():
+            if key == "peak_rss_kb":
+                totals[key] = max(totals.get(key, 0), value)
+            else:
+                totals[key] = totals.get(key, 0) + value
+    totals["main_rss_kb"] = _peak_rss_kb()
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description="replay recorded HAR/jsonl traffic into a plugin")
+    parser.add_argument("plugin", help="插件名(plugin目录下)或插件文件路径")
+    parser.add_argument("files", nargs="+", help="HAR或jsonl文件，支持.gz")
+    parser.add_argument("--workers", type=int, default=0, help="工作进程数，0表示在当前进程回放")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="进程池模式下每批的流量数")
+    parser.add_argument("--limit", type=int, default=0, help="最多回放的流量数，0表示不限制")
+    parser.add_argument("--set", action="append", default=[], metavar="NAME=VALUE", help="回放前修改插件的模块配置，值按json解析")
+    parser.add_argument("--settle", type=float, default=SETTLE_SECONDS, help="插件停止后等待异步结果的静默时间(秒)")
+    parser.add_argument("--output", help="插件结果写入jsonl文件")
+    parser.add_argument("--stats", help="统计写入json文件")
+    args = parser.parse_args()
+
+    settings = {}
+    for item in args.set:
+        name, sep, value = item.partition("=")
+        if not sep:
+            parser.error(f"--set expects NAME=VALUE: {item}")
+        settings[name.strip()] = _parse_value(value.strip())
+
+    output = _Output(args.output)
+    read_stats = {"bad_lines": 0}
+    begin = time.perf_counter()
+    try:
+        if args.workers > 0:
+            stats = run_pool(args, settings, output, read_stats)
+        else:
+            stats = run_inline(args, settings, output, read_stats)
+    finally:
+        output.close()
+    elapsed = time.perf_counter() - begin
+
+    stats.update(read_stats)
+    stats["elapsed_s"] = elapsed
+    stats["flows_s"] = stats.get("flows", 0) / elapsed if elapsed > 0 else 0.0
+    stats["mb_s"] = stats.get("bytes", 0) / elapsed / 1024 / 1024 if elapsed > 0 else 0.0
+    print(f"[+]Replay {stats.get('flows', 0)} flows in {elapsed:.2f}s"
+          f", rate: {stats['flows_s']:.0f}flows/s, {stats['mb_s']:.1f}MB/s"
+          f", requests: {stats.get('requests', 0)}, responses: {stats.get('responses', 0)}"
+          f", rows: {stats.get('rows', 0)}, errors: {stats.get('errors', 0)}, bad lines: {stats['bad_lines']}"
+          f", peak rss: {stats.get('peak_rss_kb', 0) / 1024:.1f}MB")
+    if args.stats:
+        with open(args.stats, 'w', encoding='utf8') as f:
+            json.dump(stats, f, indent=2)
+    return 1 if stats.get("errors") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+# -*- encoding: utf-8 -*-
+"""
+`chui_http`的本地替身，只在没有安装SwordfishSuite运行环境时供基准测试、回放工具使用
+数据结构与插件`__main__`示例中的json格式一致
+"""
+import urllib.request
+
+
+class HttpBody:
+    def __init__(self, data: dict|None):
+        data = data or {}
+        # 0: 无内容 1: 文本 2: 二进制
+        self.type = data.get('type', 0)
+        self.payload = data.get('payload')
+
+    @property
+    def isText(self) -> bool:
+        return self.type == 1
+
+    def serialize(self) -> dict:
+        payload = self.payload
+        if isinstance(payload, (bytes, bytearray, memoryview)):
+            payload = bytes(payload).hex()
+        return {"type": self.type, "payload": payload}
+
+    def __repr__(self):
+        size = len(self.payload) if self.payload else 0
+        return f"HttpBody(type={self.type}, size={size})"
+
+
+def _body_from_bytes(data: bytes) -> dict:
+    if not data:
+        return {"type": 0, "payload": None}
+    try:
+        return {"type": 1, "payload": data.decode('utf-8')}
+    except UnicodeDecodeError:
+        return {"type": 2, "payload": data}
+
+
+class Context:
+    def __init__(self, data: dict):
+        self.id = data.get('id')
+        self.url = data.get('url', '')
+        self.scheme = data.get('scheme', 'http')
+        self.host = data.get('host', '')
+        self.port = data.get('port', 80)
+        self.cid = data.get('cid')
+        self.ctime = data.get('ctime')
+        self.sid = data.get('sid')
+        self.stime = data.get('stime')
+        self.shared = data.get('shared')
+
+
+class HttpRequest:
+    def __init__(self, data: dict):
+        self.method = data.get('method', 'GET')
+        self.path = data.get('path', '/')
+        self.protocol = data.get('protocol', 'HTTP/1.1')
+        self.headers = data.get('headers') or []
+        self.body = HttpBody(data.get('body'))
+
+    @staticmethod
+    def from_urllib_request(req: urllib.request.Request) -> 'HttpRequest':
+        data = req.data if isinstance(req.data, bytes) else None
+        return HttpRequest({
+            "method": req.get_method(),
+            "path": req.selector,
+            "headers": [f"{k}: {v}" for k, v in req.header_items()],
+            "body": _body_from_bytes(data),
+        })
+
+    def serialize(self) -> dict:
+        return {
+            "method": self.method,
+            "path": self.path,
+            "protocol": self.protocol,
+            "headers": self.headers,
+            "body": self.body.serialize(),
+        }
+
+
+class HttpResponse:
+    def __init__(self, data: dict):
+        self.code = data.get('code', '200')
+        self.message = data.get('message', '')
+        self.protocol = data.get('protocol', 'HTTP/1.1')
+        self.headers = data.get('headers') or []
+        self.body = HttpBody(data.get('body'))
+
+    @staticmethod
+    def from_urllib_response(response) -> 'HttpResponse':
+        status = getattr(response, 'status', None) or response.getcode()
+        return HttpResponse({
+            "code": str(status),
+            "message": getattr(response, 'reason', '') or '',
+            "headers": [f"{k}: {v}" for k, v in response.headers.items()],
+            "body": _body_from_bytes(response.read()),
+        })
+
+    def serialize(self) -> dict:
+        return {
+            "code": self.code,
+            "message": self.message,
+            "protocol": self.protocol,
+            "headers": self.headers,
+            "body": self.body.serialize(),
+        }